@@ -1,12 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy import func, or_, exists, select
 from sqlalchemy import Integer
 from typing import List, Optional
+from app.api.pagination import decode_cursor, encode_cursor
+from app.db.ids import is_uuid
 from app.db.session import get_db
-from app.models import User, Quiz, Category, UserQuizAttempt, UserProgress, UserRole, UserAnswer
-from app.schemas import AdminStats, UserResponse, UserUpdate
+from app.models import User, Quiz, Category, Question, UserQuizAttempt, UserProgress, UserRole, UserAnswer, UserStats
+from app.schemas import AdminStats, UserResponse, UserUpdate, BatchGradeRequest, BatchGradeResult, DedupeReportRequest
+from app.core.config import settings
+from app.core.slow_queries import slow_queries
+from app.services.answer_snapshot import cohort_pass_rates, current_snapshot, distractors, summary, trends
 from app.services.auth import get_current_user
+from app.services.catalog_store import catalog
+from app.services.grading import grade_and_store_batch
+from app.services.item_analysis import quiz_item_analysis
+from app.services.near_duplicates import dedupe_report, similar_to_question
+from app.services.outbox import consumer_status, position, read_events, serialize
+from app.services.singleflight import all_stats
 import math
 
 router = APIRouter()
@@ -214,27 +225,245 @@ def delete_user(user_id: str, db: Session = Depends(get_db), current_user: User
     if current_user.id == user_id:
         raise HTTPException(status_code=400, detail="Cannot delete your own account")
 
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    user_exists = db.query(exists().where(User.id == user_id)).scalar()
+    if not user_exists:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Supprimer les réponses utilisateur associées
-    user_answers = db.query(UserAnswer).join(UserQuizAttempt).filter(UserQuizAttempt.user_id == user_id).all()
-    for answer in user_answers:
-        db.delete(answer)
+    # Suppression ensembliste : une requête DELETE par table, sans charger les lignes
+    # (les clés étrangères ON DELETE CASCADE font de même côté PostgreSQL)
+    user_attempts = select(UserQuizAttempt.id).where(UserQuizAttempt.user_id == user_id)
+    db.query(UserAnswer).filter(UserAnswer.attempt_id.in_(user_attempts)).delete(synchronize_session=False)
+    db.query(UserQuizAttempt).filter(UserQuizAttempt.user_id == user_id).delete(synchronize_session=False)
+    db.query(UserProgress).filter(UserProgress.user_id == user_id).delete(synchronize_session=False)
+    db.query(UserStats).filter(UserStats.user_id == user_id).delete(synchronize_session=False)
+    db.query(User).filter(User.id == user_id).delete(synchronize_session=False)
+    db.commit()
 
-    # Supprimer les tentatives de quiz
-    attempts = db.query(UserQuizAttempt).filter(UserQuizAttempt.user_id == user_id).all()
-    for attempt in attempts:
-        db.delete(attempt)
+    return {"message": "User deleted successfully"}
 
-    # Supprimer le progrès utilisateur
-    progress_records = db.query(UserProgress).filter(UserProgress.user_id == user_id).all()
-    for progress in progress_records:
-        db.delete(progress)
 
-    # Supprimer l'utilisateur
-    db.delete(user)
-    db.commit()
+@router.post("/quizzes/{quiz_id}/grade-batch", response_model=BatchGradeResult)
+def grade_batch(quiz_id: str, batch: BatchGradeRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Corrige en une passe les copies d'une classe (examen papier ou application hors ligne)"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
 
-    return {"message": "User deleted successfully"}
+    quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    # Vérifier les élèves en une seule requête
+    user_ids = {submission.user_id for submission in batch.submissions if is_uuid(submission.user_id)}
+    known_ids = {row[0] for row in db.query(User.id).filter(User.id.in_(list(user_ids)))}
+
+    submissions, errors = [], []
+    for index, submission in enumerate(batch.submissions):
+        if submission.user_id not in known_ids:
+            errors.append({"index": index, "user_id": submission.user_id, "detail": "User not found"})
+            continue
+        submissions.append({
+            "user_id": submission.user_id,
+            "answers": submission.answers,
+            "completed_at": submission.completed_at
+        })
+
+    graded = grade_and_store_batch(db, quiz, submissions)
+    return {"results": graded["results"], "errors": errors, "summary": graded["summary"]}
+
+@router.get("/quizzes/{quiz_id}/item-analysis")
+def get_item_analysis(quiz_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Analyse d'items d'un quiz : difficulté, discrimination et choix des distracteurs"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    return {
+        "data": quiz_item_analysis(db, quiz_id),
+        "meta": {"quiz_id": quiz.id, "title": quiz.title},
+        "message": "Analyse d'items récupérée avec succès"
+    }
+
+@router.get("/cache-stats")
+def get_cache_stats(current_user: User = Depends(get_current_user)):
+    """Compteurs des chargements regroupés (single-flight) et état du catalogue partagé, pour ce worker"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return {
+        "data": {
+            "single_flight": all_stats(),
+            "catalog": catalog.stats()
+        },
+        "meta": {},
+        "message": "Statistiques de cache récupérées avec succès"
+    }
+
+@router.get("/slow-queries")
+def get_slow_queries(
+    limit: Optional[int] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Requêtes SQL lentes de ce worker, les plus coûteuses en temps cumulé d'abord"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return {
+        "data": slow_queries.top(limit),
+        "meta": {
+            "slow_count": slow_queries.slow_count,
+            "threshold_ms": settings.slow_query_threshold_ms,
+            "explain_rate": settings.slow_query_explain_rate
+        },
+        "message": "Requêtes lentes récupérées avec succès"
+    }
+
+@router.delete("/slow-queries")
+def reset_slow_queries(current_user: User = Depends(get_current_user)):
+    """Remet à zéro le journal des requêtes lentes de ce worker"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    slow_queries.reset()
+    return {"message": "Journal des requêtes lentes réinitialisé"}
+
+@router.get("/questions/{question_id}/similar")
+def get_similar_questions(
+    question_id: str,
+    threshold: Optional[float] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Questions quasi identiques à une question de la banque (MinHash/LSH)"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    question = db.query(Question).filter(Question.id == question_id).first()
+    if not question:
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    return {
+        "data": similar_to_question(db, question, threshold),
+        "meta": {"threshold": threshold if threshold is not None else settings.duplicate_similarity_threshold},
+        "message": "Questions similaires récupérées avec succès"
+    }
+
+@router.post("/questions/dedupe-report")
+def get_dedupe_report(
+    request: DedupeReportRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Rapport de doublons d'un lot de questions avant import (banque existante et lot lui-même)"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    report = dedupe_report(db, [question.question_text for question in request.questions], request.threshold)
+    return {
+        "data": report["items"],
+        "meta": report["summary"],
+        "message": "Rapport de doublons généré avec succès"
+    }
+
+def _analytics_snapshot():
+    snapshot = current_snapshot()
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Analytics snapshot not available")
+    return snapshot
+
+@router.get("/analytics")
+def get_analytics_summary(current_user: User = Depends(get_current_user)):
+    """Vue d'ensemble de l'instantané colonnaire des réponses"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    snapshot = _analytics_snapshot()
+    return {
+        "data": summary(snapshot),
+        "meta": {"snapshot": snapshot.name},
+        "message": "Synthèse analytique récupérée avec succès"
+    }
+
+@router.get("/analytics/cohorts")
+def get_analytics_cohorts(quiz_id: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    """Taux de réussite par cohorte (mois d'inscription), lus sur l'instantané"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    snapshot = _analytics_snapshot()
+    return {
+        "data": cohort_pass_rates(snapshot, quiz_id),
+        "meta": {"snapshot": snapshot.name, "created_at": snapshot.created_at, "quiz_id": quiz_id},
+        "message": "Taux de réussite par cohorte récupérés avec succès"
+    }
+
+@router.get("/analytics/trends")
+def get_analytics_trends(
+    quiz_id: Optional[str] = None,
+    granularity: str = Query("day", pattern="^(day|week)$"),
+    current_user: User = Depends(get_current_user)
+):
+    """Évolution des réponses et du taux de bonnes réponses, par jour ou par semaine"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    snapshot = _analytics_snapshot()
+    return {
+        "data": trends(snapshot, quiz_id, granularity),
+        "meta": {"snapshot": snapshot.name, "created_at": snapshot.created_at,
+                 "quiz_id": quiz_id, "granularity": granularity},
+        "message": "Tendances récupérées avec succès"
+    }
+
+@router.get("/analytics/questions/{question_id}/distractors")
+def get_analytics_distractors(question_id: str, current_user: User = Depends(get_current_user)):
+    """Choix des réponses d'une question, dont les distracteurs retenus par les candidats en échec"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    snapshot = _analytics_snapshot()
+    report = distractors(snapshot, question_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Question not found in analytics snapshot")
+    answers = report.pop("answers")
+    return {
+        "data": answers,
+        "meta": {"snapshot": snapshot.name, "created_at": snapshot.created_at, "question_id": question_id, **report},
+        "message": "Analyse des distracteurs récupérée avec succès"
+    }
+
+@router.get("/outbox")
+def get_outbox_status(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Curseurs des consommateurs de l'outbox : position, retard et dernière erreur de livraison"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    return {
+        "data": consumer_status(db),
+        "meta": {"relay_enabled": settings.outbox_relay_enabled},
+        "message": "État de l'outbox récupéré avec succès"
+    }
+
+@router.get("/events")
+def get_events(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Flux des événements de l'outbox à partir d'un curseur (`next_cursor` de la page
+    précédente), pour les consommateurs qui lisent eux-mêmes plutôt que de recevoir les
+    livraisons
+    """
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    after = decode_cursor(cursor, (int, int)) if cursor else (0, 0)
+    events = read_events(db, after, limit)
+    return {
+        "data": [serialize(event) for event in events],
+        "meta": {"cursor": cursor, "next_cursor": encode_cursor(position(events[-1])) if events else cursor},
+        "message": "Événements récupérés avec succès"
+    }
@@ -1,15 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.db.session import get_db
-from app.models import UserQuizAttempt, User, Quiz, Question, Answer, UserAnswer, UserProgress, Category
+from app.models import UserQuizAttempt, User, Quiz, UserProgress, Category
 from app.schemas import QuizStartResponse, QuizSubmit, QuizResult
 from app.services.auth import get_current_user
-import uuid
+from app.services.answer_storage import store_answers, load_selected_answer_ids
+from app.services.attempt_archive import archived_history, load_archived
+from app.services.attempt_expiry import expire_attempt, expires_at_for, is_expired, utcnow
+from app.services.cache import TTLCache
+from app.services.grading import build_answer_key, version_answer_key
+from app.services.item_analysis import record_submission
+from app.services.outbox import ATTEMPT_COMPLETED, PROGRESS_UPDATED, emit, progress_event
+from app.services.quiz_versions import get_version_content, sample_version_question_ids, attempt_content
+from app.services.sampling import new_seed, sample_question_ids
+from app.services.user_stats import record_started, record_completed, recent_entry
+from app.db.ids import new_id
+from app.db.upsert import dialect_insert
+from app.db.loader import loader
 from datetime import datetime
 
 router = APIRouter()
 
+# Résultats des soumissions récentes, rejoués sans requête lorsqu'un client renvoie la même soumission
+submission_results = TTLCache(maxsize=10000, ttl=900)
+
+def find_open_attempt(db: Session, user_id: str, quiz_id: str) -> Optional[UserQuizAttempt]:
+    """Tentative en cours (ni terminée ni expirée) de l'utilisateur sur le quiz"""
+    return db.query(UserQuizAttempt).filter(
+        UserQuizAttempt.user_id == user_id,
+        UserQuizAttempt.quiz_id == quiz_id,
+        UserQuizAttempt.completed_at == None,
+        UserQuizAttempt.expired_at == None
+    ).first()
+
 @router.post("/start/{quiz_id}", response_model=QuizStartResponse)
 def start_quiz(quiz_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """Démarre une tentative de quiz pour l'utilisateur"""
@@ -18,121 +42,191 @@ def start_quiz(quiz_id: str, db: Session = Depends(get_db), current_user: User =
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found or not published")
 
-    # Vérifier si l'utilisateur a déjà une tentative en cours pour ce quiz
-    existing_attempt = db.query(UserQuizAttempt).filter(
-        UserQuizAttempt.user_id == current_user.id,
-        UserQuizAttempt.quiz_id == quiz_id,
-        UserQuizAttempt.completed_at == None
-    ).first()
-
-    if existing_attempt:
-        # Retourner la tentative existante
-        attempt_id = existing_attempt.id
-    else:
-        # Créer une nouvelle tentative
-        attempt = UserQuizAttempt(
-            id=str(uuid.uuid4()),
-            user_id=current_user.id,
-            quiz_id=quiz_id
-        )
-        db.add(attempt)
+    # Tentative déjà en cours : la retourner, sans tirage ni chargement de contenu.
+    # Une tentative en cours mais échue (pas encore balayée) est expirée puis remplacée
+    attempt = find_open_attempt(db, current_user.id, quiz_id)
+    if attempt is not None and is_expired(attempt):
+        expire_attempt(db, attempt.id)
         db.commit()
-        db.refresh(attempt)
-        attempt_id = attempt.id
-
-    # Récupérer le quiz avec ses questions et réponses
-    quiz_data = db.query(Quiz).filter(Quiz.id == quiz_id).first()
-    questions = db.query(Question).filter(Question.quiz_id == quiz_id).order_by(Question.order).all()
-
-    # Pour chaque question, récupérer les réponses (sans indiquer laquelle est correcte)
-    for question in questions:
-        question.answers = db.query(Answer).filter(Answer.question_id == question.id).order_by(Answer.order).all()
+        attempt = None
+
+    if attempt is None:
+        # Créer la tentative sur la version publiée courante du quiz (avec tirage des questions
+        # pour une banque de questions) : l'index unique partiel sur les tentatives ouvertes
+        # rend l'insertion sûre face aux démarrages concurrents
+        seed = new_seed()
+        content = get_version_content(db, quiz.current_version_id) if quiz.current_version_id else None
+        started_at = utcnow()
+        values = {
+            "id": new_id(),
+            "user_id": current_user.id,
+            "quiz_id": quiz_id,
+            "quiz_version_id": quiz.current_version_id if content is not None else None,
+            "seed": seed,
+            "question_ids": (
+                sample_version_question_ids(content, seed) if content is not None
+                else sample_question_ids(db, quiz, seed)
+            ),
+            "started_at": started_at,
+            "expires_at": expires_at_for(quiz, started_at)
+        }
+        inserted_id = db.execute(dialect_insert(db, UserQuizAttempt).values(values).on_conflict_do_nothing(
+            index_elements=["user_id", "quiz_id"],
+            index_where=UserQuizAttempt.completed_at.is_(None) & UserQuizAttempt.expired_at.is_(None)
+        ).returning(UserQuizAttempt.id)).scalar()
+        if inserted_id is not None:
+            record_started(db, current_user.id)
+            db.commit()
+            # Tentative créée : ses valeurs sont connues, inutile de la relire
+            attempt = UserQuizAttempt(**values)
+        else:
+            # Démarrage concurrent : retourner la tentative qu'il a créée
+            attempt = find_open_attempt(db, current_user.id, quiz_id)
+    if attempt is None:
+        raise HTTPException(status_code=409, detail="Attempt is being started, please retry")
+    attempt_id = attempt.id
+
+    # Récupérer les questions de la tentative avec leurs réponses (version figée ou contenu courant)
+    version_quiz, questions = attempt_content(db, attempt)
 
     return {
         "attempt_id": attempt_id,
-        "quiz": quiz_data,
+        "expires_at": attempt.expires_at,
+        "quiz": version_quiz or quiz,
         "questions": questions
     }
 
 @router.post("/submit/{attempt_id}", response_model=QuizResult)
-def submit_quiz(attempt_id: str, submission: QuizSubmit, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    """Soumet les réponses du quiz et calcule le résultat"""
-    # Vérifier que la tentative appartient à l'utilisateur et n'est pas terminée
+def submit_quiz(
+    attempt_id: str,
+    submission: QuizSubmit,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Soumet les réponses du quiz et calcule le résultat.
+    La soumission est idempotente : renvoyer une tentative déjà terminée rejoue le résultat
+    enregistré, sans nouvelle correction.
+    """
+    cached = submission_results.get((current_user.id, attempt_id))
+    if cached is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+        return cached
+
+    # Vérifier que la tentative appartient à l'utilisateur (verrouillée pour sérialiser les doublons concurrents)
     attempt = db.query(UserQuizAttempt).filter(
         UserQuizAttempt.id == attempt_id,
-        UserQuizAttempt.user_id == current_user.id,
-        UserQuizAttempt.completed_at == None
-    ).first()
+        UserQuizAttempt.user_id == current_user.id
+    ).with_for_update().first()
 
-    if not attempt:
+    if attempt and attempt.completed_at is not None and attempt.result is not None:
+        submission_results.set((current_user.id, attempt_id), attempt.result)
+        response.headers["Idempotent-Replayed"] = "true"
+        return attempt.result
+
+    if not attempt or attempt.completed_at is not None:
         raise HTTPException(status_code=404, detail="Attempt not found or already completed")
 
-    # Récupérer toutes les questions du quiz
-    questions = db.query(Question).filter(Question.quiz_id == attempt.quiz_id).all()
+    # Soumission hors délai : rejetée avant toute correction (et la tentative est expirée au passage)
+    if is_expired(attempt):
+        if attempt.expired_at is None:
+            expire_attempt(db, attempt.id)
+            db.commit()
+        raise HTTPException(status_code=410, detail="Attempt expired")
+
+    # Récupérer les questions servies et le corrigé (version figée, en cache, ou contenu courant)
+    version_quiz, questions = attempt_content(db, attempt)
+    questions_by_id = {question["id"]: question for question in questions}
+    answer_key = version_answer_key(db, attempt.quiz_version_id) if attempt.quiz_version_id else None
+    if answer_key is None:
+        answer_key = build_answer_key(questions)
+    answer_orders, correct_ids = answer_key.answer_orders, answer_key.correct_ids
+
     total_questions = len(questions)
     correct_answers = 0
     details = []
+    graded = []
 
     # Traiter chaque réponse soumise
     for answer_submit in submission.answers:
-        question = db.query(Question).filter(Question.id == answer_submit.question_id).first()
-        if not question or question.quiz_id != attempt.quiz_id:
+        question = questions_by_id.get(answer_submit.question_id)
+        if not question:
             continue
 
         # Récupérer les bonnes réponses pour cette question
-        correct_answer_ids = db.query(Answer.id).filter(
-            Answer.question_id == question.id,
-            Answer.is_correct == True
-        ).all()
-        correct_answer_ids = [aid[0] for aid in correct_answer_ids]
+        correct_answer_ids = correct_ids[question["id"]]
 
         # Vérifier si les réponses de l'utilisateur sont correctes
         user_correct = set(answer_submit.answer_ids) == set(correct_answer_ids)
         if user_correct:
             correct_answers += 1
 
-        # Enregistrer chaque réponse de l'utilisateur
-        for answer_id in answer_submit.answer_ids:
-            user_answer = UserAnswer(
-                id=str(uuid.uuid4()),
-                attempt_id=attempt_id,
-                question_id=question.id,
-                answer_id=answer_id,
-                is_correct=user_correct
-            )
-            db.add(user_answer)
+        graded.append({
+            "question_id": question["id"],
+            "answer_ids": answer_submit.answer_ids,
+            "is_correct": user_correct,
+            "answer_orders": answer_orders[question["id"]]
+        })
 
         # Ajouter les détails pour la réponse
         details.append({
-            "question_id": question.id,
-            "question_text": question.question_text,
+            "question_id": question["id"],
+            "question_text": question["question_text"],
             "user_answers": answer_submit.answer_ids,
             "correct_answers": correct_answer_ids,
             "is_correct": user_correct
         })
 
+    # Enregistrer les réponses de l'utilisateur (format compact ou lignes selon la configuration)
+    store_answers(db, attempt, graded)
+    record_submission(db, questions_by_id, graded)
+
     # Calculer le score
     score = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
     passed = score >= 80  # Seuil de réussite à 80% (selon cahier des charges)
 
-    # Mettre à jour la tentative
+    result = {
+        "score": score,
+        "passed": passed,
+        "correct_answers": correct_answers,
+        "total_questions": total_questions,
+        "details": details
+    }
+
+    # Mettre à jour la tentative (le résultat est conservé pour rejouer les soumissions en double)
     attempt.score = score
     attempt.passed = passed
     attempt.completed_at = datetime.utcnow()
+    attempt.result = result
 
     # Si le quiz est réussi, mettre à jour le progrès de l'utilisateur
-    if passed:
-        update_user_progress(db, current_user.id, attempt.quiz_id)
-
-    db.commit()
-
-    return {
+    new_category = update_user_progress(db, current_user.id, attempt.quiz_id) if passed else False
+
+    # Mettre à jour la synthèse du tableau de bord dans la même transaction
+    quiz_title = version_quiz["title"] if version_quiz else db.query(Quiz.title).filter(Quiz.id == attempt.quiz_id).scalar()
+    record_completed(db, current_user.id, recent_entry(
+        attempt.id, quiz_title, score, passed, attempt.completed_at
+    ), new_category)
+
+    # Événement publié aux systèmes en aval (LMS, certificats...) avec la même validation
+    emit(db, ATTEMPT_COMPLETED, current_user.id, {
+        "attempt_id": attempt.id,
+        "user_id": current_user.id,
+        "quiz_id": attempt.quiz_id,
+        "quiz_version_id": attempt.quiz_version_id,
+        "quiz_title": quiz_title,
         "score": score,
         "passed": passed,
         "correct_answers": correct_answers,
         "total_questions": total_questions,
-        "details": details
-    }
+        "completed_at": attempt.completed_at
+    })
+
+    db.commit()
+    submission_results.set((current_user.id, attempt_id), result)
+
+    return result
 
 @router.get("/progress", response_model=List[dict])
 def get_user_progress(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -141,9 +235,12 @@ def get_user_progress(db: Session = Depends(get_db), current_user: User = Depend
         UserProgress.user_id == current_user.id
     ).all()
 
+    # Catégories chargées en une requête pour toute la boucle
+    categories = loader(db, Category).queue(progress.category_id for progress in progress_list)
+
     result = []
     for progress in progress_list:
-        category = db.query(Category).filter(Category.id == progress.category_id).first()
+        category = categories.load(progress.category_id)
         if category:
             result.append({
                 "category": {
@@ -162,15 +259,19 @@ def get_user_progress(db: Session = Depends(get_db), current_user: User = Depend
     return result
 
 @router.get("/attempts", response_model=List[dict])
-def get_user_attempts(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_user_attempts(include_archived: bool = False, db: Session = Depends(get_db),
+                      current_user: User = Depends(get_current_user)):
     """Récupère l'historique des tentatives de l'utilisateur"""
     attempts = db.query(UserQuizAttempt).filter(
         UserQuizAttempt.user_id == current_user.id
     ).order_by(UserQuizAttempt.completed_at.desc()).all()
 
+    # Quiz chargés en une requête pour toute la boucle
+    quizzes = loader(db, Quiz).queue(attempt.quiz_id for attempt in attempts)
+
     result = []
     for attempt in attempts:
-        quiz = db.query(Quiz).filter(Quiz.id == attempt.quiz_id).first()
+        quiz = quizzes.load(attempt.quiz_id)
         result.append({
             "id": attempt.id,
             "quiz_title": quiz.title if quiz else "Unknown Quiz",
@@ -179,6 +280,10 @@ def get_user_attempts(db: Session = Depends(get_db), current_user: User = Depend
             "completed_at": attempt.completed_at
         })
 
+    # Tentatives anciennes déplacées dans l'archive, lues seulement à la demande
+    if include_archived:
+        result.extend(archived_history(db, current_user.id))
+
     return result
 
 @router.get("/{attempt_id}")
@@ -190,43 +295,55 @@ def get_attempt_detail(attempt_id: str, db: Session = Depends(get_db), current_u
         UserQuizAttempt.user_id == current_user.id
     ).first()
 
+    # Tentative ancienne : lue dans l'archive, réponses enregistrées en lignes comprises
+    archived_selected = None
     if not attempt:
-        raise HTTPException(status_code=404, detail="Attempt not found")
-
-    # Récupérer le quiz
-    quiz = db.query(Quiz).filter(Quiz.id == attempt.quiz_id).first()
-    if not quiz:
-        raise HTTPException(status_code=404, detail="Quiz not found")
-
-    # Récupérer les questions du quiz
-    questions = db.query(Question).filter(Question.quiz_id == attempt.quiz_id).order_by(Question.order).all()
+        archived = load_archived(db, current_user.id, attempt_id)
+        if archived is None:
+            raise HTTPException(status_code=404, detail="Attempt not found")
+        _, attempt, archived_selected = archived
+
+    # Récupérer le quiz et les questions de la tentative (version figée ou contenu courant)
+    quiz, questions = attempt_content(db, attempt)
+    if quiz is None:
+        quiz_row = db.query(Quiz).filter(Quiz.id == attempt.quiz_id).first()
+        if not quiz_row:
+            raise HTTPException(status_code=404, detail="Quiz not found")
+        quiz = {
+            "id": quiz_row.id,
+            "title": quiz_row.title,
+            "level": quiz_row.level,
+            "category_id": quiz_row.category_id
+        }
+
+    # Récupérer les réponses de l'utilisateur (format compact ou lignes)
+    answer_orders = {
+        question["id"]: {answer["id"]: answer["order"] for answer in question["answers"]}
+        for question in questions
+    }
+    if archived_selected is not None and attempt.selections is None:
+        selected = archived_selected
+    else:
+        selected = load_selected_answer_ids(db, attempt, answer_orders)
 
     # Construire les questions avec réponses
     questions_with_answers = []
     for question in questions:
-        # Récupérer toutes les réponses possibles
-        all_answers = db.query(Answer).filter(Answer.question_id == question.id).order_by(Answer.order).all()
-
-        # Récupérer les réponses de l'utilisateur pour cette question
-        user_answers = db.query(UserAnswer).filter(
-            UserAnswer.attempt_id == attempt_id,
-            UserAnswer.question_id == question.id
-        ).all()
-        user_answer_ids = [ua.answer_id for ua in user_answers]
+        user_answer_ids = selected.get(question["id"], set())
 
         questions_with_answers.append({
-            "id": question.id,
-            "question_text": question.question_text,
-            "order": question.order,
+            "id": question["id"],
+            "question_text": question["question_text"],
+            "order": question["order"],
             "answers": [
                 {
-                    "id": answer.id,
-                    "answer_text": answer.answer_text,
-                    "is_correct": answer.is_correct,
-                    "order": answer.order,
-                    "user_selected": answer.id in user_answer_ids
+                    "id": answer["id"],
+                    "answer_text": answer["answer_text"],
+                    "is_correct": answer["is_correct"],
+                    "order": answer["order"],
+                    "user_selected": answer["id"] in user_answer_ids
                 }
-                for answer in all_answers
+                for answer in question["answers"]
             ]
         })
 
@@ -239,10 +356,10 @@ def get_attempt_detail(attempt_id: str, db: Session = Depends(get_db), current_u
                 "completed_at": attempt.completed_at
             },
             "quiz": {
-                "id": quiz.id,
-                "title": quiz.title,
-                "level": quiz.level,
-                "category_id": quiz.category_id
+                "id": quiz["id"],
+                "title": quiz["title"],
+                "level": quiz["level"],
+                "category_id": quiz["category_id"]
             },
             "questions_with_answers": questions_with_answers
         },
@@ -250,12 +367,15 @@ def get_attempt_detail(attempt_id: str, db: Session = Depends(get_db), current_u
         "message": "Détail de la tentative récupéré avec succès"
     }
 
-def update_user_progress(db: Session, user_id: str, quiz_id: str):
-    """Met à jour le progrès de l'utilisateur après avoir réussi un quiz"""
+def update_user_progress(db: Session, user_id: str, quiz_id: str) -> bool:
+    """
+    Met à jour le progrès de l'utilisateur après avoir réussi un quiz.
+    Retourne True si une nouvelle catégorie est maîtrisée.
+    """
     # Récupérer le quiz et sa catégorie
     quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
     if not quiz:
-        return
+        return False
 
     # Vérifier si l'utilisateur a déjà un progrès pour cette catégorie
     progress = db.query(UserProgress).filter(
@@ -271,15 +391,19 @@ def update_user_progress(db: Session, user_id: str, quiz_id: str):
         if quiz_level_order > current_level_order:
             progress.current_level = quiz.level
             progress.updated_at = datetime.utcnow()
+            emit(db, PROGRESS_UPDATED, user_id, progress_event(user_id, quiz, False))
+        return False
     else:
         # Créer un nouveau progrès
         progress = UserProgress(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             user_id=user_id,
             category_id=quiz.category_id,
             current_level=quiz.level
         )
         db.add(progress)
+        emit(db, PROGRESS_UPDATED, user_id, progress_event(user_id, quiz, True))
+        return True
 
 def get_level_order(level: str) -> int:
     """Retourne l'ordre numérique du niveau"""
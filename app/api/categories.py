@@ -1,22 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
+from sqlalchemy import exists
 from typing import List, Optional
 from app.db.session import get_db
 from app.models import Category, User, UserRole, Quiz, UserQuizAttempt
 from app.schemas import CategoryResponse, CategoryCreate, CategoryUpdate
+from app.services.attempt_archive import archived_passed_quiz_ids
 from app.services.auth import get_current_user
-import uuid
+from app.services.catalog_store import catalog, list_categories
+from app.services.invalidation import notify_change
+from app.db.ids import new_id
+from app.db.loader import loader
+from app.api.pagination import ListParams, paginate_records, render
 
 router = APIRouter()
  
 @router.get("/", response_model=List[CategoryResponse])
-def get_categories(is_active: Optional[bool] = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    query = db.query(Category)
+def get_categories(
+    response: Response,
+    is_active: Optional[bool] = None,
+    params: ListParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Lecture depuis le catalogue partagé entre les workers (ou une lecture regroupée en base)
+    records = list_categories(db)
     if current_user.role != UserRole.admin:
-        query = query.filter(Category.is_active == True)
+        records = [record for record in records if record["is_active"]]
     if is_active is not None:
-        query = query.filter(Category.is_active == is_active)
-    return query.all()
+        records = [record for record in records if record["is_active"] == is_active]
+    page, next_cursor = paginate_records(records, lambda record: (record["name"], record["id"]), params)
+    return render(page, CategoryResponse, params, next_cursor, response)
 
 @router.post("/", response_model=CategoryResponse)
 def create_category(category: CategoryCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -29,19 +43,26 @@ def create_category(category: CategoryCreate, db: Session = Depends(get_db), cur
         raise HTTPException(status_code=400, detail="Category name already exists")
     
     db_category = Category(
-        id=str(uuid.uuid4()),
+        id=new_id(),
         name=category.name,
         description=category.description,
         icon_url=category.icon_url,
         is_active=category.is_active
     )
     db.add(db_category)
+    notify_change(db, "category", db_category.id, "created")
     db.commit()
     db.refresh(db_category)
     return db_category
 
 @router.get("/{category_id}", response_model=CategoryResponse)
 def get_category(category_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    category = catalog.get(f"category:{category_id}")
+    if category is not None:
+        if current_user.role != UserRole.admin and not category["is_active"]:
+            raise HTTPException(status_code=404, detail="Category not found")
+        return category
+
     category = db.query(Category).filter(Category.id == category_id).first()
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -58,6 +79,7 @@ def update_category(category_id: str, category_update: CategoryUpdate, db: Sessi
         raise HTTPException(status_code=404, detail="Category not found")
     for key, value in category_update.dict().items():
         setattr(db_category, key, value)
+    notify_change(db, "category", category_id, "updated")
     db.commit()
     db.refresh(db_category)
     return db_category
@@ -66,13 +88,13 @@ def update_category(category_id: str, category_update: CategoryUpdate, db: Sessi
 def delete_category(category_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     if current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Not authorized")
-    db_category = db.query(Category).filter(Category.id == category_id).first()
-    if not db_category:
+    if not db.query(exists().where(Category.id == category_id)).scalar():
         raise HTTPException(status_code=404, detail="Category not found")
     # Check if category has quizzes
-    if db_category.quizzes:
+    if db.query(exists().where(Quiz.category_id == category_id)).scalar():
         raise HTTPException(status_code=400, detail="Cannot delete category with associated quizzes")
-    db.delete(db_category)
+    db.query(Category).filter(Category.id == category_id).delete(synchronize_session=False)
+    notify_change(db, "category", category_id, "deleted")
     db.commit()
     return {"message": "Category deleted"}
 
@@ -97,6 +119,22 @@ def get_available_quizzes(category_id: str, db: Session = Depends(get_db), curre
         levels = {"debutant": 1, "intermediaire": 2, "avance": 3}
         return levels.get(level, 0)
     
+    # Quiz prérequis : premier quiz publié de chaque niveau (déjà chargés ci-dessus)
+    first_by_level = {}
+    for quiz in quizzes:
+        first_by_level.setdefault(getattr(quiz.level, "value", quiz.level), quiz)
+
+    # Tentatives réussies avec ≥ 80% sur les quiz prérequis, chargées en une requête
+    passed_attempts = loader(
+        db, UserQuizAttempt, UserQuizAttempt.quiz_id,
+        UserQuizAttempt.user_id == current_user.id,
+        UserQuizAttempt.passed == True,
+        UserQuizAttempt.score >= 80,
+        many=True, name=f"passed:{current_user.id}"
+    ).queue(quiz.id for quiz in first_by_level.values())
+    # Réussites déplacées dans l'archive : les niveaux débloqués le restent
+    archived_passed = archived_passed_quiz_ids(db, current_user.id, (quiz.id for quiz in first_by_level.values()), 80)
+
     result = []
     for quiz in quizzes:
         is_accessible = False
@@ -106,34 +144,14 @@ def get_available_quizzes(category_id: str, db: Session = Depends(get_db), curre
             is_accessible = True
         # Intermédiaire: accessible si quiz débutant passé avec ≥ 80%
         elif quiz.level == "intermediaire":
-            beginner_quiz = db.query(Quiz).filter(
-                Quiz.category_id == category_id,
-                Quiz.level == "debutant",
-                Quiz.status == "published"
-            ).first()
+            beginner_quiz = first_by_level.get("debutant")
             if beginner_quiz:
-                best_attempt = db.query(UserQuizAttempt).filter(
-                    UserQuizAttempt.user_id == current_user.id,
-                    UserQuizAttempt.quiz_id == beginner_quiz.id,
-                    UserQuizAttempt.passed == True,
-                    UserQuizAttempt.score >= 80
-                ).order_by(UserQuizAttempt.score.desc()).first()
-                is_accessible = best_attempt is not None
+                is_accessible = len(passed_attempts.load(beginner_quiz.id)) > 0 or beginner_quiz.id in archived_passed
         # Avancé: accessible si quiz intermédiaire passé avec ≥ 80%
         elif quiz.level == "avance":
-            intermediate_quiz = db.query(Quiz).filter(
-                Quiz.category_id == category_id,
-                Quiz.level == "intermediaire",
-                Quiz.status == "published"
-            ).first()
+            intermediate_quiz = first_by_level.get("intermediaire")
             if intermediate_quiz:
-                best_attempt = db.query(UserQuizAttempt).filter(
-                    UserQuizAttempt.user_id == current_user.id,
-                    UserQuizAttempt.quiz_id == intermediate_quiz.id,
-                    UserQuizAttempt.passed == True,
-                    UserQuizAttempt.score >= 80
-                ).order_by(UserQuizAttempt.score.desc()).first()
-                is_accessible = best_attempt is not None
+                is_accessible = len(passed_attempts.load(intermediate_quiz.id)) > 0 or intermediate_quiz.id in archived_passed
         
         result.append({
             "id": quiz.id,
@@ -0,0 +1,153 @@
+"""
+Pagination par curseur et sélection de champs des listes (catégories, quiz, questions).
+
+Paramètres communs :
+- `limit` : taille de page ; sans `limit` ni `cursor`, la liste complète est renvoyée
+  comme avant ;
+- `cursor` : valeur opaque renvoyée dans l'en-tête `X-Next-Cursor` de la page
+  précédente (absent sur la dernière page). Le curseur porte la clé de tri de la
+  dernière ligne servie, donc les insertions concurrentes ne décalent pas les pages ;
+- `fields` : champs à renvoyer, séparés par des virgules (`fields=id,title`).
+"""
+import base64
+import json
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, Query, Response
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import literal, tuple_
+from app.db.ids import UUIDType, is_uuid
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = json.dumps([str(value) if not isinstance(value, (int, float)) else value for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def _matches(value: Any, expected: type) -> bool:
+    if isinstance(value, bool):
+        return False
+    if expected is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> Tuple[Any, ...]:
+    """Valeurs d'un curseur, une par type de `types` (int, float ou str) ; 400 si elles ne correspondent pas"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(types) or not all(
+        _matches(value, expected) for value, expected in zip(values, types)
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return tuple(values)
+
+def _cursor_type(value: Any) -> type:
+    """Type d'une valeur de clé une fois passée par `encode_cursor`"""
+    return type(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else str
+
+def _column_cursor_type(column) -> type:
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return str
+    return python_type if python_type in (int, float) else str
+
+@lru_cache(maxsize=None)
+def _field_adapter(schema, name: str) -> TypeAdapter:
+    return TypeAdapter(schema.model_fields[name].annotation)
+
+class ListParams:
+    """Paramètres de pagination et de sélection de champs, à injecter avec `Depends()`"""
+
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+        cursor: Optional[str] = None,
+        fields: Optional[str] = None
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.fields = fields
+
+    @property
+    def paginated(self) -> bool:
+        return self.limit is not None or self.cursor is not None
+
+    @property
+    def page_size(self) -> int:
+        return self.limit or DEFAULT_LIMIT
+
+    def field_names(self, schema) -> Optional[List[str]]:
+        """Champs demandés, dans l'ordre du schéma ; 400 si un champ est inconnu"""
+        if not self.fields:
+            return None
+        requested = {name.strip() for name in self.fields.split(",") if name.strip()}
+        unknown = sorted(requested - set(schema.model_fields))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        return [name for name in schema.model_fields if name in requested]
+
+    def wants(self, schema, name: str) -> bool:
+        """Vrai si le champ `name` figure dans la réponse (tous les champs sans `fields`)"""
+        names = self.field_names(schema)
+        return names is None or name in names
+
+def paginate_records(records: List[dict], key: Callable[[dict], tuple], params: ListParams) -> Tuple[List[dict], Optional[str]]:
+    """Page d'une liste en mémoire (catalogue), triée par `key`"""
+    if not params.paginated:
+        return records, None
+    ordered = sorted(records, key=key)
+    if params.cursor and ordered:
+        after = decode_cursor(params.cursor, [_cursor_type(value) for value in key(ordered[0])])
+        ordered = [record for record in ordered if key(record) > after]
+    page = ordered[:params.page_size]
+    next_cursor = encode_cursor(key(page[-1])) if len(ordered) > params.page_size else None
+    return page, next_cursor
+
+def paginate_query(query, columns: Sequence, params: ListParams) -> Tuple[List[Any], Optional[str]]:
+    """Page d'une requête ORM par clé de tri (keyset) sur `columns`, sans OFFSET"""
+    query = query.order_by(*columns)
+    if not params.paginated:
+        return query.all(), None
+    if params.cursor:
+        after = decode_cursor(params.cursor, [_column_cursor_type(column) for column in columns])
+        if any(isinstance(column.type, UUIDType) and not is_uuid(value) for column, value in zip(columns, after)):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # Valeurs liées avec le type de leur colonne (UUID stockés en hexadécimal sous SQLite)
+        bound = [literal(value, column.type) for column, value in zip(columns, after)]
+        query = query.filter(tuple_(*columns) > tuple_(*bound))
+    rows = query.limit(params.page_size + 1).all()
+    page = rows[:params.page_size]
+    next_cursor = None
+    if len(rows) > params.page_size:
+        last = page[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    return page, next_cursor
+
+def render(items: List[Any], schema, params: ListParams, next_cursor: Optional[str], response: Response):
+    """
+    Réponse de liste : les objets tels quels (validés par le `response_model` de la route),
+    ou seulement les champs demandés, sérialisés champ par champ sans valider le reste.
+    """
+    names = params.field_names(schema)
+    if names is None:
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return items
+
+    data = []
+    for item in items:
+        row = {}
+        for name in names:
+            value = item[name] if isinstance(item, dict) else getattr(item, name)
+            adapter = _field_adapter(schema, name)
+            row[name] = adapter.dump_python(adapter.validate_python(value, from_attributes=True), mode="json")
+        data.append(row)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return JSONResponse(data, headers=headers)
@@ -1,26 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import insert, update
+from typing import List, Optional, Tuple
 from app.db.session import get_db
 from app.models import Question, User, UserRole, Quiz, Answer
-from app.schemas import QuestionResponse, QuestionCreate, QuestionUpdate
+from app.schemas import QuestionResponse, QuestionCreate, QuestionUpdate, AnswerUpdate
 from app.services.auth import get_current_user
-import uuid
+from app.services.answer_storage import question_has_answers
+from app.services.invalidation import notify_change
+from app.services.near_duplicates import index_question
+from app.services.search import SearchQuery, search, tokenize
+from app.db.ids import new_id
+from app.api.pagination import ListParams, paginate_query, render
 
 router = APIRouter()
 
 @router.get("/", response_model=List[QuestionResponse])
 def get_questions(
+    response: Response,
     quiz_id: Optional[str] = None,
+    q: Optional[str] = None,
+    page: Optional[int] = Query(None, ge=1),
+    per_page: Optional[int] = Query(None, ge=1, le=100),
+    params: ListParams = Depends(),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Not authorized")
+    # Search results are ranked, so they page by number; the plain list pages by cursor
+    if q and params.paginated:
+        raise HTTPException(status_code=400, detail="Use page and per_page with q, not limit and cursor")
+    if not q and (page is not None or per_page is not None):
+        raise HTTPException(status_code=400, detail="page and per_page require q; use limit and cursor")
     query = db.query(Question)
+    # Answers are loaded for the whole page in one extra query, only when they are returned
+    if params.wants(QuestionResponse, "answers"):
+        query = query.options(selectinload(Question.answers))
+    if q:
+        # Full-text search: questions ranked by relevance, one page at a time
+        hits, _ = search(db, SearchQuery(
+            terms=tokenize(q), types=("question",), is_admin=True, quiz_id=quiz_id, page=page or 1, page_size=per_page or 50
+        ))
+        ids = [hit["id"] for hit in hits]
+        questions = {str(question.id): question for question in query.filter(Question.id.in_(ids))}
+        ranked = [questions[question_id] for question_id in ids if question_id in questions]
+        return render(ranked, QuestionResponse, params, None, response)
     if quiz_id:
         query = query.filter(Question.quiz_id == quiz_id)
-    return query.order_by(Question.order).all()
+    questions, next_cursor = paginate_query(query, [Question.order, Question.id], params)
+    return render(questions, QuestionResponse, params, next_cursor, response)
 
 @router.post("/", response_model=QuestionResponse)
 def create_question(question: QuestionCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -40,17 +69,18 @@ def create_question(question: QuestionCreate, db: Session = Depends(get_db), cur
         raise HTTPException(status_code=400, detail="Order must be unique for this quiz")
 
     db_question = Question(
-        id=str(uuid.uuid4()),
+        id=new_id(),
         quiz_id=question.quiz_id,
         question_text=question.question_text,
-        order=question.order
+        order=question.order,
+        stratum=question.stratum
     )
     db.add(db_question)
 
     # Create answers
     for answer_data in question.answers:
         db_answer = Answer(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             question_id=db_question.id,
             answer_text=answer_data.answer_text,
             is_correct=answer_data.is_correct,
@@ -58,6 +88,8 @@ def create_question(question: QuestionCreate, db: Session = Depends(get_db), cur
         )
         db.add(db_answer)
 
+    index_question(db, db_question.id, db_question.question_text)
+    notify_change(db, "question", db_question.id, "created", quiz_id=question.quiz_id)
     db.commit()
     db.refresh(db_question)
     return db_question
@@ -90,23 +122,32 @@ def update_question(question_id: str, question_update: QuestionUpdate, db: Sessi
             raise HTTPException(status_code=400, detail="Order must be unique for this quiz")
 
     # Update question
+    text_changed = db_question.question_text != question_update.question_text
     db_question.question_text = question_update.question_text
     db_question.order = question_update.order
+    db_question.stratum = question_update.stratum
 
-    # Delete existing answers
-    db.query(Answer).filter(Answer.question_id == question_id).delete()
+    # Apply answer changes as a diff so unchanged answers keep their ids
+    existing_answers = db.query(Answer).filter(Answer.question_id == question_id).all()
+    updates, inserts, deleted_ids = diff_answers(existing_answers, question_update.answers)
 
-    # Create new answers
-    for answer_data in question_update.answers:
-        db_answer = Answer(
-            id=str(uuid.uuid4()),
-            question_id=question_id,
-            answer_text=answer_data.answer_text,
-            is_correct=answer_data.is_correct,
-            order=answer_data.order
-        )
-        db.add(db_answer)
+    # Compact selections are bitmasks over answer orders: once the question has been answered,
+    # deleting or reordering answers would change what stored masks decode to
+    current_orders = {answer.id: answer.order for answer in existing_answers}
+    reordered = any(row["order"] != current_orders[row["id"]] for row in updates)
+    if (deleted_ids or reordered) and question_has_answers(db, question_id, db_question.quiz_id):
+        raise HTTPException(status_code=400, detail="Cannot delete or reorder answers of a question with associated user answers")
+
+    if updates:
+        db.execute(update(Answer), updates)
+    if inserts:
+        db.execute(insert(Answer), [dict(row, question_id=question_id) for row in inserts])
+    if deleted_ids:
+        db.query(Answer).filter(Answer.id.in_(deleted_ids)).delete(synchronize_session=False)
 
+    if text_changed:
+        index_question(db, question_id, db_question.question_text)
+    notify_change(db, "question", question_id, "updated", quiz_id=db_question.quiz_id)
     db.commit()
     db.refresh(db_question)
     return db_question
@@ -115,12 +156,52 @@ def update_question(question_id: str, question_update: QuestionUpdate, db: Sessi
 def delete_question(question_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     if current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Not authorized")
-    db_question = db.query(Question).filter(Question.id == question_id).first()
-    if not db_question:
+    quiz_id = db.query(Question.quiz_id).filter(Question.id == question_id).scalar()
+    if not quiz_id:
         raise HTTPException(status_code=404, detail="Question not found")
     # Check if question has user answers (attempts)
-    if db_question.user_answers:
+    if question_has_answers(db, question_id, quiz_id):
         raise HTTPException(status_code=400, detail="Cannot delete question with associated user answers")
-    db.delete(db_question)
+    db.query(Answer).filter(Answer.question_id == question_id).delete(synchronize_session=False)
+    db.query(Question).filter(Question.id == question_id).delete(synchronize_session=False)
+    notify_change(db, "question", question_id, "deleted", quiz_id=quiz_id)
     db.commit()
-    return {"message": "Question deleted"}
\ No newline at end of file
+    return {"message": "Question deleted"}
+
+def diff_answers(existing_answers: List[Answer], incoming: List[AnswerUpdate]) -> Tuple[List[dict], List[dict], List[str]]:
+    """
+    Compare the stored answers of a question with the submitted ones.
+    Submitted answers are matched by id first, then by order among the remaining ones.
+    Returns (rows to update, rows to insert, ids to delete); unchanged answers are left out.
+    """
+    by_id = {answer.id: answer for answer in existing_answers}
+    matched = {}
+    unmatched = []
+    for index, answer_data in enumerate(incoming):
+        if answer_data.id and answer_data.id in by_id:
+            matched[index] = by_id.pop(answer_data.id)
+        else:
+            unmatched.append(index)
+
+    by_order = {}
+    for answer in by_id.values():
+        by_order.setdefault(answer.order, answer)
+    for index in unmatched:
+        answer = by_order.pop(incoming[index].order, None)
+        if answer is not None:
+            matched[index] = by_id.pop(answer.id)
+
+    updates, inserts = [], []
+    for index, answer_data in enumerate(incoming):
+        values = {
+            "answer_text": answer_data.answer_text,
+            "is_correct": answer_data.is_correct,
+            "order": answer_data.order
+        }
+        answer = matched.get(index)
+        if answer is None:
+            inserts.append(dict(values, id=new_id()))
+        elif any(getattr(answer, key) != value for key, value in values.items()):
+            updates.append(dict(values, id=answer.id))
+
+    return updates, inserts, list(by_id)
@@ -1,22 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
+from sqlalchemy import exists, select
 from typing import List, Optional
 from app.db.session import get_db
-from app.models import Quiz, User, UserRole, Category, Question, Answer
-from app.schemas import QuizResponse, QuizCreate, QuizUpdate, QuestionCreateForQuiz, QuestionResponse
+from app.models import Quiz, QuizStatus, QuizVersion, User, UserRole, Category, Question, Answer, UserQuizAttempt
+from app.schemas import QuizResponse, QuizCreate, QuizUpdate, QuestionCreateForQuiz, QuestionResponse, QuizVersionSummary
+from app.services.attempt_archive import quiz_has_archived_attempts
 from app.services.auth import get_current_user
-import uuid
+from app.services.catalog_store import catalog
+from app.services.invalidation import notify_change
+from app.services.near_duplicates import index_question
+from app.services.quiz_versions import publish, get_version_content, public_content
+from app.db.ids import new_id
+from app.api.pagination import ListParams, paginate_query, paginate_records, render
 
 router = APIRouter()
 
 @router.get("/", response_model=List[QuizResponse])
 def get_quizzes(
+    response: Response,
     category_id: Optional[str] = None,
     level: Optional[str] = None,
     status: Optional[str] = None,
+    params: ListParams = Depends(),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    # Published quizzes are served from the catalog shared between workers when available
+    records = catalog.get("quizzes") if current_user.role != UserRole.admin else None
+    if records is not None:
+        records = [
+            record for record in records
+            if (not category_id or record["category_id"] == category_id)
+            and (not level or record["level"] == level)
+            and (not status or record["status"] == status)
+        ]
+        page, next_cursor = paginate_records(records, lambda record: (record["id"],), params)
+        return render(page, QuizResponse, params, next_cursor, response)
+
     query = db.query(Quiz)
     if current_user.role != UserRole.admin:
         query = query.filter(Quiz.status == "published")
@@ -26,7 +47,9 @@ def get_quizzes(
         query = query.filter(Quiz.level == level)
     if status:
         query = query.filter(Quiz.status == status)
-    return query.all()
+    # Keyset pagination on the time-ordered ids
+    page, next_cursor = paginate_query(query, [Quiz.id], params)
+    return render(page, QuizResponse, params, next_cursor, response)
 
 @router.post("/", response_model=QuizResponse)
 def create_quiz(quiz: QuizCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -37,19 +60,29 @@ def create_quiz(quiz: QuizCreate, db: Session = Depends(get_db), current_user: U
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     db_quiz = Quiz(
-        id=str(uuid.uuid4()),
+        id=new_id(),
         category_id=quiz.category_id,
         title=quiz.title,
         level=quiz.level,
-        status=quiz.status
+        status=quiz.status,
+        sample_size=quiz.sample_size,
+        stratified=quiz.stratified,
+        time_limit_minutes=quiz.time_limit_minutes
     )
     db.add(db_quiz)
+    if db_quiz.status == QuizStatus.published:
+        db.flush()
+        publish(db, db_quiz)
+    notify_change(db, "quiz", db_quiz.id, "created")
     db.commit()
     db.refresh(db_quiz)
     return db_quiz
 
 @router.get("/{quiz_id}", response_model=QuizResponse)
 def get_quiz(quiz_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    record = catalog.get(f"quiz:{quiz_id}")
+    if record is not None:
+        return record
     quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
@@ -66,6 +99,11 @@ def update_quiz(quiz_id: str, quiz_update: QuizUpdate, db: Session = Depends(get
         raise HTTPException(status_code=404, detail="Quiz not found")
     for key, value in quiz_update.dict().items():
         setattr(db_quiz, key, value)
+    # Publishing freezes the current content into a new version
+    if db_quiz.status == QuizStatus.published:
+        db.flush()
+        publish(db, db_quiz)
+    notify_change(db, "quiz", quiz_id, "updated")
     db.commit()
     db.refresh(db_quiz)
     return db_quiz
@@ -74,16 +112,72 @@ def update_quiz(quiz_id: str, quiz_update: QuizUpdate, db: Session = Depends(get
 def delete_quiz(quiz_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     if current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Not authorized")
-    db_quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
-    if not db_quiz:
+    if not db.query(exists().where(Quiz.id == quiz_id)).scalar():
         raise HTTPException(status_code=404, detail="Quiz not found")
-    # Check if quiz has attempts
-    if db_quiz.attempts:
+    # Check if quiz has attempts (archived ones included)
+    if db.query(exists().where(UserQuizAttempt.quiz_id == quiz_id)).scalar() or quiz_has_archived_attempts(db, quiz_id):
         raise HTTPException(status_code=400, detail="Cannot delete quiz with attempts")
-    db.delete(db_quiz)
+    # Bulk delete answers, questions then the quiz (ON DELETE CASCADE covers the statistics and similarity tables)
+    quiz_questions = select(Question.id).where(Question.quiz_id == quiz_id)
+    db.query(Answer).filter(Answer.question_id.in_(quiz_questions)).delete(synchronize_session=False)
+    db.query(Question).filter(Question.quiz_id == quiz_id).delete(synchronize_session=False)
+    db.query(QuizVersion).filter(QuizVersion.quiz_id == quiz_id).delete(synchronize_session=False)
+    db.query(Quiz).filter(Quiz.id == quiz_id).delete(synchronize_session=False)
+    notify_change(db, "quiz", quiz_id, "deleted")
     db.commit()
     return {"message": "Quiz deleted"}
 
+@router.post("/{quiz_id}/publish", response_model=QuizResponse)
+def publish_quiz(quiz_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Publish the quiz's current content as a new immutable version (no-op if unchanged)"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    db_quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+    if not db_quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    publish(db, db_quiz)
+    notify_change(db, "quiz", quiz_id, "updated")
+    db.commit()
+    db.refresh(db_quiz)
+    return db_quiz
+
+@router.get("/{quiz_id}/versions", response_model=List[QuizVersionSummary])
+def get_quiz_versions(quiz_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return db.query(QuizVersion.id, QuizVersion.quiz_id, QuizVersion.version, QuizVersion.created_at).filter(
+        QuizVersion.quiz_id == quiz_id
+    ).order_by(QuizVersion.version.desc()).all()
+
+@router.get("/{quiz_id}/versions/{version_id}")
+def get_quiz_version(
+    quiz_id: str,
+    version_id: str,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Frozen content of a version. Versions never change, so the response is cacheable
+    forever and revalidated by its ETag (the version id).
+    """
+    is_admin = current_user.role == UserRole.admin
+    if not is_admin and not db.query(exists().where(
+        Quiz.id == quiz_id, Quiz.status == QuizStatus.published
+    )).scalar():
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    content = get_version_content(db, version_id)
+    if content is None or content["quiz"]["id"] != quiz_id:
+        raise HTTPException(status_code=404, detail="Version not found")
+
+    etag = f'"{version_id}{"" if is_admin else "-public"}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return content if is_admin else public_content(content)
+
 @router.post("/{quiz_id}/questions", response_model=QuestionResponse)
 def create_question_for_quiz(quiz_id: str, question: QuestionCreateForQuiz, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """Ajouter une question à un quiz spécifique"""
@@ -104,17 +198,18 @@ def create_question_for_quiz(quiz_id: str, question: QuestionCreateForQuiz, db:
         raise HTTPException(status_code=400, detail="Order must be unique for this quiz")
 
     db_question = Question(
-        id=str(uuid.uuid4()),
+        id=new_id(),
         quiz_id=quiz_id,
         question_text=question.question_text,
-        order=question.order
+        order=question.order,
+        stratum=question.stratum
     )
     db.add(db_question)
 
     # Créer les réponses
     for answer_data in question.answers:
         db_answer = Answer(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             question_id=db_question.id,
             answer_text=answer_data.answer_text,
             is_correct=answer_data.is_correct,
@@ -122,6 +217,8 @@ def create_question_for_quiz(quiz_id: str, question: QuestionCreateForQuiz, db:
         )
         db.add(db_answer)
 
+    index_question(db, db_question.id, db_question.question_text)
+    notify_change(db, "question", db_question.id, "created", quiz_id=quiz_id)
     db.commit()
     db.refresh(db_question)
     return db_question
\ No newline at end of file
@@ -11,6 +11,7 @@ from .questions import router as questions_router
 from .attempts import router as attempts_router
 from .admin import router as admin_router
 from .users import router as users_router
+from .search import router as search_router
 
 router = APIRouter()
 
@@ -110,4 +111,5 @@ router.include_router(quizzes_router, prefix="/quizzes", tags=["Quizzes"])
 router.include_router(questions_router, prefix="/questions", tags=["Questions"])
 router.include_router(attempts_router, prefix="/attempts", tags=["Attempts"])
 router.include_router(admin_router, prefix="/admin", tags=["Admin"])
-router.include_router(users_router, prefix="/users", tags=["Users"])
\ No newline at end of file
+router.include_router(users_router, prefix="/users", tags=["Users"])
+router.include_router(search_router, prefix="/search", tags=["Search"])
\ No newline at end of file
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+import math
+from app.db.session import get_db
+from app.models import User, UserRole
+from app.schemas import SearchResults
+from app.services.auth import get_current_user
+from app.services.search import TYPES, SearchQuery, backend, search, tokenize
+
+router = APIRouter()
+
+@router.get("/", response_model=SearchResults)
+def search_content(
+    q: str,
+    types: Optional[str] = None,
+    quiz_id: Optional[str] = None,
+    category_id: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Recherche plein texte classée. `types` : liste séparée par des virgules parmi
+    category, quiz, question (questions réservées aux administrateurs).
+    """
+    requested = tuple(kind.strip() for kind in types.split(",")) if types else TYPES
+    unknown = [kind for kind in requested if kind not in TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown search types: {', '.join(unknown)}")
+
+    query = SearchQuery(
+        terms=tokenize(q),
+        types=requested,
+        is_admin=current_user.role == UserRole.admin,
+        quiz_id=quiz_id,
+        category_id=category_id,
+        page=page,
+        page_size=per_page
+    )
+    hits, total = search(db, query)
+    return {
+        "data": hits,
+        "meta": {
+            "total": total,
+            "page": page,
+            "per_page": per_page,
+            "total_pages": math.ceil(total / per_page) if total > 0 else 0,
+            "backend": backend(db)
+        }
+    }
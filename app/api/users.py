@@ -1,67 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from typing import List
 from app.db.session import get_db
+from app.db.loader import loader
 from app.models import User, UserQuizAttempt, UserProgress, Category, Quiz
 from app.schemas import UserStats
+from app.services.attempt_archive import archived_history
 from app.services.auth import get_current_user
+from app.services.user_stats import dashboard
 
 router = APIRouter()
 
 @router.get("/me/stats", response_model=UserStats)
 def get_user_stats(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    """Récupère les statistiques de l'utilisateur"""
-    # Nombre total de tentatives
-    total_attempts = db.query(func.count(UserQuizAttempt.id)).filter(
-        UserQuizAttempt.user_id == current_user.id
-    ).scalar()
-
-    # Score moyen
-    avg_score_query = db.query(func.avg(UserQuizAttempt.score)).filter(
-        UserQuizAttempt.user_id == current_user.id
-    ).scalar()
-    average_score = round(avg_score_query, 2) if avg_score_query else 0.0
-
-    # Nombre de catégories maîtrisées
-    categories_mastered = db.query(func.count(UserProgress.id)).filter(
-        UserProgress.user_id == current_user.id
-    ).scalar()
-
-    # Tentatives récentes (5 dernières)
-    recent_attempts_query = db.query(UserQuizAttempt).filter(
-        UserQuizAttempt.user_id == current_user.id,
-        UserQuizAttempt.completed_at != None
-    ).order_by(UserQuizAttempt.completed_at.desc()).limit(5).all()
-
-    recent_attempts = []
-    for attempt in recent_attempts_query:
-        quiz = db.query(Quiz).filter(Quiz.id == attempt.quiz_id).first()
-        recent_attempts.append({
-            "id": attempt.id,
-            "quiz_title": quiz.title if quiz else "Unknown Quiz",
-            "score": attempt.score,
-            "passed": attempt.passed,
-            "completed_at": attempt.completed_at.isoformat() if attempt.completed_at else None
-        })
-
-    return {
-        "total_attempts": total_attempts,
-        "average_score": average_score,
-        "categories_mastered": categories_mastered,
-        "recent_attempts": recent_attempts
-    }
+    """Récupère les statistiques de l'utilisateur (ligne de synthèse, lue par clé primaire)"""
+    return dashboard(db, current_user.id)
 
 @router.get("/me/attempts", response_model=List[dict])
-def get_user_attempts_alias(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_user_attempts_alias(include_archived: bool = False, db: Session = Depends(get_db),
+                            current_user: User = Depends(get_current_user)):
     """Alias pour GET /attempts/attempts - Historique des tentatives de l'utilisateur"""
     attempts = db.query(UserQuizAttempt).filter(
         UserQuizAttempt.user_id == current_user.id
     ).order_by(UserQuizAttempt.completed_at.desc()).all()
 
+    # Quiz chargés en une requête pour toute la boucle
+    quizzes = loader(db, Quiz).queue(attempt.quiz_id for attempt in attempts)
+
     result = []
     for attempt in attempts:
-        quiz = db.query(Quiz).filter(Quiz.id == attempt.quiz_id).first()
+        quiz = quizzes.load(attempt.quiz_id)
         result.append({
             "id": attempt.id,
             "quiz_title": quiz.title if quiz else "Unknown Quiz",
@@ -70,6 +38,10 @@ def get_user_attempts_alias(db: Session = Depends(get_db), current_user: User =
             "completed_at": attempt.completed_at
         })
 
+    # Tentatives anciennes déplacées dans l'archive, lues seulement à la demande
+    if include_archived:
+        result.extend(archived_history(db, current_user.id))
+
     return result
 
 @router.get("/me/progress", response_model=List[dict])
@@ -79,9 +51,12 @@ def get_user_progress_alias(db: Session = Depends(get_db), current_user: User =
         UserProgress.user_id == current_user.id
     ).all()
 
+    # Catégories chargées en une requête pour toute la boucle
+    categories = loader(db, Category).queue(progress.category_id for progress in progress_list)
+
     result = []
     for progress in progress_list:
-        category = db.query(Category).filter(Category.id == progress.category_id).first()
+        category = categories.load(progress.category_id)
         if category:
             result.append({
                 "category": {
@@ -0,0 +1,166 @@
+"""
+Contrôle d'admission : limite le nombre de requêtes traitées simultanément.
+
+Chaque requête est rattachée à une classe de route (auth, attempts, catalog, admin)
+avec sa propre limite de concurrence. Au-delà, les requêtes attendent dans une file
+bornée, servie par ordre de priorité (les soumissions de quiz avant les tableaux de
+bord admin). Une file pleine donne un 429, une attente trop longue un 503, toujours
+avec un en-tête Retry-After.
+"""
+import asyncio
+import heapq
+import itertools
+from typing import Dict, List, Optional
+from starlette.responses import JSONResponse
+from app.core.config import settings
+
+# Plus la valeur est faible, plus la classe est prioritaire
+PRIORITIES = {"attempts": 0, "auth": 1, "catalog": 2, "admin": 3}
+
+EXEMPT_PATHS = ("/health", "/docs", "/redoc", "/openapi.json")
+
+def classify_request(method: str, path: str) -> Optional[str]:
+    """Retourne la classe de route d'une requête, ou None si elle n'est pas limitée"""
+    if method == "OPTIONS" or path.startswith(EXEMPT_PATHS):
+        return None
+    if path.startswith("/auth/"):
+        return "auth"
+    if path.startswith("/admin/"):
+        return "admin"
+    if method == "POST" and path.startswith(("/attempts/start/", "/attempts/submit/")):
+        return "attempts"
+    return "catalog"
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        self.status_code = status_code
+        self.detail = detail
+
+class AdmissionController:
+    """
+    Sémaphore à priorités : une capacité globale (dimensionnée sur le pool de connexions)
+    partagée entre les classes, chacune plafonnée par sa propre limite.
+    """
+
+    def __init__(self, capacity: int, limits: Dict[str, int], queue_size: int, queue_timeout: float):
+        self.capacity = capacity
+        self.limits = limits
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active_total = 0
+        self.active = {name: 0 for name in limits}
+        self.queued = {name: 0 for name in limits}
+        self._waiters: List[list] = []
+        self._sequence = itertools.count()
+
+    def _can_run(self, route_class: str) -> bool:
+        return self.active_total < self.capacity and self.active[route_class] < self.limits[route_class]
+
+    def _has_priority_waiters(self, route_class: str) -> bool:
+        """Vrai si une requête au moins aussi prioritaire attend et pourrait passer avant"""
+        priority = PRIORITIES[route_class]
+        return any(
+            count and PRIORITIES[name] <= priority and self._can_run(name)
+            for name, count in self.queued.items()
+        )
+
+    def _grant(self, route_class: str):
+        self.active_total += 1
+        self.active[route_class] += 1
+
+    async def acquire(self, route_class: str):
+        if self._can_run(route_class) and not self._has_priority_waiters(route_class):
+            self._grant(route_class)
+            return
+
+        if self.queued[route_class] >= self.queue_size:
+            raise AdmissionRejected(429, "Too many requests, please retry later")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [PRIORITIES[route_class], next(self._sequence), route_class, future])
+        self.queued[route_class] += 1
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            # La place a pu être accordée juste avant l'expiration : la rendre ; sinon le
+            # future est annulé et _wake l'ignorera
+            if future.done() and not future.cancelled():
+                self.release(route_class)
+            else:
+                self.queued[route_class] -= 1
+            raise AdmissionRejected(503, "Service overloaded, please retry later")
+        except asyncio.CancelledError:
+            # Client déconnecté pendant l'attente : rendre la place si elle venait d'être accordée
+            if future.done() and not future.cancelled():
+                self.release(route_class)
+            else:
+                self.queued[route_class] -= 1
+            raise
+
+    def release(self, route_class: str):
+        self.active_total -= 1
+        self.active[route_class] -= 1
+        self._wake()
+
+    def _wake(self):
+        """Accorde les places libérées aux requêtes en attente les plus prioritaires"""
+        skipped = []
+        while self._waiters and self.active_total < self.capacity:
+            waiter = heapq.heappop(self._waiters)
+            route_class, future = waiter[2], waiter[3]
+            if future.done():
+                continue
+            if not self._can_run(route_class):
+                skipped.append(waiter)
+                continue
+            self.queued[route_class] -= 1
+            self._grant(route_class)
+            future.set_result(None)
+        for waiter in skipped:
+            heapq.heappush(self._waiters, waiter)
+
+def build_controller() -> AdmissionController:
+    return AdmissionController(
+        capacity=settings.admission_max_concurrency,
+        limits={
+            "auth": settings.admission_auth_limit,
+            "attempts": settings.admission_attempts_limit,
+            "catalog": settings.admission_catalog_limit,
+            "admin": settings.admission_admin_limit,
+        },
+        queue_size=settings.admission_queue_size,
+        queue_timeout=settings.admission_queue_timeout,
+    )
+
+class AdmissionControlMiddleware:
+    """Middleware ASGI appliquant le contrôle d'admission avant le routage"""
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or build_controller()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.admission_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = classify_request(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire(route_class)
+        except AdmissionRejected as exc:
+            response = JSONResponse(
+                {"detail": exc.detail},
+                status_code=exc.status_code,
+                headers={"Retry-After": str(settings.admission_retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route_class)
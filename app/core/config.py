@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     # Database
@@ -13,6 +13,68 @@ class Settings(BaseSettings):
     # App
     app_name: str = "Quiz Programming API"
     debug: bool = True
+
+    # Stockage des réponses des tentatives : "compact" (une structure par tentative) ou "rows"
+    answer_storage: str = "compact"
+
+    # Contrôle d'admission (voir app/core/admission.py)
+    admission_enabled: bool = True
+    admission_max_concurrency: int = 15  # pool_size + max_overflow du moteur SQLAlchemy
+    admission_auth_limit: int = 6
+    admission_attempts_limit: int = 12
+    admission_catalog_limit: int = 8
+    admission_admin_limit: int = 3
+    admission_queue_size: int = 100  # requêtes en attente par classe de route
+    admission_queue_timeout: float = 3.0  # secondes
+    admission_retry_after: int = 2  # secondes
+
+    # Catalogue partagé entre les workers (voir app/services/catalog_store.py) ;
+    # un chemin sous /dev/shm évite toute écriture disque sous Linux
+    catalog_store_enabled: bool = True
+    catalog_store_path: str = "/tmp/quiz-api/catalog.bin"
+
+    # Bus d'invalidation des caches (LISTEN/NOTIFY, voir app/services/invalidation.py)
+    invalidation_listener_enabled: bool = True
+
+    # Profilage à la demande (voir app/core/profiling.py) : en-tête X-Profile: 1 d'un
+    # administrateur, ou tirage d'une fraction des requêtes
+    profiling_enabled: bool = True
+    profiling_sample_rate: float = 0.0
+    profiling_interval: float = 0.005  # secondes entre deux échantillons
+    profiling_output_dir: str = "/tmp/quiz-api/profiles"
+
+    # Journal des requêtes SQL lentes (voir app/core/slow_queries.py)
+    slow_query_log_enabled: bool = True
+    slow_query_threshold_ms: float = 200.0
+    slow_query_explain_rate: float = 0.1  # fraction des requêtes lentes dont le plan est capturé
+    slow_query_top_k: int = 20
+
+    # Quasi-doublons de questions : similarité de Jaccard estimée (MinHash) à partir de laquelle signaler
+    duplicate_similarity_threshold: float = 0.8
+
+    # Expiration des tentatives abandonnées (voir app/services/attempt_expiry.py)
+    attempt_time_limit_minutes: int = 120  # quand le quiz n'a pas sa propre limite
+    attempt_sweeper_enabled: bool = True
+    attempt_sweep_interval: float = 60.0  # secondes entre deux passages
+    attempt_sweep_batch_size: int = 500
+    attempt_sweep_max_batches: int = 20  # lots par passage
+
+    # Archivage des tentatives anciennes (voir app/services/attempt_archive.py)
+    attempt_archive_after_days: int = 365
+    attempt_archive_batch_size: int = 1000
+
+    # Instantané colonnaire des réponses pour l'analyse (voir app/services/answer_snapshot.py)
+    analytics_snapshot_dir: str = "/tmp/quiz-api/analytics"
+
+    # Outbox des événements métier (voir app/services/outbox.py)
+    # Consommateurs et destinations, ex. {"lms": "https://lms.example.com/hooks/quiz", "emails": "file:/var/lib/quiz-api/emails.jsonl"}
+    outbox_consumers: Dict[str, str] = {}
+    outbox_relay_enabled: bool = True
+    outbox_relay_interval: float = 5.0  # secondes entre deux passages
+    outbox_batch_size: int = 200
+    outbox_max_batches: int = 10  # lots par consommateur et par passage
+    outbox_webhook_timeout: float = 10.0
+    outbox_retention_days: int = 7
     
     class Config:
         env_file = ".env"
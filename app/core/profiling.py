@@ -0,0 +1,216 @@
+"""
+Profilage à la demande d'une requête, en production.
+
+Une requête est profilée quand elle porte l'en-tête `X-Profile: 1` avec le jeton d'un
+administrateur, ou tirée au sort selon `profiling_sample_rate`. Un thread
+échantillonne alors toutes les `profiling_interval` secondes les piles d'appels
+(`sys._current_frames`) des threads occupés du worker : la boucle d'événements et les
+threads qui exécutent les routes synchrones. Les requêtes concurrentes du même worker
+apparaissent donc aussi dans le profil, sous leur propre racine de thread.
+
+Le profil est écrit dans `profiling_output_dir` :
+- `<id>.collapsed` : piles repliées (« a;b;c 12 »), lisibles par flamegraph.pl ou speedscope ;
+- `<id>.json` : méta-données de la requête et temps SQL (nombre, total, requêtes
+  les plus coûteuses), mesuré exactement via les événements SQLAlchemy.
+
+L'id du profil est renvoyé dans l'en-tête `X-Profile-Id`. Sans profilage, le coût se
+limite à la lecture des en-têtes et à un tirage aléatoire.
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional
+from jose import JWTError, jwt
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.db.ids import new_id
+from app.db.session import SessionLocal
+from app.models import User, UserRole
+
+PROFILE_HEADER = b"x-profile"
+
+# Fonctions en attente : un thread dont la pile se termine ainsi est inoccupé
+IDLE_FRAMES = {("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select")}
+
+class SqlTimings:
+    """Temps SQL d'une requête profilée"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.by_statement: Dict[str, list] = {}
+
+    def add(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        key = " ".join(statement.split())[:300]
+        entry = self.by_statement.setdefault(key, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+
+    def summary(self, limit: int = 10) -> dict:
+        top = sorted(self.by_statement.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "statements": [
+                {"statement": statement, "count": count, "total_ms": round(total * 1000, 3)}
+                for statement, (count, total) in top
+            ]
+        }
+
+_current_sql: ContextVar[Optional[SqlTimings]] = ContextVar("profiling_sql", default=None)
+_hooks_installed = False
+
+def _install_sql_hooks():
+    """Branche la mesure du temps SQL au premier profil (aucun coût avant)"""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    _hooks_installed = True
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current_sql.get() is not None:
+            conn.info.setdefault("profiling_started", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        timings = _current_sql.get()
+        if timings is not None and conn.info.get("profiling_started"):
+            timings.add(statement, time.perf_counter() - conn.info["profiling_started"].pop())
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", os.path.basename(code.co_filename))
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+class StackSampler(threading.Thread):
+    """Échantillonne les piles des threads occupés jusqu'à l'arrêt"""
+
+    def __init__(self, interval: float):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.samples[";".join(reversed(stack))] += 1
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+def _is_admin_token(scope) -> bool:
+    """Vrai si la requête porte le jeton (cookie ou Authorization) d'un administrateur"""
+    token = None
+    cookie = _header(scope, b"cookie") or ""
+    match = re.search(r"(?:^|;\s*)access_token=([^;]+)", cookie)
+    if match:
+        token = match.group(1)
+    authorization = _header(scope, b"authorization") or ""
+    if not token and authorization.startswith("Bearer "):
+        token = authorization.split(" ")[1]
+    if not token:
+        return False
+    try:
+        email = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm]).get("sub")
+    except JWTError:
+        return False
+    db = SessionLocal()
+    try:
+        return db.query(User.role).filter(User.email == email).scalar() == UserRole.admin
+    finally:
+        db.close()
+
+def _profile_id(scope) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-")[:60] or "root"
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{slug}-{new_id()[-12:]}"
+
+def write_profile(profile_id: str, sampler: StackSampler, metadata: dict):
+    os.makedirs(settings.profiling_output_dir, exist_ok=True)
+    base = os.path.join(settings.profiling_output_dir, profile_id)
+    with open(f"{base}.collapsed", "w") as handle:
+        for stack, count in sampler.samples.most_common():
+            handle.write(f"{stack} {count}\n")
+    with open(f"{base}.json", "w") as handle:
+        json.dump(metadata, handle, indent=2)
+
+class ProfilingMiddleware:
+    """Middleware ASGI du profilage à la demande"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def _should_profile(self, scope) -> bool:
+        if _header(scope, PROFILE_HEADER) == "1":
+            return await run_in_threadpool(_is_admin_token, scope)
+        rate = settings.profiling_sample_rate
+        return rate > 0 and random.random() < rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.profiling_enabled or not await self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        _install_sql_hooks()
+        profile_id = _profile_id(scope)
+        status = {}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        timings = SqlTimings()
+        token = _current_sql.set(timings)
+        sampler = StackSampler(settings.profiling_interval)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            _current_sql.reset(token)
+            elapsed = time.perf_counter() - started
+            metadata = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query_string": scope.get("query_string", b"").decode("latin-1"),
+                "status": status.get("code"),
+                "duration_ms": round(elapsed * 1000, 3),
+                "interval_ms": settings.profiling_interval * 1000,
+                "samples": sum(sampler.samples.values()),
+                "sql": timings.summary()
+            }
+            await run_in_threadpool(write_profile, profile_id, sampler, metadata)
@@ -0,0 +1,209 @@
+"""
+Journal des requêtes SQL lentes, avec capture automatique du plan d'exécution.
+
+Toute requête SQL dont la durée dépasse `slow_query_threshold_ms` est journalisée
+(logger `app.slow_queries`) avec son texte normalisé, ses paramètres masqués (seuls
+leurs types sont conservés), sa durée et la route d'origine (`GET /quizzes/{quiz_id}`).
+
+Pour une fraction `slow_query_explain_rate` des requêtes lentes, le plan est capturé
+sur la même connexion, donc dans la même transaction :
+- PostgreSQL : `EXPLAIN (ANALYZE, BUFFERS)`, qui ré-exécute la requête ; limité aux
+  SELECT pour ne jamais rejouer une écriture, et exécuté dans un savepoint annulé
+  ensuite : ni ses verrous (FOR UPDATE) ni une erreur (statement_timeout) n'atteignent
+  la transaction de la requête ;
+- SQLite (développement) : `EXPLAIN QUERY PLAN`.
+
+Chaque worker garde en mémoire les requêtes lentes agrégées par texte normalisé ; les
+`slow_query_top_k` plus coûteuses en temps cumulé sont exposées sur
+`GET /admin/slow-queries`.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.config import settings
+
+logger = logging.getLogger("app.slow_queries")
+
+# Nombre maximal de requêtes distinctes suivies par worker
+MAX_TRACKED = 500
+
+_current_scope: ContextVar[Optional[dict]] = ContextVar("slow_query_scope", default=None)
+
+_IN_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))+\s*\)")
+_NUMBERED_PARAM = re.compile(r"%\((\w+?)_\d+\)s")
+
+def normalize_sql(statement: str) -> str:
+    """Texte SQL sur une ligne, listes IN (...) repliées, pour regrouper les requêtes identiques"""
+    statement = " ".join(statement.split())
+    statement = _NUMBERED_PARAM.sub(r"%(\1_n)s", statement)
+    return _IN_LIST.sub("(...)", statement)
+
+def redact_parameters(parameters):
+    """Paramètres réduits à leurs types : aucune valeur (e-mail, hash, réponse) n'est conservée"""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            # executemany : la forme de la première ligne suffit
+            return {"rows": len(parameters), "first": redact_parameters(parameters[0])}
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+def current_route() -> Optional[str]:
+    """Route FastAPI de la requête HTTP en cours (`GET /quizzes/{quiz_id}`), ou None"""
+    scope = _current_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    path = getattr(route, "path_format", None) or scope["path"]
+    return f"{scope['method']} {path}"
+
+def _explain(conn, cursor, statement: str, parameters) -> Optional[List[str]]:
+    """Plan de la requête sur la connexion DBAPI courante, ou None si non applicable"""
+    dialect = conn.dialect.name
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    if dialect == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+    elif dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        return None
+    # Curseur DBAPI brut : ne repasse pas par les événements SQLAlchemy
+    explain_cursor = cursor.connection.cursor()
+    savepoint = dialect == "postgresql"
+    try:
+        if savepoint:
+            explain_cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            explain_cursor.execute(prefix + statement, parameters)
+            return [" ".join(str(value) for value in row) for row in explain_cursor.fetchall()]
+        finally:
+            if savepoint:
+                explain_cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                explain_cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    except Exception as error:
+        return [f"EXPLAIN impossible : {error}"]
+    finally:
+        explain_cursor.close()
+
+class SlowQueryLog:
+    """Agrégats des requêtes lentes d'un worker, par texte normalisé"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        self.slow_count = 0
+
+    def record(self, statement: str, parameters, duration: float, route: Optional[str],
+               plan: Optional[List[str]] = None):
+        now = time.time()
+        with self._lock:
+            self.slow_count += 1
+            entry = self._entries.get(statement)
+            if entry is None:
+                if len(self._entries) >= MAX_TRACKED:
+                    # Éviction de la requête la moins coûteuse en temps cumulé
+                    cheapest = min(self._entries, key=lambda key: self._entries[key]["total_ms"])
+                    del self._entries[cheapest]
+                entry = self._entries[statement] = {
+                    "statement": statement,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "routes": {},
+                    "parameters": None,
+                    "plan": None,
+                    "plan_captured_at": None,
+                    "last_seen": None
+                }
+            duration_ms = duration * 1000
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            route_key = route or "-"
+            entry["routes"][route_key] = entry["routes"].get(route_key, 0) + 1
+            entry["parameters"] = parameters
+            entry["last_seen"] = now
+            if plan is not None:
+                entry["plan"] = plan
+                entry["plan_captured_at"] = now
+
+    def top(self, limit: Optional[int] = None) -> List[dict]:
+        limit = limit or settings.slow_query_top_k
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda entry: entry["total_ms"], reverse=True)[:limit]
+            return [
+                {
+                    **entry,
+                    "total_ms": round(entry["total_ms"], 3),
+                    "max_ms": round(entry["max_ms"], 3),
+                    "avg_ms": round(entry["total_ms"] / entry["count"], 3),
+                    "routes": dict(entry["routes"])
+                }
+                for entry in entries
+            ]
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self.slow_count = 0
+
+slow_queries = SlowQueryLog()
+
+_installed = False
+
+def install_slow_query_log():
+    """Branche la mesure sur tous les moteurs SQLAlchemy (idempotent)"""
+    global _installed
+    if _installed or not settings.slow_query_log_enabled:
+        return
+    _installed = True
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("slow_query_started")
+        if not started:
+            return
+        duration = time.perf_counter() - started.pop()
+        if duration * 1000 < settings.slow_query_threshold_ms:
+            return
+
+        normalized = normalize_sql(statement)
+        redacted = redact_parameters(parameters)
+        route = current_route()
+        plan = None
+        if not executemany and random.random() < settings.slow_query_explain_rate:
+            plan = _explain(conn, cursor, statement, parameters)
+        slow_queries.record(normalized, redacted, duration, route, plan)
+        logger.warning(
+            "Requête lente (%.1f ms) sur %s : %s paramètres=%s",
+            duration * 1000, route or "-", normalized, redacted
+        )
+
+class QueryOriginMiddleware:
+    """Middleware ASGI : rend la requête HTTP courante visible du journal des requêtes lentes"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Le routeur complète ce même dict (clé "route") avant d'appeler la route
+        token = _current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_scope.reset(token)
@@ -0,0 +1,77 @@
+"""
+Identifiants des entités : UUID natifs ordonnés dans le temps (style UUIDv7).
+
+Les 48 premiers bits contiennent le timestamp en millisecondes, ce qui donne des
+insertions quasi séquentielles dans les index B-tree au lieu d'insertions aléatoires.
+"""
+import os
+import threading
+import time
+import uuid
+from sqlalchemy import Uuid
+from sqlalchemy.types import TypeDecorator
+
+_lock = threading.Lock()
+_last_timestamp = 0
+_last_counter = 0
+
+def uuid7() -> uuid.UUID:
+    """Génère un UUID version 7, monotone au sein d'un même processus"""
+    global _last_timestamp, _last_counter
+
+    random_bits = int.from_bytes(os.urandom(10), "big")
+    with _lock:
+        timestamp = time.time_ns() // 1_000_000
+        if timestamp <= _last_timestamp:
+            # Même milliseconde (ou horloge reculée) : incrémenter le compteur sur 12 bits
+            timestamp = _last_timestamp
+            counter = _last_counter + 1
+            if counter > 0xFFF:
+                timestamp += 1
+                counter = 0
+        else:
+            counter = random_bits >> 68
+        _last_timestamp, _last_counter = timestamp, counter
+
+    value = (timestamp & 0xFFFFFFFFFFFF) << 80
+    value |= 0x7 << 76
+    value |= counter << 64
+    value |= 0b10 << 62
+    value |= random_bits & 0x3FFFFFFFFFFFFFFF
+    return uuid.UUID(int=value)
+
+def new_id() -> str:
+    """Nouvel identifiant d'entité, sous forme de chaîne"""
+    return str(uuid7())
+
+def is_uuid(value) -> bool:
+    try:
+        uuid.UUID(str(value))
+    except ValueError:
+        return False
+    return True
+
+class InvalidIdentifier(ValueError):
+    """Valeur liée à une colonne UUID qui n'est pas un UUID"""
+
+    def __init__(self, value):
+        super().__init__(f"Identifiant invalide : {value!r}")
+        self.value = value
+
+class UUIDType(TypeDecorator):
+    """
+    Colonne UUID native (PostgreSQL) manipulée comme une chaîne côté Python.
+    Une valeur qui n'est pas un UUID valide lève InvalidIdentifier à la liaison (enveloppée
+    dans une StatementError), en lecture comme en écriture : rien n'est écrit à NULL en
+    silence. L'application répond 404 pour un identifiant de l'URL, 422 sinon (app/main.py).
+    """
+    impl = Uuid(as_uuid=False)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            return str(uuid.UUID(str(value)))
+        except ValueError:
+            raise InvalidIdentifier(value) from None
@@ -0,0 +1,88 @@
+"""
+Chargement groupé des entités liées, à l'échelle d'une requête (façon DataLoader).
+
+Au lieu d'une requête `.filter(Model.id == x).first()` par tour de boucle, une route
+annonce les clés dont elle aura besoin (`queue`) puis les lit une à une (`load`) :
+toutes les clés en attente sont dédupliquées et chargées en une requête `IN (...)`,
+et les résultats sont mémorisés jusqu'à la fin de la requête HTTP.
+
+    quizzes = loader(db, Quiz)
+    quizzes.queue(attempt.quiz_id for attempt in attempts)
+    for attempt in attempts:
+        quiz = quizzes.load(attempt.quiz_id)
+
+Une clé lue sans avoir été annoncée déclenche le chargement de toutes les clés en
+attente, elle comprise. Les chargeurs sont rattachés à la session (une par requête via
+`get_db`) et oubliés à chaque commit.
+"""
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.db.session import SessionLocal
+
+# Nombre maximal de clés par requête IN
+CHUNK_SIZE = 500
+
+class Loader:
+    """Chargeur d'un type d'entité par une colonne clé (id par défaut)"""
+
+    def __init__(self, db: Session, model, key=None, criteria: tuple = (), many: bool = False):
+        self.db = db
+        self.model = model
+        self.key = key if key is not None else model.id
+        self.criteria = criteria
+        self.many = many
+        self._memo: Dict[Hashable, Any] = {}
+        self._queued: set = set()
+
+    def queue(self, keys: Iterable[Hashable]) -> "Loader":
+        """Annonce des clés à charger au prochain accès"""
+        for key in keys:
+            if key is not None and key not in self._memo:
+                self._queued.add(key)
+        return self
+
+    def load(self, key: Hashable) -> Any:
+        """Entité de clé `key` (None si absente), ou liste des entités si `many`"""
+        if key is None:
+            return [] if self.many else None
+        if key not in self._memo:
+            self._queued.add(key)
+            self._fetch()
+        return self._memo[key]
+
+    def load_many(self, keys: Iterable[Hashable]) -> List[Any]:
+        keys = list(keys)
+        self.queue(keys)
+        return [self.load(key) for key in keys]
+
+    def _fetch(self):
+        keys = list(self._queued)
+        self._queued.clear()
+        key_name = self.key.key
+        for start in range(0, len(keys), CHUNK_SIZE):
+            chunk = keys[start:start + CHUNK_SIZE]
+            rows = self.db.query(self.model).filter(self.key.in_(chunk), *self.criteria).all()
+            for row in rows:
+                if self.many:
+                    self._memo.setdefault(getattr(row, key_name), []).append(row)
+                else:
+                    self._memo[getattr(row, key_name)] = row
+        # Mémoriser aussi les absences
+        for key in keys:
+            self._memo.setdefault(key, [] if self.many else None)
+
+def loader(db: Session, model, key=None, *criteria, many: bool = False, name: Optional[str] = None) -> Loader:
+    """
+    Chargeur de la requête courante pour `model` (par `key`, id par défaut). Un chargeur
+    filtré (`criteria`) doit porter un `name` propre, la mémoire étant partagée par nom.
+    """
+    loaders = db.info.setdefault("loaders", {})
+    registry_key = (model.__name__, (key if key is not None else model.id).key, name)
+    if registry_key not in loaders:
+        loaders[registry_key] = Loader(db, model, key, criteria, many)
+    return loaders[registry_key]
+
+@event.listens_for(SessionLocal, "after_commit")
+def _forget_loaders(session: Session):
+    session.info.pop("loaders", None)
@@ -0,0 +1,32 @@
+"""
+Upserts portables (PostgreSQL et SQLite) pour les compteurs et tables de synthèse.
+"""
+from typing import Iterable, List
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+def dialect_insert(db: Session, model):
+    """Retourne un INSERT supportant ON CONFLICT pour le dialecte de la session"""
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+def increment_counters(db: Session, model, rows: List[dict], index_elements: Iterable[str], counters: Iterable[str]):
+    """
+    Insère les lignes ou ajoute leurs compteurs aux lignes existantes, en une seule requête.
+
+    Les lignes sont verrouillées dans l'ordre de la clé de conflit : deux transactions
+    qui incrémentent des lignes communes les prennent dans le même ordre et ne peuvent
+    pas s'interbloquer.
+    """
+    if not rows:
+        return
+    index_elements = list(index_elements)
+    rows = sorted(rows, key=lambda row: tuple(str(row[name]) for name in index_elements))
+    statement = dialect_insert(db, model).values(rows)
+    table = model.__table__
+    statement = statement.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={name: table.c[name] + statement.excluded[name] for name in counters}
+    )
+    db.execute(statement)
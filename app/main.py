@@ -1,6 +1,17 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import StatementError
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.router import router
+from app.core.admission import AdmissionControlMiddleware
+from app.core.profiling import ProfilingMiddleware
+from app.core.slow_queries import QueryOriginMiddleware, install_slow_query_log
+from app.db.ids import InvalidIdentifier
+from app.db.session import SessionLocal
+from app.services.attempt_expiry import start_sweeper, stop_sweeper
+from app.services.catalog_store import ensure_catalog
+from app.services.invalidation import start_listener, stop_listener
+from app.services.outbox import start_relay, stop_relay
 
 app = FastAPI(
     title="Quiz Programming API",
@@ -8,6 +19,16 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Journal des requêtes lentes : mesure SQL et route d'origine
+install_slow_query_log()
+app.add_middleware(QueryOriginMiddleware)
+
+# Profilage à la demande : au plus près des routes, le temps d'attente en file d'admission est exclu
+app.add_middleware(ProfilingMiddleware)
+
+# Contrôle d'admission : ajouté avant CORS pour que les réponses 429/503 portent les en-têtes CORS
+app.add_middleware(AdmissionControlMiddleware)
+
 # Configuration CORS pour permettre les requêtes depuis les applications frontend
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -17,6 +38,52 @@ app.add_middleware(
     allow_credentials=False,  # Désactivé car incompatible avec allow_origins=["*"]
     allow_methods=["*"],   # GET, POST, PUT, DELETE, PATCH, etc.
     allow_headers=["*"],   # tous les headers
+    expose_headers=["X-Next-Cursor"],  # curseur de la page suivante des listes
 )
 
 app.include_router(router, prefix="")
+
+@app.exception_handler(StatementError)
+async def invalid_identifier(request: Request, exc: StatementError):
+    """Identifiant qui n'est pas un UUID : 404 s'il vient de l'URL, 422 s'il vient de la requête"""
+    if not isinstance(exc.orig, InvalidIdentifier):
+        raise exc
+    if str(exc.orig.value) in {str(value) for value in request.path_params.values()}:
+        return JSONResponse(status_code=404, content={"detail": "Not found"})
+    return JSONResponse(status_code=422, content={"detail": f"Invalid identifier: {exc.orig.value}"})
+
+@app.on_event("startup")
+def build_shared_catalog():
+    """Reconstruit le catalogue partagé s'il précède le démarrage (le premier worker démarré l'écrit)"""
+    db = SessionLocal()
+    try:
+        ensure_catalog(db)
+    finally:
+        db.close()
+
+@app.on_event("startup")
+def start_invalidation_listener():
+    """Écoute les invalidations de cache publiées par les autres workers (PostgreSQL)"""
+    start_listener()
+
+@app.on_event("shutdown")
+def stop_invalidation_listener():
+    stop_listener()
+
+@app.on_event("startup")
+def start_attempt_sweeper():
+    """Expire périodiquement les tentatives abandonnées"""
+    start_sweeper()
+
+@app.on_event("shutdown")
+def stop_attempt_sweeper():
+    stop_sweeper()
+
+@app.on_event("startup")
+def start_outbox_relay():
+    """Livre les événements de l'outbox aux consommateurs configurés et purge les anciens"""
+    start_relay()
+
+@app.on_event("shutdown")
+def stop_outbox_relay():
+    stop_relay()
@@ -1,8 +1,10 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Float, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, Text, Float, Enum, JSON, Index, UniqueConstraint, LargeBinary, Date
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 import enum
 from app.db.session import Base
+from app.db.ids import UUIDType, new_id
 
 class UserRole(str, enum.Enum):
     admin = "admin"
@@ -20,7 +22,7 @@ class QuizStatus(str, enum.Enum):
 class User(Base):
     __tablename__ = "users"
     
-    id = Column(String, primary_key=True, index=True)
+    id = Column(UUIDType, primary_key=True, index=True, default=new_id)
     name = Column(String, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     password = Column(String, nullable=False)
@@ -29,13 +31,13 @@ class User(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
-    attempts = relationship("UserQuizAttempt", back_populates="user")
-    progress = relationship("UserProgress", back_populates="user")
+    attempts = relationship("UserQuizAttempt", back_populates="user", passive_deletes=True)
+    progress = relationship("UserProgress", back_populates="user", passive_deletes=True)
 
 class Category(Base):
     __tablename__ = "categories"
     
-    id = Column(String, primary_key=True, index=True)
+    id = Column(UUIDType, primary_key=True, index=True, default=new_id)
     name = Column(String, unique=True, nullable=False)
     description = Column(Text)
     icon_url = Column(String)
@@ -50,38 +52,71 @@ class Category(Base):
 class Quiz(Base):
     __tablename__ = "quizzes"
     
-    id = Column(String, primary_key=True, index=True)
-    category_id = Column(String, ForeignKey("categories.id"))
+    id = Column(UUIDType, primary_key=True, index=True, default=new_id)
+    category_id = Column(UUIDType, ForeignKey("categories.id"))
     title = Column(String, nullable=False)
     level = Column(Enum(QuizLevel), nullable=False)
     status = Column(Enum(QuizStatus), default=QuizStatus.draft)
+    # Banque de questions : nombre de questions tirées par tentative (toutes si vide)
+    sample_size = Column(Integer)
+    stratified = Column(Boolean, default=False)
+    # Durée maximale d'une tentative, en minutes (réglage global si vide)
+    time_limit_minutes = Column(Integer)
+    # Dernière version publiée (instantané immuable servi aux tentatives)
+    current_version_id = Column(UUIDType)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
     category = relationship("Category", back_populates="quizzes")
-    questions = relationship("Question", back_populates="quiz", cascade="all, delete-orphan")
+    questions = relationship("Question", back_populates="quiz", cascade="all, delete-orphan", passive_deletes=True)
     attempts = relationship("UserQuizAttempt", back_populates="quiz")
+    versions = relationship("QuizVersion", back_populates="quiz", passive_deletes=True)
+
+class QuizVersion(Base):
+    __tablename__ = "quiz_versions"
+
+    # Instantané immuable d'un quiz publié : quiz, questions, réponses et corrigé
+    id = Column(UUIDType, primary_key=True, index=True, default=new_id)
+    quiz_id = Column(UUIDType, ForeignKey("quizzes.id", ondelete="CASCADE"), index=True, nullable=False)
+    version = Column(Integer, nullable=False)
+    content = Column(JSON().with_variant(JSONB, "postgresql"), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("quiz_id", "version"),
+    )
+
+    # Relationships
+    quiz = relationship("Quiz", back_populates="versions")
 
 class Question(Base):
     __tablename__ = "questions"
     
-    id = Column(String, primary_key=True, index=True)
-    quiz_id = Column(String, ForeignKey("quizzes.id"))
+    id = Column(UUIDType, primary_key=True, index=True, default=new_id)
+    quiz_id = Column(UUIDType, ForeignKey("quizzes.id", ondelete="CASCADE"))
     question_text = Column(Text, nullable=False)
     order = Column(Integer, nullable=False)
+    # Strate utilisée pour le tirage stratifié (thème, compétence...)
+    stratum = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Tirage des banques de questions sans lire les lignes complètes : id inclus pour
+        # un parcours d'index seul (PostgreSQL)
+        Index("idx_questions_quiz_order", "quiz_id", "order", "stratum", postgresql_include=["id"]),
+    )
     
     # Relationships
     quiz = relationship("Quiz", back_populates="questions")
-    answers = relationship("Answer", back_populates="question", cascade="all, delete-orphan")
+    answers = relationship("Answer", back_populates="question", cascade="all, delete-orphan", order_by="Answer.order", passive_deletes=True)
     user_answers = relationship("UserAnswer", back_populates="question")
 
 class Answer(Base):
     __tablename__ = "answers"
     
-    id = Column(String, primary_key=True, index=True)
-    question_id = Column(String, ForeignKey("questions.id"))
+    id = Column(UUIDType, primary_key=True, index=True, default=new_id)
+    question_id = Column(UUIDType, ForeignKey("questions.id", ondelete="CASCADE"))
     answer_text = Column(String, nullable=False)
     is_correct = Column(Boolean, default=False)
     order = Column(Integer, nullable=False)
@@ -91,28 +126,82 @@ class Answer(Base):
     question = relationship("Question", back_populates="answers")
     user_answers = relationship("UserAnswer", back_populates="answer")
 
+# Prédicat des index partiels sur les tentatives en cours
+OPEN_ATTEMPT = "completed_at IS NULL AND expired_at IS NULL"
+
 class UserQuizAttempt(Base):
     __tablename__ = "user_quiz_attempts"
     
-    id = Column(String, primary_key=True, index=True)
-    user_id = Column(String, ForeignKey("users.id"))
-    quiz_id = Column(String, ForeignKey("quizzes.id"))
+    id = Column(UUIDType, primary_key=True, index=True, default=new_id)
+    user_id = Column(UUIDType, ForeignKey("users.id", ondelete="CASCADE"))
+    quiz_id = Column(UUIDType, ForeignKey("quizzes.id"))
+    # Version du quiz servie, corrigée et relue (NULL pour les tentatives antérieures au versionnement)
+    quiz_version_id = Column(UUIDType, ForeignKey("quiz_versions.id"))
     score = Column(Float)
     passed = Column(Boolean)
     completed_at = Column(DateTime(timezone=True))
+    # Réponses au format compact {question_id: [masque, correct]} (voir app/services/answer_storage.py)
+    selections = Column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"))
+    # Résultat renvoyé à la soumission, rejoué si le client soumet à nouveau
+    result = Column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"))
+    # Questions tirées pour une banque de questions, et graine du tirage
+    question_ids = Column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"))
+    seed = Column(BigInteger)
+    # Démarrage, échéance et expiration des tentatives abandonnées (voir services/attempt_expiry)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True))
+    expired_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # Au plus une tentative en cours par utilisateur et par quiz (démarrages concurrents)
+        Index(
+            "uq_user_quiz_attempts_open", "user_id", "quiz_id", unique=True,
+            postgresql_where=text(OPEN_ATTEMPT), sqlite_where=text(OPEN_ATTEMPT)
+        ),
+        # Échéances des seules tentatives en cours, parcourues par l'expiration
+        Index(
+            "idx_user_quiz_attempts_open_expiry", "expires_at",
+            postgresql_where=text(OPEN_ATTEMPT), sqlite_where=text(OPEN_ATTEMPT)
+        ),
+    )
     
     # Relationships
     user = relationship("User", back_populates="attempts")
     quiz = relationship("Quiz", back_populates="attempts")
-    answers = relationship("UserAnswer", back_populates="attempt")
+    answers = relationship("UserAnswer", back_populates="attempt", passive_deletes=True)
+
+class ArchivedAttempt(Base):
+    __tablename__ = "user_quiz_attempts_archive"
+
+    # Tentatives terminées ou expirées déplacées hors des tables chaudes (voir
+    # services/attempt_archive) ; partitionnée par mois sous PostgreSQL
+    id = Column(UUIDType, primary_key=True)
+    period = Column(Date, primary_key=True)  # premier jour du mois de la tentative
+    user_id = Column(UUIDType, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Sans clé étrangère : le titre du quiz est conservé avec la tentative
+    quiz_id = Column(UUIDType, nullable=False, index=True)
+    quiz_version_id = Column(UUIDType)
+    quiz_title = Column(String)
+    score = Column(Float)
+    passed = Column(Boolean)
+    started_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+    expired_at = Column(DateTime(timezone=True))
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Réponses, résultat et tirage de la tentative en JSON compressé (zlib)
+    payload = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        {"postgresql_partition_by": "RANGE (period)"},
+    )
 
 class UserAnswer(Base):
     __tablename__ = "user_answers"
     
-    id = Column(String, primary_key=True, index=True)
-    attempt_id = Column(String, ForeignKey("user_quiz_attempts.id"))
-    question_id = Column(String, ForeignKey("questions.id"))
-    answer_id = Column(String, ForeignKey("answers.id"))
+    id = Column(UUIDType, primary_key=True, index=True, default=new_id)
+    attempt_id = Column(UUIDType, ForeignKey("user_quiz_attempts.id", ondelete="CASCADE"))
+    question_id = Column(UUIDType, ForeignKey("questions.id"))
+    answer_id = Column(UUIDType, ForeignKey("answers.id"))
     is_correct = Column(Boolean)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
@@ -124,12 +213,88 @@ class UserAnswer(Base):
 class UserProgress(Base):
     __tablename__ = "user_progress"
     
-    id = Column(String, primary_key=True, index=True)
-    user_id = Column(String, ForeignKey("users.id"))
-    category_id = Column(String, ForeignKey("categories.id"))
+    id = Column(UUIDType, primary_key=True, index=True, default=new_id)
+    user_id = Column(UUIDType, ForeignKey("users.id", ondelete="CASCADE"))
+    category_id = Column(UUIDType, ForeignKey("categories.id"))
     current_level = Column(Enum(QuizLevel), default=QuizLevel.debutant)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
     user = relationship("User", back_populates="progress")
-    category = relationship("Category", back_populates="progress")
\ No newline at end of file
+    category = relationship("Category", back_populates="progress")
+
+class QuestionStats(Base):
+    __tablename__ = "question_stats"
+
+    # Compteurs mis à jour à chaque soumission, indices recalculés par le job nocturne
+    question_id = Column(UUIDType, ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+    times_shown = Column(Integer, nullable=False, default=0)
+    times_correct = Column(Integer, nullable=False, default=0)
+    difficulty = Column(Float)
+    discrimination = Column(Float)
+    computed_at = Column(DateTime(timezone=True))
+
+class AnswerStats(Base):
+    __tablename__ = "answer_stats"
+
+    answer_id = Column(UUIDType, ForeignKey("answers.id", ondelete="CASCADE"), primary_key=True)
+    question_id = Column(UUIDType, ForeignKey("questions.id", ondelete="CASCADE"), index=True)
+    times_picked = Column(Integer, nullable=False, default=0)
+
+class UserStats(Base):
+    __tablename__ = "user_stats"
+
+    # Synthèse du tableau de bord, mise à jour dans la transaction de chaque tentative
+    user_id = Column(UUIDType, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    attempt_count = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0)
+    passed_count = Column(Integer, nullable=False, default=0)
+    categories_mastered = Column(Integer, nullable=False, default=0)
+    # Dernières tentatives terminées, de la plus récente à la plus ancienne
+    recent_attempts = Column(JSON().with_variant(JSONB, "postgresql"), nullable=False, default=list)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class QuestionSignature(Base):
+    __tablename__ = "question_signatures"
+
+    # Signature MinHash de l'énoncé (détection des quasi-doublons, voir services/near_duplicates)
+    question_id = Column(UUIDType, ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+    signature = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class QuestionLshBucket(Base):
+    __tablename__ = "question_lsh_buckets"
+
+    # Un seau par bande de la signature : deux questions partageant un seau sont candidates
+    bucket = Column(BigInteger, primary_key=True)
+    question_id = Column(UUIDType, ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+
+    # Événement métier écrit dans la transaction qui le produit (voir services/outbox) ;
+    # (transaction_id, id) sert de position aux curseurs des consommateurs
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    event_type = Column(String, nullable=False)
+    aggregate_id = Column(UUIDType)
+    payload = Column(JSON().with_variant(JSONB, "postgresql"), nullable=False)
+    # Transaction qui a écrit l'événement (txid_current() sous PostgreSQL, 0 sous SQLite)
+    transaction_id = Column(BigInteger, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    __table_args__ = (
+        # Ordre de livraison, parcouru à partir des curseurs
+        Index("idx_outbox_events_position", "transaction_id", "id"),
+    )
+
+class OutboxCursor(Base):
+    __tablename__ = "outbox_cursors"
+
+    # Position (transaction, id) du dernier événement livré à chaque consommateur
+    consumer = Column(String, primary_key=True)
+    transaction_id = Column(BigInteger, nullable=False, default=0)
+    position = Column(BigInteger, nullable=False, default=0)
+    delivered_count = Column(BigInteger, nullable=False, default=0)
+    last_error = Column(Text)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
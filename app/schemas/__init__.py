@@ -68,6 +68,9 @@ class QuizBase(BaseModel):
     title: str
     level: QuizLevel
     status: QuizStatus = QuizStatus.draft
+    sample_size: Optional[int] = None
+    stratified: bool = False
+    time_limit_minutes: Optional[int] = None
 
 class QuizCreate(QuizBase):
     category_id: str
@@ -78,12 +81,22 @@ class QuizUpdate(QuizBase):
 class QuizResponse(QuizBase):
     id: str
     category_id: str
+    current_version_id: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime]
 
     class Config:
         from_attributes = True
 
+class QuizVersionSummary(BaseModel):
+    id: str
+    quiz_id: str
+    version: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
 # Question schemas
 class AnswerBase(BaseModel):
     answer_text: str
@@ -93,6 +106,10 @@ class AnswerBase(BaseModel):
 class AnswerCreate(AnswerBase):
     pass
 
+class AnswerUpdate(AnswerBase):
+    # Id of an existing answer to keep; answers without id are matched by order
+    id: Optional[str] = None
+
 class AnswerResponse(AnswerBase):
     id: str
     question_id: str
@@ -104,6 +121,7 @@ class AnswerResponse(AnswerBase):
 class QuestionBase(BaseModel):
     question_text: str
     order: int
+    stratum: Optional[str] = None
 
 class QuestionCreate(QuestionBase):
     quiz_id: str
@@ -113,7 +131,7 @@ class QuestionCreateForQuiz(QuestionBase):
     answers: List[AnswerCreate]
 
 class QuestionUpdate(QuestionBase):
-    answers: List[AnswerCreate]
+    answers: List[AnswerUpdate]
 
 class QuestionResponse(QuestionBase):
     id: str
@@ -127,6 +145,7 @@ class QuestionResponse(QuestionBase):
 # Attempt schemas
 class QuizStartResponse(BaseModel):
     attempt_id: str
+    expires_at: Optional[datetime] = None
     quiz: QuizResponse
     questions: List[QuestionResponse]
 
@@ -144,6 +163,20 @@ class QuizResult(BaseModel):
     total_questions: int
     details: List[dict]
 
+# Batch grading schemas
+class BatchSubmission(BaseModel):
+    user_id: str
+    answers: List[AnswerSubmit]
+    completed_at: Optional[datetime] = None
+
+class BatchGradeRequest(BaseModel):
+    submissions: List[BatchSubmission]
+
+class BatchGradeResult(BaseModel):
+    results: List[dict]
+    errors: List[dict]
+    summary: dict
+
 # Progress schemas
 class UserProgress(BaseModel):
     category: CategoryResponse
@@ -162,4 +195,25 @@ class AdminStats(BaseModel):
     total_quizzes: int
     total_categories: int
     popular_quizzes: List[dict]
-    success_rates: dict
\ No newline at end of file
+    success_rates: dict
+# Near-duplicate detection schemas
+class DedupeCandidate(BaseModel):
+    question_text: str
+
+class DedupeReportRequest(BaseModel):
+    # Extra fields (answers, order...) are ignored, so an import payload can be posted as is
+    questions: List[DedupeCandidate]
+    threshold: Optional[float] = None
+
+# Search schemas
+class SearchHit(BaseModel):
+    type: str
+    id: str
+    title: str
+    quiz_id: Optional[str]
+    category_id: Optional[str]
+    rank: float
+
+class SearchResults(BaseModel):
+    data: List[SearchHit]
+    meta: dict
@@ -0,0 +1,18 @@
+-- Stockage compact des réponses par tentative
+-- PostgreSQL
+--
+-- Après cette migration, convertir les données existantes avec :
+--   python -m app.services.answer_storage migrate [--delete-rows]
+
+ALTER TABLE user_quiz_attempts ADD COLUMN IF NOT EXISTS selections JSONB;
+
+-- Vue d'analyse par question : une ligne par (tentative, question), quel que soit le format
+CREATE OR REPLACE VIEW attempt_question_selections AS
+SELECT a.id AS attempt_id,
+       a.quiz_id,
+       s.key AS question_id,
+       (s.value->>0)::BIGINT AS answer_mask,
+       (s.value->>1)::INTEGER = 1 AS is_correct
+FROM user_quiz_attempts a
+CROSS JOIN LATERAL jsonb_each(a.selections) s
+WHERE a.selections IS NOT NULL;
@@ -0,0 +1,66 @@
+-- Clés primaires et étrangères en UUID natif
+-- PostgreSQL
+--
+-- Les identifiants existants sont des UUID v4 au format texte : ils sont convertis tels quels.
+-- Les nouveaux identifiants sont générés par l'application (UUID v7, ordonnés dans le temps).
+
+BEGIN;
+
+-- La vue dépend des colonnes converties
+DROP VIEW IF EXISTS attempt_question_selections;
+
+-- Supprimer les clés étrangères avant de changer les types
+ALTER TABLE quizzes DROP CONSTRAINT IF EXISTS quizzes_category_id_fkey;
+ALTER TABLE questions DROP CONSTRAINT IF EXISTS questions_quiz_id_fkey;
+ALTER TABLE answers DROP CONSTRAINT IF EXISTS answers_question_id_fkey;
+ALTER TABLE user_quiz_attempts DROP CONSTRAINT IF EXISTS user_quiz_attempts_user_id_fkey;
+ALTER TABLE user_quiz_attempts DROP CONSTRAINT IF EXISTS user_quiz_attempts_quiz_id_fkey;
+ALTER TABLE user_answers DROP CONSTRAINT IF EXISTS user_answers_attempt_id_fkey;
+ALTER TABLE user_answers DROP CONSTRAINT IF EXISTS user_answers_question_id_fkey;
+ALTER TABLE user_answers DROP CONSTRAINT IF EXISTS user_answers_answer_id_fkey;
+ALTER TABLE user_progress DROP CONSTRAINT IF EXISTS user_progress_user_id_fkey;
+ALTER TABLE user_progress DROP CONSTRAINT IF EXISTS user_progress_category_id_fkey;
+
+-- Convertir les colonnes (PostgreSQL réécrit chaque table et reconstruit ses index)
+ALTER TABLE users ALTER COLUMN id TYPE UUID USING id::uuid;
+ALTER TABLE categories ALTER COLUMN id TYPE UUID USING id::uuid;
+ALTER TABLE quizzes ALTER COLUMN id TYPE UUID USING id::uuid,
+                    ALTER COLUMN category_id TYPE UUID USING category_id::uuid;
+ALTER TABLE questions ALTER COLUMN id TYPE UUID USING id::uuid,
+                      ALTER COLUMN quiz_id TYPE UUID USING quiz_id::uuid;
+ALTER TABLE answers ALTER COLUMN id TYPE UUID USING id::uuid,
+                    ALTER COLUMN question_id TYPE UUID USING question_id::uuid;
+ALTER TABLE user_quiz_attempts ALTER COLUMN id TYPE UUID USING id::uuid,
+                               ALTER COLUMN user_id TYPE UUID USING user_id::uuid,
+                               ALTER COLUMN quiz_id TYPE UUID USING quiz_id::uuid;
+ALTER TABLE user_answers ALTER COLUMN id TYPE UUID USING id::uuid,
+                         ALTER COLUMN attempt_id TYPE UUID USING attempt_id::uuid,
+                         ALTER COLUMN question_id TYPE UUID USING question_id::uuid,
+                         ALTER COLUMN answer_id TYPE UUID USING answer_id::uuid;
+ALTER TABLE user_progress ALTER COLUMN id TYPE UUID USING id::uuid,
+                          ALTER COLUMN user_id TYPE UUID USING user_id::uuid,
+                          ALTER COLUMN category_id TYPE UUID USING category_id::uuid;
+
+-- Recréer les clés étrangères
+ALTER TABLE quizzes ADD CONSTRAINT quizzes_category_id_fkey FOREIGN KEY (category_id) REFERENCES categories(id);
+ALTER TABLE questions ADD CONSTRAINT questions_quiz_id_fkey FOREIGN KEY (quiz_id) REFERENCES quizzes(id);
+ALTER TABLE answers ADD CONSTRAINT answers_question_id_fkey FOREIGN KEY (question_id) REFERENCES questions(id);
+ALTER TABLE user_quiz_attempts ADD CONSTRAINT user_quiz_attempts_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id);
+ALTER TABLE user_quiz_attempts ADD CONSTRAINT user_quiz_attempts_quiz_id_fkey FOREIGN KEY (quiz_id) REFERENCES quizzes(id);
+ALTER TABLE user_answers ADD CONSTRAINT user_answers_attempt_id_fkey FOREIGN KEY (attempt_id) REFERENCES user_quiz_attempts(id);
+ALTER TABLE user_answers ADD CONSTRAINT user_answers_question_id_fkey FOREIGN KEY (question_id) REFERENCES questions(id);
+ALTER TABLE user_answers ADD CONSTRAINT user_answers_answer_id_fkey FOREIGN KEY (answer_id) REFERENCES answers(id);
+ALTER TABLE user_progress ADD CONSTRAINT user_progress_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id);
+ALTER TABLE user_progress ADD CONSTRAINT user_progress_category_id_fkey FOREIGN KEY (category_id) REFERENCES categories(id);
+
+CREATE OR REPLACE VIEW attempt_question_selections AS
+SELECT a.id AS attempt_id,
+       a.quiz_id,
+       s.key::UUID AS question_id,
+       (s.value->>0)::BIGINT AS answer_mask,
+       (s.value->>1)::INTEGER = 1 AS is_correct
+FROM user_quiz_attempts a
+CROSS JOIN LATERAL jsonb_each(a.selections) s
+WHERE a.selections IS NOT NULL;
+
+COMMIT;
@@ -0,0 +1,4 @@
+-- Résultat des soumissions conservé pour rendre POST /attempts/submit idempotent
+-- PostgreSQL
+
+ALTER TABLE user_quiz_attempts ADD COLUMN IF NOT EXISTS result JSONB;
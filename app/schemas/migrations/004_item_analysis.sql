@@ -0,0 +1,21 @@
+-- Compteurs pour l'analyse d'items, recalculée chaque nuit par
+--   python -m app.services.item_analysis
+-- PostgreSQL
+
+-- Statistiques par question et par réponse (analyse d'items)
+CREATE TABLE question_stats (
+    question_id UUID PRIMARY KEY REFERENCES questions(id) ON DELETE CASCADE,
+    times_shown INTEGER NOT NULL DEFAULT 0,
+    times_correct INTEGER NOT NULL DEFAULT 0,
+    difficulty DOUBLE PRECISION,
+    discrimination DOUBLE PRECISION,
+    computed_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE TABLE answer_stats (
+    answer_id UUID PRIMARY KEY REFERENCES answers(id) ON DELETE CASCADE,
+    question_id UUID REFERENCES questions(id) ON DELETE CASCADE,
+    times_picked INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_answer_stats_question_id ON answer_stats(question_id);
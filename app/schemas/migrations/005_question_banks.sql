@@ -0,0 +1,10 @@
+-- Banques de questions : tirage aléatoire reproductible par tentative
+-- PostgreSQL
+
+ALTER TABLE quizzes ADD COLUMN IF NOT EXISTS sample_size INTEGER;
+ALTER TABLE quizzes ADD COLUMN IF NOT EXISTS stratified BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE questions ADD COLUMN IF NOT EXISTS stratum VARCHAR;
+ALTER TABLE user_quiz_attempts ADD COLUMN IF NOT EXISTS question_ids JSONB;
+ALTER TABLE user_quiz_attempts ADD COLUMN IF NOT EXISTS seed BIGINT;
+
+CREATE INDEX IF NOT EXISTS idx_questions_quiz_order ON questions(quiz_id, "order", stratum) INCLUDE (id);
@@ -0,0 +1,22 @@
+-- Suppressions en cascade côté base : supprimer un utilisateur, un quiz ou une question
+-- ne nécessite plus de charger les lignes dépendantes
+-- PostgreSQL
+
+BEGIN;
+
+ALTER TABLE questions DROP CONSTRAINT IF EXISTS questions_quiz_id_fkey,
+    ADD CONSTRAINT questions_quiz_id_fkey FOREIGN KEY (quiz_id) REFERENCES quizzes(id) ON DELETE CASCADE;
+ALTER TABLE answers DROP CONSTRAINT IF EXISTS answers_question_id_fkey,
+    ADD CONSTRAINT answers_question_id_fkey FOREIGN KEY (question_id) REFERENCES questions(id) ON DELETE CASCADE;
+ALTER TABLE user_quiz_attempts DROP CONSTRAINT IF EXISTS user_quiz_attempts_user_id_fkey,
+    ADD CONSTRAINT user_quiz_attempts_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;
+ALTER TABLE user_answers DROP CONSTRAINT IF EXISTS user_answers_attempt_id_fkey,
+    ADD CONSTRAINT user_answers_attempt_id_fkey FOREIGN KEY (attempt_id) REFERENCES user_quiz_attempts(id) ON DELETE CASCADE;
+ALTER TABLE user_progress DROP CONSTRAINT IF EXISTS user_progress_user_id_fkey,
+    ADD CONSTRAINT user_progress_user_id_fkey FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE;
+
+-- Index des clés étrangères parcourues par les cascades et les gardes EXISTS
+CREATE INDEX IF NOT EXISTS idx_user_answers_question_id ON user_answers(question_id);
+CREATE INDEX IF NOT EXISTS idx_user_answers_answer_id ON user_answers(answer_id);
+
+COMMIT;
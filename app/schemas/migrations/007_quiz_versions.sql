@@ -0,0 +1,17 @@
+-- Versions immuables des quiz publiés
+-- PostgreSQL
+-- Après la migration, créer les versions des quiz déjà publiés :
+--   python -m app.services.quiz_versions publish-all
+
+CREATE TABLE IF NOT EXISTS quiz_versions (
+    id UUID PRIMARY KEY,
+    quiz_id UUID NOT NULL REFERENCES quizzes(id) ON DELETE CASCADE,
+    version INTEGER NOT NULL,
+    content JSONB NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (quiz_id, version)
+);
+CREATE INDEX IF NOT EXISTS idx_quiz_versions_quiz_id ON quiz_versions(quiz_id);
+
+ALTER TABLE quizzes ADD COLUMN IF NOT EXISTS current_version_id UUID;
+ALTER TABLE user_quiz_attempts ADD COLUMN IF NOT EXISTS quiz_version_id UUID REFERENCES quiz_versions(id);
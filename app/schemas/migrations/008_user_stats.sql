@@ -0,0 +1,16 @@
+-- Synthèse du tableau de bord par utilisateur
+-- PostgreSQL
+-- Après la migration, remplir la table depuis les tentatives existantes :
+--   python -m app.services.user_stats rebuild
+
+-- Synthèse par utilisateur pour le tableau de bord (mise à jour à chaque tentative)
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    attempt_count INTEGER NOT NULL DEFAULT 0,
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    passed_count INTEGER NOT NULL DEFAULT 0,
+    categories_mastered INTEGER NOT NULL DEFAULT 0,
+    recent_attempts JSONB NOT NULL DEFAULT '[]',
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
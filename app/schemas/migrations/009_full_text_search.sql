@@ -0,0 +1,20 @@
+-- Recherche plein texte (voir app/services/search.py)
+-- PostgreSQL 12+ : colonnes tsvector générées et index GIN
+-- Configuration 'simple' : contenus en français et en anglais, sans racinisation
+
+ALTER TABLE categories ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+    ) STORED;
+ALTER TABLE quizzes ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (setweight(to_tsvector('simple', coalesce(title, '')), 'A')) STORED;
+ALTER TABLE questions ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (setweight(to_tsvector('simple', coalesce(question_text, '')), 'A')) STORED;
+ALTER TABLE answers ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (setweight(to_tsvector('simple', coalesce(answer_text, '')), 'A')) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_categories_search ON categories USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_quizzes_search ON quizzes USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_questions_search ON questions USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_answers_search ON answers USING GIN (search_vector);
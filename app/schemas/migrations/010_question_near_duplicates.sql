@@ -0,0 +1,19 @@
+-- Détection des questions quasi identiques (MinHash + LSH)
+-- PostgreSQL
+-- Après la migration, calculer les signatures des questions existantes :
+--   python -m app.services.near_duplicates reindex
+
+-- Signature MinHash de l'énoncé (128 valeurs de 32 bits)
+CREATE TABLE IF NOT EXISTS question_signatures (
+    question_id UUID PRIMARY KEY REFERENCES questions(id) ON DELETE CASCADE,
+    signature BYTEA NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Seaux LSH : un par bande de la signature
+CREATE TABLE IF NOT EXISTS question_lsh_buckets (
+    bucket BIGINT NOT NULL,
+    question_id UUID NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+    PRIMARY KEY (bucket, question_id)
+);
+CREATE INDEX IF NOT EXISTS idx_question_lsh_buckets_question_id ON question_lsh_buckets(question_id);
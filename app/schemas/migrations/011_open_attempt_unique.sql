@@ -0,0 +1,21 @@
+-- Au plus une tentative en cours par utilisateur et par quiz
+-- PostgreSQL
+-- Les doublons créés par des démarrages concurrents sont supprimés ; recalculer ensuite
+-- les synthèses :
+--   python -m app.services.user_stats rebuild
+
+DELETE FROM user_quiz_attempts a
+USING user_quiz_attempts b
+WHERE a.completed_at IS NULL
+  AND b.completed_at IS NULL
+  AND a.user_id = b.user_id
+  AND a.quiz_id = b.quiz_id
+  -- Choix arbitraire : les tentatives n'ont pas encore de date de démarrage (ajoutée par
+  -- la migration 012, qui la renseigne à la même valeur pour toutes les lignes
+  -- existantes) et les ids hérités ne suivent pas l'ordre de création ; seule compte
+  -- l'unicité de la tentative conservée
+  AND a.id > b.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_user_quiz_attempts_open
+    ON user_quiz_attempts(user_id, quiz_id)
+    WHERE completed_at IS NULL;
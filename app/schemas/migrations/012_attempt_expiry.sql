@@ -0,0 +1,24 @@
+-- Expiration des tentatives abandonnées
+-- PostgreSQL
+-- Les tentatives ouvertes existantes, dont l'heure de démarrage est inconnue, reçoivent
+-- une échéance comptée à partir de la migration.
+
+ALTER TABLE quizzes ADD COLUMN IF NOT EXISTS time_limit_minutes INTEGER;
+
+ALTER TABLE user_quiz_attempts ADD COLUMN IF NOT EXISTS started_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE user_quiz_attempts ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE user_quiz_attempts ADD COLUMN IF NOT EXISTS expired_at TIMESTAMP WITH TIME ZONE;
+
+UPDATE user_quiz_attempts a
+SET expires_at = CURRENT_TIMESTAMP + make_interval(mins => coalesce(q.time_limit_minutes, 120))
+FROM quizzes q
+WHERE q.id = a.quiz_id AND a.completed_at IS NULL AND a.expires_at IS NULL;
+
+-- Les index partiels ne couvrent plus que les tentatives réellement en cours
+DROP INDEX IF EXISTS uq_user_quiz_attempts_open;
+CREATE UNIQUE INDEX uq_user_quiz_attempts_open
+    ON user_quiz_attempts(user_id, quiz_id)
+    WHERE completed_at IS NULL AND expired_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_user_quiz_attempts_open_expiry
+    ON user_quiz_attempts(expires_at)
+    WHERE completed_at IS NULL AND expired_at IS NULL;
@@ -0,0 +1,31 @@
+-- Archive des tentatives anciennes
+-- PostgreSQL
+-- Table partitionnée par mois de la tentative ; les partitions mensuelles sont créées
+-- par le job d'archivage au besoin. Archivage initial (puis en cron) :
+--   python -m app.services.attempt_archive archive
+
+CREATE TABLE IF NOT EXISTS user_quiz_attempts_archive (
+    id UUID NOT NULL,
+    period DATE NOT NULL,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    quiz_id UUID NOT NULL,
+    quiz_version_id UUID,
+    quiz_title VARCHAR,
+    score DOUBLE PRECISION,
+    passed BOOLEAN,
+    started_at TIMESTAMP WITH TIME ZONE,
+    completed_at TIMESTAMP WITH TIME ZONE,
+    expired_at TIMESTAMP WITH TIME ZONE,
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    payload BYTEA NOT NULL,
+    PRIMARY KEY (id, period)
+) PARTITION BY RANGE (period);
+
+CREATE INDEX IF NOT EXISTS idx_user_quiz_attempts_archive_user_id
+    ON user_quiz_attempts_archive(user_id);
+-- Garde de suppression des quiz (tentatives archivées comprises)
+CREATE INDEX IF NOT EXISTS idx_user_quiz_attempts_archive_quiz_id
+    ON user_quiz_attempts_archive(quiz_id);
+
+-- Le contenu est déjà compressé : inutile de le recompresser dans TOAST
+ALTER TABLE user_quiz_attempts_archive ALTER COLUMN payload SET STORAGE EXTERNAL;
@@ -0,0 +1,26 @@
+-- Outbox des événements métier (résultats, inscriptions, progression)
+-- PostgreSQL
+-- Les événements sont livrés aux consommateurs configurés (OUTBOX_CONSUMERS) par le
+-- relais de chaque worker, ou ponctuellement : python -m app.services.outbox relay
+
+CREATE TABLE IF NOT EXISTS outbox_events (
+    id BIGSERIAL PRIMARY KEY,
+    event_type VARCHAR NOT NULL,
+    aggregate_id UUID,
+    payload JSONB NOT NULL,
+    -- Transaction d'écriture : ordre de livraison (transaction_id, id), voir services/outbox
+    transaction_id BIGINT NOT NULL DEFAULT txid_current(),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_events_created_at ON outbox_events(created_at);
+CREATE INDEX IF NOT EXISTS idx_outbox_events_position ON outbox_events(transaction_id, id);
+
+CREATE TABLE IF NOT EXISTS outbox_cursors (
+    consumer VARCHAR PRIMARY KEY,
+    transaction_id BIGINT NOT NULL DEFAULT 0,
+    position BIGINT NOT NULL DEFAULT 0,
+    delivered_count BIGINT NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
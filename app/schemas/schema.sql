@@ -1,9 +1,10 @@
 -- Quiz Programming Database Schema
 -- PostgreSQL
+-- Les identifiants sont des UUID v7 générés par l'application (app/db/ids.py)
 
 -- Users table
 CREATE TABLE users (
-    id VARCHAR PRIMARY KEY,
+    id UUID PRIMARY KEY,
     name VARCHAR NOT NULL,
     email VARCHAR UNIQUE NOT NULL,
     password VARCHAR NOT NULL,
@@ -14,84 +15,232 @@ CREATE TABLE users (
 
 -- Categories table
 CREATE TABLE categories (
-    id VARCHAR PRIMARY KEY,
+    id UUID PRIMARY KEY,
     name VARCHAR UNIQUE NOT NULL,
     description TEXT,
     icon_url VARCHAR,
     is_active BOOLEAN DEFAULT TRUE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP WITH TIME ZONE
+    updated_at TIMESTAMP WITH TIME ZONE,
+    -- Recherche plein texte
+    search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+    ) STORED
 );
 
 -- Quizzes table
 CREATE TABLE quizzes (
-    id VARCHAR PRIMARY KEY,
-    category_id VARCHAR REFERENCES categories(id),
+    id UUID PRIMARY KEY,
+    category_id UUID REFERENCES categories(id),
     title VARCHAR NOT NULL,
     level VARCHAR NOT NULL,
     status VARCHAR DEFAULT 'draft',
+    -- Banque de questions : nombre de questions tirées par tentative (toutes si NULL)
+    sample_size INTEGER,
+    stratified BOOLEAN NOT NULL DEFAULT FALSE,
+    -- Durée maximale d'une tentative en minutes (réglage global si NULL)
+    time_limit_minutes INTEGER,
+    -- Version publiée servie aux nouvelles tentatives
+    current_version_id UUID,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP WITH TIME ZONE
+    updated_at TIMESTAMP WITH TIME ZONE,
+    search_vector tsvector GENERATED ALWAYS AS (setweight(to_tsvector('simple', coalesce(title, '')), 'A')) STORED
+);
+
+-- Versions immuables des quiz publiés (quiz, questions, réponses et corrigé)
+CREATE TABLE quiz_versions (
+    id UUID PRIMARY KEY,
+    quiz_id UUID NOT NULL REFERENCES quizzes(id) ON DELETE CASCADE,
+    version INTEGER NOT NULL,
+    content JSONB NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (quiz_id, version)
 );
 
 -- Questions table
 CREATE TABLE questions (
-    id VARCHAR PRIMARY KEY,
-    quiz_id VARCHAR REFERENCES quizzes(id),
+    id UUID PRIMARY KEY,
+    quiz_id UUID REFERENCES quizzes(id) ON DELETE CASCADE,
     question_text TEXT NOT NULL,
     "order" INTEGER NOT NULL,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    stratum VARCHAR,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    search_vector tsvector GENERATED ALWAYS AS (setweight(to_tsvector('simple', coalesce(question_text, '')), 'A')) STORED
 );
 
 -- Answers table
 CREATE TABLE answers (
-    id VARCHAR PRIMARY KEY,
-    question_id VARCHAR REFERENCES questions(id),
+    id UUID PRIMARY KEY,
+    question_id UUID REFERENCES questions(id) ON DELETE CASCADE,
     answer_text VARCHAR NOT NULL,
     is_correct BOOLEAN DEFAULT FALSE,
     "order" INTEGER NOT NULL,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    search_vector tsvector GENERATED ALWAYS AS (setweight(to_tsvector('simple', coalesce(answer_text, '')), 'A')) STORED
 );
 
 -- User Quiz Attempts table
 CREATE TABLE user_quiz_attempts (
-    id VARCHAR PRIMARY KEY,
-    user_id VARCHAR REFERENCES users(id),
-    quiz_id VARCHAR REFERENCES quizzes(id),
+    id UUID PRIMARY KEY,
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    quiz_id UUID REFERENCES quizzes(id),
+    -- Version du quiz servie et corrigée (NULL pour les tentatives antérieures aux versions)
+    quiz_version_id UUID REFERENCES quiz_versions(id),
     score DECIMAL(5,2),
     passed BOOLEAN,
-    completed_at TIMESTAMP WITH TIME ZONE
+    completed_at TIMESTAMP WITH TIME ZONE,
+    -- Réponses au format compact {question_id: [masque, correct]}
+    selections JSONB,
+    -- Résultat renvoyé à la soumission (rejoué pour les soumissions en double)
+    result JSONB,
+    -- Questions tirées (banque de questions) et graine du tirage
+    question_ids JSONB,
+    seed BIGINT,
+    -- Démarrage, échéance et expiration (tentatives abandonnées)
+    started_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP WITH TIME ZONE,
+    expired_at TIMESTAMP WITH TIME ZONE
 );
 
 -- User Answers table
 CREATE TABLE user_answers (
-    id VARCHAR PRIMARY KEY,
-    attempt_id VARCHAR REFERENCES user_quiz_attempts(id),
-    question_id VARCHAR REFERENCES questions(id),
-    answer_id VARCHAR REFERENCES answers(id),
+    id UUID PRIMARY KEY,
+    attempt_id UUID REFERENCES user_quiz_attempts(id) ON DELETE CASCADE,
+    question_id UUID REFERENCES questions(id),
+    answer_id UUID REFERENCES answers(id),
     is_correct BOOLEAN,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
 -- User Progress table
 CREATE TABLE user_progress (
-    id VARCHAR PRIMARY KEY,
-    user_id VARCHAR REFERENCES users(id),
-    category_id VARCHAR REFERENCES categories(id),
+    id UUID PRIMARY KEY,
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    category_id UUID REFERENCES categories(id),
     current_level VARCHAR DEFAULT 'debutant',
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(user_id, category_id)
 );
 
+-- Statistiques par question et par réponse (analyse d'items)
+CREATE TABLE question_stats (
+    question_id UUID PRIMARY KEY REFERENCES questions(id) ON DELETE CASCADE,
+    times_shown INTEGER NOT NULL DEFAULT 0,
+    times_correct INTEGER NOT NULL DEFAULT 0,
+    difficulty DOUBLE PRECISION,
+    discrimination DOUBLE PRECISION,
+    computed_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE TABLE answer_stats (
+    answer_id UUID PRIMARY KEY REFERENCES answers(id) ON DELETE CASCADE,
+    question_id UUID REFERENCES questions(id) ON DELETE CASCADE,
+    times_picked INTEGER NOT NULL DEFAULT 0
+);
+
+-- Synthèse par utilisateur pour le tableau de bord (mise à jour à chaque tentative)
+CREATE TABLE user_stats (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    attempt_count INTEGER NOT NULL DEFAULT 0,
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    passed_count INTEGER NOT NULL DEFAULT 0,
+    categories_mastered INTEGER NOT NULL DEFAULT 0,
+    recent_attempts JSONB NOT NULL DEFAULT '[]',
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Signatures MinHash des énoncés (détection des quasi-doublons)
+CREATE TABLE question_signatures (
+    question_id UUID PRIMARY KEY REFERENCES questions(id) ON DELETE CASCADE,
+    signature BYTEA NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Seaux LSH des signatures, un par bande
+CREATE TABLE question_lsh_buckets (
+    bucket BIGINT NOT NULL,
+    question_id UUID NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+    PRIMARY KEY (bucket, question_id)
+);
+
+-- Archive des tentatives anciennes, partitionnée par mois (partitions créées par l'archivage)
+CREATE TABLE user_quiz_attempts_archive (
+    id UUID NOT NULL,
+    period DATE NOT NULL,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    quiz_id UUID NOT NULL,
+    quiz_version_id UUID,
+    quiz_title VARCHAR,
+    score DOUBLE PRECISION,
+    passed BOOLEAN,
+    started_at TIMESTAMP WITH TIME ZONE,
+    completed_at TIMESTAMP WITH TIME ZONE,
+    expired_at TIMESTAMP WITH TIME ZONE,
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    -- Réponses, résultat et tirage en JSON compressé (zlib)
+    payload BYTEA NOT NULL,
+    PRIMARY KEY (id, period)
+) PARTITION BY RANGE (period);
+
+-- Événements métier (outbox), écrits dans la transaction qui les produit
+CREATE TABLE outbox_events (
+    id BIGSERIAL PRIMARY KEY,
+    event_type VARCHAR NOT NULL,
+    aggregate_id UUID,
+    payload JSONB NOT NULL,
+    -- Transaction d'écriture : ordre de livraison (transaction_id, id), voir services/outbox
+    transaction_id BIGINT NOT NULL DEFAULT txid_current(),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Position de livraison de chaque consommateur de l'outbox
+CREATE TABLE outbox_cursors (
+    consumer VARCHAR PRIMARY KEY,
+    transaction_id BIGINT NOT NULL DEFAULT 0,
+    position BIGINT NOT NULL DEFAULT 0,
+    delivered_count BIGINT NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Indexes for better performance
 CREATE INDEX idx_users_email ON users(email);
 CREATE INDEX idx_categories_is_active ON categories(is_active);
 CREATE INDEX idx_quizzes_category_id ON quizzes(category_id);
 CREATE INDEX idx_quizzes_status ON quizzes(status);
+CREATE INDEX idx_quiz_versions_quiz_id ON quiz_versions(quiz_id);
 CREATE INDEX idx_questions_quiz_id ON questions(quiz_id);
+CREATE INDEX idx_questions_quiz_order ON questions(quiz_id, "order", stratum) INCLUDE (id);
 CREATE INDEX idx_answers_question_id ON answers(question_id);
 CREATE INDEX idx_user_quiz_attempts_user_id ON user_quiz_attempts(user_id);
 CREATE INDEX idx_user_quiz_attempts_quiz_id ON user_quiz_attempts(quiz_id);
+CREATE UNIQUE INDEX uq_user_quiz_attempts_open ON user_quiz_attempts(user_id, quiz_id) WHERE completed_at IS NULL AND expired_at IS NULL;
+CREATE INDEX idx_user_quiz_attempts_open_expiry ON user_quiz_attempts(expires_at) WHERE completed_at IS NULL AND expired_at IS NULL;
+CREATE INDEX idx_user_quiz_attempts_archive_user_id ON user_quiz_attempts_archive(user_id);
+CREATE INDEX idx_user_quiz_attempts_archive_quiz_id ON user_quiz_attempts_archive(quiz_id);
+CREATE INDEX idx_outbox_events_created_at ON outbox_events(created_at);
+CREATE INDEX idx_outbox_events_position ON outbox_events(transaction_id, id);
 CREATE INDEX idx_user_answers_attempt_id ON user_answers(attempt_id);
+CREATE INDEX idx_user_answers_question_id ON user_answers(question_id);
+CREATE INDEX idx_user_answers_answer_id ON user_answers(answer_id);
 CREATE INDEX idx_user_progress_user_id ON user_progress(user_id);
-CREATE INDEX idx_user_progress_category_id ON user_progress(category_id);
\ No newline at end of file
+CREATE INDEX idx_user_progress_category_id ON user_progress(category_id);
+CREATE INDEX idx_answer_stats_question_id ON answer_stats(question_id);
+CREATE INDEX idx_question_lsh_buckets_question_id ON question_lsh_buckets(question_id);
+CREATE INDEX idx_categories_search ON categories USING GIN (search_vector);
+CREATE INDEX idx_quizzes_search ON quizzes USING GIN (search_vector);
+CREATE INDEX idx_questions_search ON questions USING GIN (search_vector);
+CREATE INDEX idx_answers_search ON answers USING GIN (search_vector);
+
+-- Analyse par question des réponses stockées au format compact
+CREATE VIEW attempt_question_selections AS
+SELECT a.id AS attempt_id,
+       a.quiz_id,
+       s.key::UUID AS question_id,
+       (s.value->>0)::BIGINT AS answer_mask,
+       (s.value->>1)::INTEGER = 1 AS is_correct
+FROM user_quiz_attempts a
+CROSS JOIN LATERAL jsonb_each(a.selections) s
+WHERE a.selections IS NOT NULL;
\ No newline at end of file
@@ -0,0 +1,360 @@
+"""
+Instantané colonnaire des réponses, pour l'analyse hors base de données.
+
+Le job écrit une ligne par réponse choisie (tentatives terminées, tables chaudes et
+archive) sous forme de colonnes NumPy (`.npy`), dans un répertoire par instantané de
+`analytics_snapshot_dir`. Les identifiants sont codés en entiers ; les tables de
+correspondance sont dans `manifest.json`. `current.json` désigne le dernier instantané
+complet et n'est remplacé qu'une fois celui-ci écrit.
+
+Les colonnes sont projetées en mémoire (`np.load(mmap_mode="r")`) et agrégées par des
+opérations vectorisées : les rapports d'analyse (`/admin/analytics/...`) ne lisent
+jamais la base principale.
+
+Lancement du job (cron) : `python -m app.services.answer_snapshot build`.
+"""
+import json
+import os
+import shutil
+import sys
+import threading
+from array import array
+from datetime import date, datetime
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models import Answer, ArchivedAttempt, Quiz, QuizVersion, User, UserAnswer, UserQuizAttempt
+from app.services.answer_storage import unpack_selection
+from app.services.attempt_archive import decode_payload
+
+# Colonnes de l'instantané et leur type (array.array, dtype NumPy)
+COLUMNS = {
+    "attempt": ("i", np.int32),
+    "user": ("i", np.int32),
+    "quiz": ("i", np.int32),
+    "category": ("i", np.int32),
+    "question": ("i", np.int32),
+    "answer": ("i", np.int32),
+    "cohort": ("i", np.int32),  # mois d'inscription de l'utilisateur, AAAAMM
+    "day": ("i", np.int32),  # jour de la tentative, en jours depuis le 1er janvier 1970
+    "question_correct": ("b", np.bool_),
+    "answer_correct": ("b", np.bool_),
+    "passed": ("b", np.bool_)
+}
+
+# Dictionnaires d'identifiants du manifeste
+DICTIONARIES = ("attempt", "user", "quiz", "category", "question", "answer")
+
+# Instantanés conservés (le précédent reste lisible par les workers qui le projettent encore)
+KEEP_SNAPSHOTS = 2
+
+_EPOCH = date(1970, 1, 1)
+
+class _Codes:
+    """Codage des identifiants en entiers consécutifs"""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def code(self, value) -> int:
+        if value is None:
+            return -1
+        value = str(value)
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+class _Writer:
+    """Accumule les lignes de l'instantané en colonnes compactes"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.codes = {name: _Codes() for name in DICTIONARIES}
+        self.columns = {name: array(typecode) for name, (typecode, _) in COLUMNS.items()}
+
+        self.answers = {}
+        self.orders: Dict[str, Dict[str, int]] = {}
+        for answer_id, question_id, is_correct, order in db.query(
+            Answer.id, Answer.question_id, Answer.is_correct, Answer.order
+        ):
+            self.answers[answer_id] = bool(is_correct)
+            self.orders.setdefault(question_id, {})[answer_id] = order
+        # Ordres et corrigé des réponses de chaque version, lus au premier usage
+        self.versions: Dict[str, tuple] = {}
+        self.categories = dict(db.query(Quiz.id, Quiz.category_id))
+        self.cohorts = {
+            user_id: created_at.year * 100 + created_at.month if created_at else 0
+            for user_id, created_at in db.query(User.id, User.created_at)
+        }
+
+    def served(self, version_id: Optional[str]) -> tuple:
+        """
+        (ordres par question, corrigé par réponse) servis à une tentative : ceux de sa
+        version, ou le contenu courant pour les tentatives sans version
+        """
+        if not version_id:
+            return self.orders, self.answers
+        served = self.versions.get(version_id)
+        if served is None:
+            content = self.db.query(QuizVersion.content).filter(QuizVersion.id == version_id).scalar()
+            if content is None:
+                return self.orders, self.answers
+            orders, answers = {}, {}
+            for question in content["questions"]:
+                for answer in question["answers"]:
+                    orders.setdefault(question["id"], {})[answer["id"]] = answer["order"]
+                    answers[answer["id"]] = bool(answer["is_correct"])
+            served = self.versions[version_id] = (orders, answers)
+        return served
+
+    def add(self, attempt_id, user_id, quiz_id, version_id, passed, completed_at, question_id, answer_id,
+            question_correct):
+        columns = self.columns
+        columns["attempt"].append(self.codes["attempt"].code(attempt_id))
+        columns["user"].append(self.codes["user"].code(user_id))
+        columns["quiz"].append(self.codes["quiz"].code(quiz_id))
+        columns["category"].append(self.codes["category"].code(self.categories.get(quiz_id)))
+        columns["question"].append(self.codes["question"].code(question_id))
+        columns["answer"].append(self.codes["answer"].code(answer_id))
+        columns["cohort"].append(self.cohorts.get(user_id, 0))
+        columns["day"].append((completed_at.date() - _EPOCH).days)
+        columns["question_correct"].append(bool(question_correct))
+        columns["answer_correct"].append(self.served(version_id)[1].get(answer_id, False))
+        columns["passed"].append(bool(passed))
+
+    def add_selections(self, attempt_id, user_id, quiz_id, version_id, passed, completed_at, selections: dict):
+        """Réponses au format compact {question_id: [masque, correct]}, décodées avec les ordres servis"""
+        orders = self.served(version_id)[0]
+        for question_id, (mask, correct) in selections.items():
+            for answer_id in unpack_selection(mask, orders.get(question_id, {})):
+                self.add(attempt_id, user_id, quiz_id, version_id, passed, completed_at, question_id, answer_id,
+                         correct)
+
+    def save(self, path: str, created_at: datetime) -> dict:
+        os.makedirs(path)
+        for name, (_, dtype) in COLUMNS.items():
+            np.save(os.path.join(path, f"{name}.npy"), np.frombuffer(self.columns[name], dtype=dtype))
+        manifest = {
+            "created_at": created_at.isoformat(),
+            "rows": len(self.columns["attempt"]),
+            "dictionaries": {name: self.codes[name].values for name in DICTIONARIES}
+        }
+        with open(os.path.join(path, "manifest.json"), "w") as handle:
+            json.dump(manifest, handle)
+        return manifest
+
+def build_snapshot(db: Session, output_dir: Optional[str] = None, chunk_size: int = 5000) -> dict:
+    """Écrit un nouvel instantané et le désigne comme courant ; retourne son manifeste"""
+    output_dir = output_dir or settings.analytics_snapshot_dir
+    created_at = datetime.utcnow()
+    writer = _Writer(db)
+
+    # Format compact : réponses portées par la tentative
+    for row in db.query(
+        UserQuizAttempt.id, UserQuizAttempt.user_id, UserQuizAttempt.quiz_id, UserQuizAttempt.quiz_version_id,
+        UserQuizAttempt.passed, UserQuizAttempt.completed_at, UserQuizAttempt.selections
+    ).filter(
+        UserQuizAttempt.completed_at.isnot(None), UserQuizAttempt.selections.isnot(None)
+    ).yield_per(chunk_size):
+        writer.add_selections(row.id, row.user_id, row.quiz_id, row.quiz_version_id, row.passed, row.completed_at,
+                              row.selections)
+
+    # Format lignes : user_answers
+    for row in db.query(
+        UserQuizAttempt.id, UserQuizAttempt.user_id, UserQuizAttempt.quiz_id, UserQuizAttempt.quiz_version_id,
+        UserQuizAttempt.passed, UserQuizAttempt.completed_at, UserAnswer.question_id, UserAnswer.answer_id,
+        UserAnswer.is_correct
+    ).join(UserAnswer, UserAnswer.attempt_id == UserQuizAttempt.id).filter(
+        UserQuizAttempt.completed_at.isnot(None)
+    ).yield_per(chunk_size):
+        writer.add(row.id, row.user_id, row.quiz_id, row.quiz_version_id, row.passed, row.completed_at,
+                   row.question_id, row.answer_id, row.is_correct)
+
+    # Archive : réponses décompressées depuis le contenu de chaque tentative
+    for row in db.query(
+        ArchivedAttempt.id, ArchivedAttempt.user_id, ArchivedAttempt.quiz_id, ArchivedAttempt.quiz_version_id,
+        ArchivedAttempt.passed, ArchivedAttempt.completed_at, ArchivedAttempt.payload
+    ).filter(ArchivedAttempt.completed_at.isnot(None)).yield_per(chunk_size):
+        payload = decode_payload(row.payload)
+        if payload["selections"] is not None:
+            writer.add_selections(row.id, row.user_id, row.quiz_id, row.quiz_version_id, row.passed,
+                                  row.completed_at, payload["selections"])
+        for question_id, answer_id, is_correct in payload["answers"]:
+            writer.add(row.id, row.user_id, row.quiz_id, row.quiz_version_id, row.passed, row.completed_at,
+                       question_id, answer_id, is_correct)
+
+    # Écriture dans un répertoire temporaire, puis renommage et bascule atomique de current.json
+    os.makedirs(output_dir, exist_ok=True)
+    name = created_at.strftime("%Y%m%dT%H%M%S%f")
+    staging = os.path.join(output_dir, f".{name}")
+    manifest = writer.save(staging, created_at)
+    os.rename(staging, os.path.join(output_dir, name))
+    pointer = os.path.join(output_dir, ".current.json")
+    with open(pointer, "w") as handle:
+        json.dump({"snapshot": name}, handle)
+    os.replace(pointer, os.path.join(output_dir, "current.json"))
+
+    snapshots = sorted(entry for entry in os.listdir(output_dir) if entry[0].isdigit())
+    for old in snapshots[:-KEEP_SNAPSHOTS]:
+        shutil.rmtree(os.path.join(output_dir, old), ignore_errors=True)
+    return manifest
+
+class Snapshot:
+    """Instantané ouvert : colonnes projetées en mémoire et dictionnaires d'identifiants"""
+
+    def __init__(self, path: str, name: str):
+        self.name = name
+        with open(os.path.join(path, "manifest.json")) as handle:
+            manifest = json.load(handle)
+        self.created_at = manifest["created_at"]
+        self.rows = manifest["rows"]
+        self.dictionaries = manifest["dictionaries"]
+        self._codes = {kind: {value: code for code, value in enumerate(values)}
+                       for kind, values in self.dictionaries.items()}
+        self.columns = {
+            column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r") if self.rows else
+            np.empty(0, dtype=dtype)
+            for column, (_, dtype) in COLUMNS.items()
+        }
+
+    def code(self, kind: str, value: str) -> Optional[int]:
+        return self._codes[kind].get(str(value))
+
+    def mask(self, quiz_id: Optional[str] = None) -> np.ndarray:
+        """Lignes à retenir (toutes, ou celles d'un quiz)"""
+        if quiz_id is None:
+            return np.ones(self.rows, dtype=bool)
+        code = self.code("quiz", quiz_id)
+        if code is None:
+            return np.zeros(self.rows, dtype=bool)
+        return self.columns["quiz"] == code
+
+_lock = threading.Lock()
+_current: Optional[Snapshot] = None
+
+def current_snapshot(output_dir: Optional[str] = None) -> Optional[Snapshot]:
+    """Dernier instantané écrit par le job, rouvert quand il a changé ; None s'il n'y en a pas"""
+    global _current
+    output_dir = output_dir or settings.analytics_snapshot_dir
+    try:
+        with open(os.path.join(output_dir, "current.json")) as handle:
+            name = json.load(handle)["snapshot"]
+    except (OSError, ValueError, KeyError):
+        return None
+    with _lock:
+        if _current is None or _current.name != name:
+            _current = Snapshot(os.path.join(output_dir, name), name)
+        return _current
+
+def summary(snapshot: Snapshot) -> dict:
+    columns = snapshot.columns
+    return {
+        "created_at": snapshot.created_at,
+        "answers": snapshot.rows,
+        "attempts": len(snapshot.dictionaries["attempt"]),
+        "users": len(snapshot.dictionaries["user"]),
+        "questions": len(snapshot.dictionaries["question"]),
+        "correct_answer_rate": round(float(columns["answer_correct"].mean()), 4) if snapshot.rows else None
+    }
+
+def cohort_pass_rates(snapshot: Snapshot, quiz_id: Optional[str] = None) -> List[dict]:
+    """Taux de réussite des tentatives par mois d'inscription des utilisateurs"""
+    columns = snapshot.columns
+    mask = snapshot.mask(quiz_id)
+    # Une ligne par tentative
+    _, first = np.unique(columns["attempt"][mask], return_index=True)
+    cohorts = columns["cohort"][mask][first]
+    passed = columns["passed"][mask][first]
+    users = columns["user"][mask][first]
+
+    values, inverse = np.unique(cohorts, return_inverse=True)
+    attempts = np.bincount(inverse, minlength=len(values))
+    passes = np.bincount(inverse, weights=passed, minlength=len(values))
+    # Utilisateurs distincts par cohorte : couples (cohorte, utilisateur) uniques
+    user_count = max(len(snapshot.dictionaries["user"]), 1)
+    pairs = np.unique(inverse.astype(np.int64) * user_count + users)
+    users_per_cohort = np.bincount(pairs // user_count, minlength=len(values))
+    return [
+        {
+            "cohort": f"{cohort // 100:04d}-{cohort % 100:02d}" if cohort else None,
+            "users": int(users_per_cohort[index]),
+            "attempts": int(attempts[index]),
+            "pass_rate": round(float(passes[index] / attempts[index]), 4)
+        }
+        for index, cohort in enumerate(values)
+    ]
+
+def distractors(snapshot: Snapshot, question_id: str) -> Optional[dict]:
+    """Choix de chaque réponse d'une question, parmi toutes les tentatives et parmi les échecs"""
+    code = snapshot.code("question", question_id)
+    if code is None:
+        return None
+    columns = snapshot.columns
+    mask = columns["question"] == code
+    attempts = columns["attempt"][mask]
+    answers = columns["answer"][mask]
+    wrong = ~columns["question_correct"][mask]
+    answer_correct = columns["answer_correct"][mask]
+
+    respondents = int(np.unique(attempts).size)
+    failed = int(np.unique(attempts[wrong]).size)
+    values, first, picks = np.unique(answers, return_index=True, return_counts=True)
+    wrong_picks = np.bincount(np.searchsorted(values, answers[wrong]), minlength=len(values))
+    return {
+        "respondents": respondents,
+        "failed": failed,
+        "answers": [
+            {
+                "answer_id": snapshot.dictionaries["answer"][value],
+                "is_correct": bool(answer_correct[first[index]]),
+                "picks": int(picks[index]),
+                "pick_rate": round(float(picks[index]) / respondents, 4),
+                "pick_rate_among_failed": round(float(wrong_picks[index]) / failed, 4) if failed else None
+            }
+            for index, value in enumerate(values)
+        ]
+    }
+
+def trends(snapshot: Snapshot, quiz_id: Optional[str] = None, granularity: str = "day") -> List[dict]:
+    """Questions répondues et taux de bonnes réponses par jour ou par semaine (lundi)"""
+    columns = snapshot.columns
+    mask = snapshot.mask(quiz_id)
+    # Une ligne par (tentative, question) : les réponses multiples ne comptent qu'une fois
+    pairs = columns["attempt"][mask].astype(np.int64) * max(len(snapshot.dictionaries["question"]), 1) \
+        + columns["question"][mask]
+    _, first = np.unique(pairs, return_index=True)
+    days = columns["day"][mask][first]
+    correct = columns["question_correct"][mask][first]
+    if granularity == "week":
+        # Le 1er janvier 1970 est un jeudi : décalage de 3 jours pour commencer au lundi
+        days = days - (days + 3) % 7
+
+    values, inverse = np.unique(days, return_inverse=True)
+    answered = np.bincount(inverse, minlength=len(values))
+    right = np.bincount(inverse, weights=correct, minlength=len(values))
+    return [
+        {
+            "period": date.fromordinal(_EPOCH.toordinal() + int(day)).isoformat(),
+            "answered": int(answered[index]),
+            "correct_rate": round(float(right[index] / answered[index]), 4)
+        }
+        for index, day in enumerate(values)
+    ]
+
+if __name__ == "__main__":
+    from app.db.session import SessionLocal
+
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("Usage: python -m app.services.answer_snapshot build")
+        sys.exit(1)
+
+    session = SessionLocal()
+    try:
+        manifest = build_snapshot(session)
+        print(f"Instantané écrit : {manifest['rows']} réponses")
+    finally:
+        session.close()
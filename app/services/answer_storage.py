@@ -0,0 +1,234 @@
+"""
+Stockage des réponses sélectionnées lors d'une tentative.
+
+Deux formats coexistent :
+- "rows" : une ligne `user_answers` par réponse sélectionnée (format historique) ;
+- "compact" : une seule structure JSON par tentative dans `user_quiz_attempts.selections`,
+  de la forme {question_id: [masque, correct]} où le bit n du masque correspond à la
+  réponse d'ordre n de la question et `correct` vaut 1 ou 0.
+
+Le format d'écriture est choisi par `settings.answer_storage` ; la lecture gère les deux.
+Migration des données existantes : `python -m app.services.answer_storage migrate`.
+"""
+import sys
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import exists, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.ids import new_id
+from app.models import UserQuizAttempt, UserAnswer, Answer
+from app.services.attempt_archive import archive_references_question
+
+# Le masque doit tenir dans un bigint PostgreSQL pour rester exploitable en SQL
+MAX_ORDINAL = 62
+
+def can_pack(answer_orders: Dict[str, int]) -> bool:
+    """
+    Indique si toutes les réponses d'une question sont représentables dans un masque :
+    ordres dans les limites et distincts (deux réponses de même ordre partageraient un bit)
+    """
+    orders = list(answer_orders.values())
+    return len(set(orders)) == len(orders) and all(0 <= order <= MAX_ORDINAL for order in orders)
+
+def pack_selection(answer_ids: Iterable[str], answer_orders: Dict[str, int]) -> int:
+    """Encode les réponses sélectionnées en masque de bits (les ids inconnus sont ignorés)"""
+    mask = 0
+    for answer_id in answer_ids:
+        order = answer_orders.get(answer_id)
+        if order is not None:
+            mask |= 1 << order
+    return mask
+
+def unpack_selection(mask: int, answer_orders: Dict[str, int]) -> List[str]:
+    """Décode un masque en liste d'ids de réponses, dans l'ordre des réponses"""
+    return [
+        answer_id
+        for answer_id, order in sorted(answer_orders.items(), key=lambda item: item[1])
+        if mask >> order & 1
+    ]
+
+def encode_answers(attempt_id: str, graded: List[dict]) -> Tuple[Optional[dict], List[dict]]:
+    """
+    Encode les réponses corrigées d'une tentative selon le format configuré.
+
+    `graded` contient pour chaque question : question_id, answer_ids, is_correct et
+    answer_orders ({answer_id: order} pour toutes les réponses de la question).
+    Retourne (selections, lignes user_answers) : l'un des deux seulement est rempli.
+    """
+    compact = settings.answer_storage == "compact" and all(
+        can_pack(item["answer_orders"]) for item in graded
+    )
+    if compact:
+        return {
+            item["question_id"]: [
+                pack_selection(item["answer_ids"], item["answer_orders"]),
+                1 if item["is_correct"] else 0
+            ]
+            for item in graded
+        }, []
+
+    rows = []
+    for item in graded:
+        # Les ids qui n'appartiennent pas à la question sont ignorés, comme au format compact
+        for answer_id in item["answer_ids"]:
+            if answer_id not in item["answer_orders"]:
+                continue
+            rows.append({
+                "id": new_id(),
+                "attempt_id": attempt_id,
+                "question_id": item["question_id"],
+                "answer_id": answer_id,
+                "is_correct": item["is_correct"]
+            })
+    return None, rows
+
+def live_answer_rows(db: Session, rows: List[dict]) -> List[dict]:
+    """
+    Lignes `user_answers` dont la réponse existe encore : une version figée peut référencer
+    des questions ou réponses supprimées depuis, que les clés étrangères refuseraient
+    """
+    if not rows:
+        return rows
+    live = {
+        row[0] for row in db.query(Answer.id).filter(Answer.id.in_({row["answer_id"] for row in rows}))
+    }
+    return [row for row in rows if row["answer_id"] in live]
+
+def store_answers(db: Session, attempt: UserQuizAttempt, graded: List[dict]):
+    """Enregistre les réponses corrigées d'une tentative (voir encode_answers)"""
+    selections, rows = encode_answers(attempt.id, graded)
+    if selections is not None:
+        attempt.selections = selections
+    for row in live_answer_rows(db, rows):
+        db.add(UserAnswer(**row))
+
+def load_selected_answer_ids(
+    db: Session,
+    attempt: UserQuizAttempt,
+    answer_orders: Dict[str, Dict[str, int]]
+) -> Dict[str, Set[str]]:
+    """
+    Retourne {question_id: ids des réponses sélectionnées} pour une tentative,
+    quel que soit son format de stockage. `answer_orders` est indexé par question.
+    """
+    if attempt.selections is not None:
+        return {
+            question_id: set(unpack_selection(value[0], answer_orders.get(question_id, {})))
+            for question_id, value in attempt.selections.items()
+        }
+
+    selected: Dict[str, Set[str]] = {}
+    rows = db.query(UserAnswer.question_id, UserAnswer.answer_id).filter(
+        UserAnswer.attempt_id == attempt.id
+    ).all()
+    for question_id, answer_id in rows:
+        selected.setdefault(question_id, set()).add(answer_id)
+    return selected
+
+def selections_reference(question_id: str):
+    """
+    Condition PostgreSQL : le format compact de la tentative contient la question
+    (opérateur JSONB `?` ; la colonne est déclarée JSON, d'où la conversion de type)
+    """
+    return type_coerce(UserQuizAttempt.selections, JSONB).has_key(question_id)
+
+def question_has_answers(db: Session, question_id: str, quiz_id: str) -> bool:
+    """
+    Indique si des réponses utilisateur (lignes, format compact ou tentatives archivées)
+    référencent la question
+    """
+    if db.query(exists().where(UserAnswer.question_id == question_id)).scalar():
+        return True
+
+    if db.bind.dialect.name == "postgresql":
+        if db.query(exists().where(
+            UserQuizAttempt.quiz_id == quiz_id,
+            selections_reference(question_id)
+        )).scalar():
+            return True
+    else:
+        query = db.query(UserQuizAttempt.selections).filter(
+            UserQuizAttempt.quiz_id == quiz_id,
+            UserQuizAttempt.selections != None
+        )
+        if any(question_id in selections for (selections,) in query):
+            return True
+    return archive_references_question(db, quiz_id, question_id)
+
+def migrate_user_answers(db: Session, batch_size: int = 500, delete_rows: bool = False) -> int:
+    """
+    Convertit les tentatives stockées en lignes `user_answers` vers le format compact.
+    Traite les tentatives par lots et retourne le nombre de tentatives migrées.
+    Les lignes d'origine ne sont supprimées que si `delete_rows` est vrai.
+    """
+    migrated = 0
+    skipped = set()
+    while True:
+        query = db.query(UserAnswer.attempt_id).join(
+            UserQuizAttempt, UserQuizAttempt.id == UserAnswer.attempt_id
+        ).filter(UserQuizAttempt.selections == None)
+        if skipped:
+            query = query.filter(UserAnswer.attempt_id.notin_(skipped))
+        attempt_ids = [
+            row[0] for row in query
+            .distinct()
+            .limit(batch_size)
+            .all()
+        ]
+        if not attempt_ids:
+            break
+
+        rows = db.query(UserAnswer).filter(UserAnswer.attempt_id.in_(attempt_ids)).all()
+        question_ids = {row.question_id for row in rows}
+        answer_orders: Dict[str, Dict[str, int]] = {}
+        for answer_id, question_id, order in db.query(Answer.id, Answer.question_id, Answer.order).filter(
+            Answer.question_id.in_(question_ids)
+        ):
+            answer_orders.setdefault(question_id, {})[answer_id] = order
+
+        by_attempt: Dict[str, Dict[str, dict]] = {}
+        for row in rows:
+            item = by_attempt.setdefault(row.attempt_id, {}).setdefault(
+                row.question_id, {"answer_ids": [], "is_correct": bool(row.is_correct)}
+            )
+            item["answer_ids"].append(row.answer_id)
+
+        for attempt in db.query(UserQuizAttempt).filter(UserQuizAttempt.id.in_(attempt_ids)):
+            questions = by_attempt.get(attempt.id, {})
+            orders = {question_id: answer_orders.get(question_id, {}) for question_id in questions}
+            # Une réponse supprimée depuis ou des ordres hors limites ou en double empêchent l'encodage :
+            # la tentative reste au format lignes
+            if not all(
+                can_pack(orders[question_id]) and set(item["answer_ids"]) <= set(orders[question_id])
+                for question_id, item in questions.items()
+            ):
+                skipped.add(attempt.id)
+                continue
+            attempt.selections = {
+                question_id: [pack_selection(item["answer_ids"], orders[question_id]), 1 if item["is_correct"] else 0]
+                for question_id, item in questions.items()
+            }
+            migrated += 1
+
+        if delete_rows:
+            db.query(UserAnswer).filter(
+                UserAnswer.attempt_id.in_(set(attempt_ids) - skipped)
+            ).delete(synchronize_session=False)
+        db.commit()
+
+    return migrated
+
+if __name__ == "__main__":
+    from app.db.session import SessionLocal
+
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage: python -m app.services.answer_storage migrate [--delete-rows]")
+        sys.exit(1)
+
+    session = SessionLocal()
+    try:
+        count = migrate_user_answers(session, delete_rows="--delete-rows" in sys.argv)
+        print(f"{count} tentatives migrées vers le format compact")
+    finally:
+        session.close()
@@ -0,0 +1,209 @@
+"""
+Archivage des tentatives anciennes (niveau froid).
+
+Les tentatives terminées ou expirées depuis plus de `attempt_archive_after_days` jours
+sont déplacées, par lots, de `user_quiz_attempts` et `user_answers` vers
+`user_quiz_attempts_archive` : une ligne par tentative, dont les réponses, le résultat
+et le tirage sont regroupés en JSON compressé (`payload`). Sous PostgreSQL l'archive
+est partitionnée par mois ; les partitions manquantes sont créées par le job.
+
+Les tables chaudes ne gardent ainsi que l'historique récent. L'historique
+(`include_archived=true`) et le détail d'une tentative lisent l'archive à la demande.
+
+Lancement du job (cron) : `python -m app.services.attempt_archive archive`.
+"""
+import json
+import sys
+import zlib
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import and_, delete, exists, insert, or_, text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models import ArchivedAttempt, Quiz, UserAnswer, UserQuizAttempt
+
+def period_of(attempt) -> date:
+    """Mois de la tentative (partition de l'archive)"""
+    moment = attempt.completed_at or attempt.expired_at or attempt.started_at or datetime.utcnow()
+    return date(moment.year, moment.month, 1)
+
+def _next_month(period: date) -> date:
+    return date(period.year + period.month // 12, period.month % 12 + 1, 1)
+
+def ensure_partitions(db: Session, periods: Set[date]):
+    """Crée les partitions mensuelles manquantes de l'archive (PostgreSQL)"""
+    if db.bind.dialect.name != "postgresql":
+        return
+    for period in sorted(periods):
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS user_quiz_attempts_archive_{period:%Y_%m} "
+            f"PARTITION OF user_quiz_attempts_archive "
+            f"FOR VALUES FROM ('{period.isoformat()}') TO ('{_next_month(period).isoformat()}')"
+        ))
+
+def encode_payload(attempt: UserQuizAttempt, answers: List[Tuple[str, str, bool]]) -> bytes:
+    payload = {
+        "selections": attempt.selections,
+        "result": attempt.result,
+        "question_ids": attempt.question_ids,
+        "seed": attempt.seed,
+        "answers": [[str(question_id), str(answer_id), is_correct] for question_id, answer_id, is_correct in answers]
+    }
+    return zlib.compress(json.dumps(payload, separators=(",", ":"), default=str).encode())
+
+def decode_payload(value: bytes) -> dict:
+    return json.loads(zlib.decompress(value))
+
+def archive_attempts(db: Session, older_than_days: Optional[int] = None, batch_size: Optional[int] = None,
+                     max_batches: Optional[int] = None, now: Optional[datetime] = None) -> int:
+    """
+    Archive les tentatives terminées ou expirées avant la date limite, une transaction par
+    lot de `batch_size`. Retourne le nombre de tentatives archivées.
+    """
+    older_than_days = older_than_days if older_than_days is not None else settings.attempt_archive_after_days
+    batch_size = batch_size or settings.attempt_archive_batch_size
+    cutoff = (now or datetime.utcnow()) - timedelta(days=older_than_days)
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        batches += 1
+        query = db.query(UserQuizAttempt).filter(or_(
+            UserQuizAttempt.completed_at < cutoff,
+            and_(UserQuizAttempt.completed_at.is_(None), UserQuizAttempt.expired_at < cutoff)
+        )).order_by(UserQuizAttempt.id).limit(batch_size)
+        if db.bind.dialect.name == "postgresql":
+            query = query.with_for_update(skip_locked=True)
+        attempts = query.all()
+        if not attempts:
+            break
+        ids = [attempt.id for attempt in attempts]
+
+        answers: Dict[str, List[Tuple[str, str, bool]]] = {}
+        for attempt_id, question_id, answer_id, is_correct in db.query(
+            UserAnswer.attempt_id, UserAnswer.question_id, UserAnswer.answer_id, UserAnswer.is_correct
+        ).filter(UserAnswer.attempt_id.in_(ids)):
+            answers.setdefault(attempt_id, []).append((question_id, answer_id, is_correct))
+        titles = dict(db.query(Quiz.id, Quiz.title).filter(
+            Quiz.id.in_({attempt.quiz_id for attempt in attempts})
+        ))
+
+        rows = [
+            {
+                "id": attempt.id,
+                "period": period_of(attempt),
+                "user_id": attempt.user_id,
+                "quiz_id": attempt.quiz_id,
+                "quiz_version_id": attempt.quiz_version_id,
+                "quiz_title": titles.get(attempt.quiz_id),
+                "score": attempt.score,
+                "passed": attempt.passed,
+                "started_at": attempt.started_at,
+                "completed_at": attempt.completed_at,
+                "expired_at": attempt.expired_at,
+                "payload": encode_payload(attempt, answers.get(attempt.id, []))
+            }
+            for attempt in attempts
+        ]
+        ensure_partitions(db, {row["period"] for row in rows})
+        db.execute(insert(ArchivedAttempt), rows)
+        db.execute(delete(UserAnswer).where(UserAnswer.attempt_id.in_(ids)))
+        db.execute(delete(UserQuizAttempt).where(UserQuizAttempt.id.in_(ids)))
+        db.commit()
+        db.expunge_all()
+        total += len(ids)
+        if len(ids) < batch_size:
+            break
+    return total
+
+def archived_passed_quiz_ids(db: Session, user_id: str, quiz_ids: Iterable[str], min_score: float) -> Set[str]:
+    """Quiz, parmi `quiz_ids`, que l'utilisateur a réussis dans une tentative archivée"""
+    quiz_ids = list(quiz_ids)
+    if not quiz_ids:
+        return set()
+    return {
+        row[0] for row in db.query(ArchivedAttempt.quiz_id).filter(
+            ArchivedAttempt.user_id == user_id,
+            ArchivedAttempt.quiz_id.in_(quiz_ids),
+            ArchivedAttempt.passed == True,
+            ArchivedAttempt.score >= min_score
+        ).distinct()
+    }
+
+def quiz_has_archived_attempts(db: Session, quiz_id: str) -> bool:
+    return db.query(exists().where(ArchivedAttempt.quiz_id == quiz_id)).scalar()
+
+def archive_references_question(db: Session, quiz_id: str, question_id: str) -> bool:
+    """Indique si une tentative archivée du quiz contient une réponse à la question"""
+    for (value,) in db.query(ArchivedAttempt.payload).filter(ArchivedAttempt.quiz_id == quiz_id).yield_per(500):
+        payload = decode_payload(value)
+        if question_id in (payload["selections"] or {}):
+            return True
+        if any(answer[0] == question_id for answer in payload["answers"]):
+            return True
+    return False
+
+def archived_history(db: Session, user_id: str) -> List[dict]:
+    """Tentatives archivées de l'utilisateur, au format de l'historique, les plus récentes d'abord"""
+    rows = db.query(
+        ArchivedAttempt.id, ArchivedAttempt.quiz_title, ArchivedAttempt.score,
+        ArchivedAttempt.passed, ArchivedAttempt.completed_at
+    ).filter(ArchivedAttempt.user_id == user_id).order_by(
+        ArchivedAttempt.period.desc(), ArchivedAttempt.completed_at.desc()
+    ).all()
+    return [
+        {
+            "id": row.id,
+            "quiz_title": row.quiz_title or "Unknown Quiz",
+            "score": row.score,
+            "passed": row.passed,
+            "completed_at": row.completed_at,
+            "archived": True
+        }
+        for row in rows
+    ]
+
+def load_archived(db: Session, user_id: str, attempt_id: str) -> Optional[Tuple[ArchivedAttempt, UserQuizAttempt, Dict[str, Set[str]]]]:
+    """
+    Tentative archivée de l'utilisateur : (ligne d'archive, tentative reconstituée hors
+    session, {question_id: ids des réponses enregistrées en lignes}), ou None.
+    """
+    row = db.query(ArchivedAttempt).filter(
+        ArchivedAttempt.id == attempt_id,
+        ArchivedAttempt.user_id == user_id
+    ).first()
+    if row is None:
+        return None
+    payload = decode_payload(row.payload)
+    attempt = UserQuizAttempt(
+        id=row.id,
+        user_id=row.user_id,
+        quiz_id=row.quiz_id,
+        quiz_version_id=row.quiz_version_id,
+        score=row.score,
+        passed=row.passed,
+        started_at=row.started_at,
+        completed_at=row.completed_at,
+        expired_at=row.expired_at,
+        selections=payload["selections"],
+        result=payload["result"],
+        question_ids=payload["question_ids"],
+        seed=payload["seed"]
+    )
+    selected: Dict[str, Set[str]] = {}
+    for question_id, answer_id, _ in payload["answers"]:
+        selected.setdefault(question_id, set()).add(answer_id)
+    return row, attempt, selected
+
+if __name__ == "__main__":
+    from app.db.session import SessionLocal
+
+    if len(sys.argv) < 2 or sys.argv[1] != "archive":
+        print("Usage: python -m app.services.attempt_archive archive")
+        sys.exit(1)
+
+    session = SessionLocal()
+    try:
+        count = archive_attempts(session)
+        print(f"{count} tentatives archivées")
+    finally:
+        session.close()
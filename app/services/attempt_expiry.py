@@ -0,0 +1,141 @@
+"""
+Expiration des tentatives abandonnées.
+
+Chaque tentative reçoit une échéance au démarrage (`expires_at`) : la limite de temps du
+quiz (`Quiz.time_limit_minutes`) ou, à défaut, `attempt_time_limit_minutes`. Passé ce
+délai, la tentative est expirée (`expired_at`) et sort de l'index des tentatives
+ouvertes, qui ne contient donc que les tentatives réellement en cours.
+
+L'expiration se fait :
+- en tâche de fond dans chaque worker (`AttemptSweeper`), par lots bornés verrouillés
+  avec SKIP LOCKED sous PostgreSQL pour que les workers se répartissent le travail ;
+- à la volée, quand une tentative échue est soumise (rejetée) ou retrouvée au démarrage.
+
+Passage ponctuel (cron) : `python -m app.services.attempt_expiry sweep`.
+"""
+import logging
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models import Quiz, UserQuizAttempt
+
+logger = logging.getLogger(__name__)
+
+def utcnow() -> datetime:
+    """Horodatage UTC naïf, comme `completed_at`"""
+    return datetime.utcnow()
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def expires_at_for(quiz: Quiz, started_at: datetime) -> datetime:
+    minutes = quiz.time_limit_minutes or settings.attempt_time_limit_minutes
+    return started_at + timedelta(minutes=minutes)
+
+def is_expired(attempt: UserQuizAttempt, now: Optional[datetime] = None) -> bool:
+    """Vrai si la tentative est expirée ou a dépassé son échéance sans avoir été soumise"""
+    if attempt.expired_at is not None:
+        return True
+    if attempt.completed_at is not None or attempt.expires_at is None:
+        return False
+    return _naive_utc(attempt.expires_at) <= (now or utcnow())
+
+def expire_attempt(db: Session, attempt_id: str, now: Optional[datetime] = None) -> bool:
+    """Expire une tentative encore ouverte (sans valider la transaction)"""
+    result = db.execute(
+        update(UserQuizAttempt).where(
+            UserQuizAttempt.id == attempt_id,
+            UserQuizAttempt.completed_at.is_(None),
+            UserQuizAttempt.expired_at.is_(None)
+        ).values(expired_at=now or utcnow()).execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+def sweep(db: Session, batch_size: Optional[int] = None, max_batches: Optional[int] = None,
+          now: Optional[datetime] = None) -> int:
+    """
+    Expire les tentatives ouvertes échues par lots de `batch_size`, une transaction par
+    lot, au plus `max_batches` lots par passage. Retourne le nombre de tentatives expirées.
+    """
+    batch_size = batch_size or settings.attempt_sweep_batch_size
+    max_batches = max_batches or settings.attempt_sweep_max_batches
+    now = now or utcnow()
+    total = 0
+    for _ in range(max_batches):
+        query = db.query(UserQuizAttempt.id).filter(
+            UserQuizAttempt.completed_at.is_(None),
+            UserQuizAttempt.expired_at.is_(None),
+            UserQuizAttempt.expires_at <= now
+        ).order_by(UserQuizAttempt.expires_at).limit(batch_size)
+        if db.bind.dialect.name == "postgresql":
+            query = query.with_for_update(skip_locked=True)
+        ids = [row.id for row in query]
+        if not ids:
+            break
+        db.execute(
+            update(UserQuizAttempt).where(UserQuizAttempt.id.in_(ids)).values(expired_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        total += len(ids)
+        if len(ids) < batch_size:
+            break
+    return total
+
+class AttemptSweeper(threading.Thread):
+    """Thread d'expiration périodique des tentatives, un par worker"""
+
+    def __init__(self, interval: float):
+        super().__init__(name="attempt-sweeper", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            db = SessionLocal()
+            try:
+                expired = sweep(db)
+                if expired:
+                    logger.info("%d tentatives abandonnées expirées", expired)
+            except Exception:
+                db.rollback()
+                logger.exception("Échec du passage d'expiration des tentatives")
+            finally:
+                db.close()
+
+_sweeper: Optional[AttemptSweeper] = None
+
+def start_sweeper():
+    global _sweeper
+    if not settings.attempt_sweeper_enabled or _sweeper is not None:
+        return
+    _sweeper = AttemptSweeper(settings.attempt_sweep_interval)
+    _sweeper.start()
+
+def stop_sweeper():
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.stop()
+        _sweeper = None
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "sweep":
+        print("Usage: python -m app.services.attempt_expiry sweep")
+        sys.exit(1)
+
+    session = SessionLocal()
+    try:
+        count = sweep(session, max_batches=sys.maxsize)
+        print(f"{count} tentatives expirées")
+    finally:
+        session.close()
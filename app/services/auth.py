@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
 from typing import Optional
-import uuid
+from app.db.ids import new_id
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status, Request
@@ -9,6 +9,7 @@ from app.core.config import settings
 from app.models import User, UserRole
 from app.schemas import UserCreate, TokenData
 from app.db.session import get_db
+from app.services.outbox import USER_REGISTERED, emit
 
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
@@ -24,13 +25,14 @@ def create_user(db: Session, user: UserCreate):
     """
     hashed_password = get_password_hash(user.password)
     db_user = User(
-        id=str(uuid.uuid4()),
+        id=new_id(),
         name=user.name,
         email=user.email,
         password=hashed_password,
         role=UserRole.user  # Par défaut, les nouveaux utilisateurs sont des users normaux
     )
     db.add(db_user)
+    emit(db, USER_REGISTERED, db_user.id, {"user_id": db_user.id, "name": db_user.name, "email": db_user.email})
     db.commit()
     db.refresh(db_user)
     return db_user
@@ -0,0 +1,300 @@
+"""
+Catalogue partagé entre les workers.
+
+Sous gunicorn, chaque worker garderait sa propre copie des catégories, des quiz publiés
+et des corrigés. Le catalogue est plutôt construit une fois dans un fichier projeté en
+mémoire (mmap) : tous les workers partagent les mêmes pages du cache du noyau.
+
+Format du fichier :
+- en-tête : signature, génération, taille de l'index ;
+- index JSON {clé: [position, longueur]} ;
+- enregistrements JSON compacts, décodés à chaque lecture de leur clé : aucun worker
+  n'en garde de copie (les versions anciennes, hors catalogue, restent en cache dans
+  app/services/quiz_versions.py).
+
+Clés : "categories", "category:<id>", "quizzes" (quiz publiés), "quiz:<id>" et
+"version:<id>" (contenu des versions courantes, corrigé compris).
+
+Un nouveau catalogue est écrit dans un fichier temporaire puis substitué avec
+`os.replace` (atomique) ; chaque worker détecte le changement de fichier à la lecture
+suivante et projette la nouvelle génération. Les reconstructions sont déclenchées par
+le bus d'invalidation (app/services/invalidation.py) : le processus d'origine
+reconstruit au commit, puis le premier worker de chaque autre serveur à recevoir
+l'événement ; les suivants trouvent un catalogue déjà à jour. Au démarrage, le
+catalogue est reconstruit s'il précède le lancement du processus : les modifications
+faites pendant que les serveurs étaient arrêtés n'ont déclenché aucun événement.
+
+Construction manuelle : `python -m app.services.catalog_store build`.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models import Category, Quiz, QuizStatus, QuizVersion
+from app.services.cache import TTLCache
+from app.services.invalidation import subscribe
+from app.services.singleflight import single_flight
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus (développement avec un seul worker)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"QZCATLG1"
+HEADER = struct.Struct("<8sQI")  # signature, génération (début de construction, ns), taille de l'index
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+def _category_record(category: Category) -> dict:
+    return {
+        "id": category.id,
+        "name": category.name,
+        "description": category.description,
+        "icon_url": category.icon_url,
+        "is_active": bool(category.is_active),
+        "created_at": _iso(category.created_at),
+        "updated_at": _iso(category.updated_at)
+    }
+
+def _quiz_record(quiz: Quiz) -> dict:
+    return {
+        "id": quiz.id,
+        "category_id": quiz.category_id,
+        "title": quiz.title,
+        "level": quiz.level.value if hasattr(quiz.level, "value") else quiz.level,
+        "status": QuizStatus.published.value,
+        "sample_size": quiz.sample_size,
+        "stratified": bool(quiz.stratified),
+        "time_limit_minutes": quiz.time_limit_minutes,
+        "current_version_id": quiz.current_version_id,
+        "created_at": _iso(quiz.created_at),
+        "updated_at": _iso(quiz.updated_at)
+    }
+
+def build_records(db: Session) -> Dict[str, Any]:
+    """Charge le catalogue depuis la base (trois requêtes)"""
+    categories = [_category_record(category) for category in db.query(Category).order_by(Category.name)]
+    quizzes = [
+        _quiz_record(quiz)
+        for quiz in db.query(Quiz).filter(Quiz.status == QuizStatus.published).order_by(Quiz.created_at)
+    ]
+    version_ids = [quiz["current_version_id"] for quiz in quizzes if quiz["current_version_id"]]
+    versions = db.query(QuizVersion.id, QuizVersion.content).filter(
+        QuizVersion.id.in_(version_ids)
+    ).all() if version_ids else []
+
+    records: Dict[str, Any] = {"categories": categories, "quizzes": quizzes}
+    records.update({f"category:{category['id']}": category for category in categories})
+    records.update({f"quiz:{quiz['id']}": quiz for quiz in quizzes})
+    records.update({f"version:{version_id}": content for version_id, content in versions})
+    return records
+
+def write_catalog(path: str, records: Dict[str, Any], generation: int) -> int:
+    """Écrit le catalogue dans un fichier temporaire puis le substitue atomiquement"""
+    payloads, index, offset = [], {}, 0
+    for key, value in records.items():
+        payload = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        index[key] = [offset, len(payload)]
+        payloads.append(payload)
+        offset += len(payload)
+    index_bytes = json.dumps(index, separators=(",", ":")).encode("utf-8")
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as handle:
+        handle.write(HEADER.pack(MAGIC, generation, len(index_bytes)))
+        handle.write(index_bytes)
+        for payload in payloads:
+            handle.write(payload)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(temporary, path)
+    return generation
+
+class CatalogStore:
+    """Lecteur du catalogue partagé, propre à chaque worker"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file_id = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._index: Dict[str, list] = {}
+        self._data_start = 0
+        self.generation = 0
+
+    def _open(self):
+        """Projette le fichier courant s'il a été remplacé depuis la dernière lecture"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._close()
+            return
+        file_id = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if file_id == self._file_id:
+            return
+
+        with open(self.path, "rb") as handle:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, generation, index_size = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC:
+            mapped.close()
+            raise ValueError(f"Fichier de catalogue invalide : {self.path}")
+        index = json.loads(mapped[HEADER.size:HEADER.size + index_size])
+
+        self._close()
+        self._mmap = mapped
+        self._index = index
+        self._data_start = HEADER.size + index_size
+        self.generation = generation
+        self._file_id = file_id
+
+    def _close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap = None
+        self._index = {}
+        self._file_id = None
+        self.generation = 0
+
+    def available(self) -> bool:
+        if not settings.catalog_store_enabled:
+            return False
+        with self._lock:
+            self._open()
+            return self._mmap is not None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Retourne l'enregistrement `key`, décodé depuis le fichier projeté, ou `default`"""
+        if not settings.catalog_store_enabled:
+            return default
+        with self._lock:
+            self._open()
+            entry = self._index.get(key)
+            if entry is None:
+                return default
+            start = self._data_start + entry[0]
+            raw = self._mmap[start:start + entry[1]]
+        return json.loads(raw)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._open()
+            return {
+                "path": self.path,
+                "generation": self.generation,
+                "keys": len(self._index),
+                "size": self._mmap.size() if self._mmap is not None else 0
+            }
+
+catalog = CatalogStore(settings.catalog_store_path)
+
+@contextmanager
+def _build_lock(path: str):
+    """
+    Sérialise les reconstructions entre workers : le dernier à obtenir le verrou lit
+    la base après toutes les modifications déjà validées, son catalogue est donc complet.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", "a") as handle:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+def file_generation(path: str) -> int:
+    """Génération du fichier de catalogue (0 s'il n'existe pas ou est illisible)"""
+    try:
+        with open(path, "rb") as handle:
+            magic, generation, _ = HEADER.unpack(handle.read(HEADER.size))
+    except (OSError, struct.error):
+        return 0
+    return generation if magic == MAGIC else 0
+
+def rebuild_catalog(db: Session, stale_before: Optional[int] = None) -> Optional[int]:
+    """
+    Reconstruit le catalogue partagé, hors de toute transaction en cours. Avec
+    `stale_before` (horodatage en ns), ne reconstruit que si le catalogue courant a été
+    commencé avant. Un échec n'interrompt pas l'appelant : le fichier est supprimé et
+    les lecteurs retombent sur la base.
+    """
+    if not settings.catalog_store_enabled:
+        return None
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(catalog.path)), exist_ok=True)
+        with _build_lock(catalog.path):
+            if stale_before is not None and file_generation(catalog.path) > stale_before:
+                return None
+            generation = time.time_ns()
+            return write_catalog(catalog.path, build_records(db), generation)
+    except Exception:
+        logger.exception("Échec de la reconstruction du catalogue partagé")
+        try:
+            os.remove(catalog.path)
+        except OSError:
+            pass
+        return None
+
+# Catégories lues en base lorsque le catalogue partagé est indisponible
+category_listing = TTLCache(maxsize=1, ttl=60)
+category_flight = single_flight("categories")
+
+def list_categories(db: Session) -> List[dict]:
+    """Toutes les catégories : catalogue partagé, sinon une seule lecture pour les appels concurrents"""
+    records = catalog.get("categories")
+    if records is not None:
+        return records
+    return category_flight.get_or_load(
+        category_listing, "all",
+        lambda: [_category_record(category) for category in db.query(Category).order_by(Category.name)]
+    )
+
+def _on_catalog_change(events):
+    """Abonné du bus d'invalidation : reconstruit le catalogue s'il précède l'événement"""
+    received_at = time.time_ns()
+    if any(item.entity in ("category", "resync") for item in events):
+        category_listing.clear()
+    db = SessionLocal()
+    try:
+        rebuild_catalog(db, stale_before=received_at)
+    finally:
+        db.close()
+
+subscribe(("category", "quiz"), _on_catalog_change)
+
+# Lancement du processus : un catalogue commencé avant peut ignorer des modifications
+_started_at = time.time_ns()
+
+def ensure_catalog(db: Session):
+    """
+    Reconstruit au démarrage un catalogue absent ou antérieur au lancement du processus ;
+    les workers lancés ensemble le reconstruisent une seule fois (voir `rebuild_catalog`)
+    """
+    if settings.catalog_store_enabled:
+        rebuild_catalog(db, stale_before=_started_at)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("Usage: python -m app.services.catalog_store build")
+        sys.exit(1)
+
+    session = SessionLocal()
+    try:
+        generation = rebuild_catalog(session)
+        print(f"Catalogue écrit dans {catalog.path} (génération {generation})")
+    finally:
+        session.close()
@@ -0,0 +1,292 @@
+"""
+Correction vectorisée d'un lot de soumissions pour un même quiz.
+
+Le corrigé est chargé une seule fois puis encodé en vecteur booléen sur l'ensemble des
+réponses du quiz ; chaque soumission devient une ligne d'une matrice de sélection.
+Une question est juste quand sa tranche de colonnes est identique au corrigé.
+Chaque question dispose d'une colonne sentinelle, vraie quand la soumission contient
+un id de réponse qui n'appartient pas à la question (la question est alors fausse).
+Un quiz publié est corrigé sur le contenu de sa version courante ; le corrigé d'une
+version est immuable, il est donc construit une seule fois par processus.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.db.ids import new_id
+from app.models import Quiz, UserQuizAttempt, UserAnswer, UserProgress
+from app.services.answer_storage import encode_answers, live_answer_rows
+from app.services.cache import TTLCache
+from app.services.item_analysis import AnswerStatsCollector
+from app.services.outbox import ATTEMPT_COMPLETED, PROGRESS_UPDATED, emit_many, progress_event
+from app.services.quiz_versions import get_version_content, live_questions
+from app.services.singleflight import single_flight
+from app.services.user_stats import StatsDelta, apply_deltas, recent_entry
+
+LEVEL_ORDER = {"debutant": 1, "intermediaire": 2, "avance": 3}
+
+# Seuil de réussite à 80% (selon cahier des charges)
+PASS_THRESHOLD = 80
+
+# Corrigés des versions, indexés par id de version (immuables)
+answer_keys = TTLCache(maxsize=512, ttl=None)
+answer_key_flight = single_flight("answer_keys")
+
+@dataclass
+class AnswerKey:
+    """Corrigé d'un quiz encodé pour la correction vectorisée"""
+    questions: List[dict]  # questions au format des instantanés
+    question_index: Dict[str, int]
+    column_of: Dict[str, int]  # answer_id -> colonne
+    sentinel_of: List[int]  # question -> colonne sentinelle
+    starts: np.ndarray  # première colonne de chaque question
+    key: np.ndarray  # vecteur booléen des bonnes réponses
+    answer_orders: Dict[str, Dict[str, int]]
+    correct_ids: Dict[str, List[str]]
+    version_id: Optional[str] = None
+
+def build_answer_key(questions: List[dict], version_id: Optional[str] = None) -> AnswerKey:
+    """Construit le corrigé de questions au format des instantanés"""
+    column_of, sentinel_of, starts, key = {}, [], [], []
+    answer_orders, correct_ids = {}, {}
+    for question in questions:
+        starts.append(len(key))
+        answer_orders[question["id"]] = {}
+        correct_ids[question["id"]] = []
+        for answer in question["answers"]:
+            column_of[answer["id"]] = len(key)
+            key.append(answer["is_correct"])
+            answer_orders[question["id"]][answer["id"]] = answer["order"]
+            if answer["is_correct"]:
+                correct_ids[question["id"]].append(answer["id"])
+        sentinel_of.append(len(key))
+        key.append(False)
+
+    return AnswerKey(
+        questions=questions,
+        question_index={question["id"]: index for index, question in enumerate(questions)},
+        column_of=column_of,
+        sentinel_of=sentinel_of,
+        starts=np.array(starts, dtype=np.intp),
+        key=np.array(key, dtype=bool),
+        answer_orders=answer_orders,
+        correct_ids=correct_ids,
+        version_id=version_id
+    )
+
+def version_answer_key(db: Session, version_id: str) -> Optional[AnswerKey]:
+    """Corrigé d'une version, construit une seule fois même sous charge concurrente"""
+    def load():
+        content = get_version_content(db, version_id)
+        return build_answer_key(content["questions"], version_id) if content is not None else None
+    return answer_key_flight.get_or_load(answer_keys, version_id, load)
+
+def load_answer_key(db: Session, quiz: Quiz) -> AnswerKey:
+    """Corrigé de la version courante du quiz, ou de son contenu courant s'il n'a pas de version"""
+    if quiz.current_version_id:
+        answer_key = version_answer_key(db, quiz.current_version_id)
+        if answer_key is not None:
+            return answer_key
+    return build_answer_key(live_questions(db, quiz.id))
+
+def grade_matrix(answer_key: AnswerKey, submissions: List[List[dict]]) -> np.ndarray:
+    """
+    Corrige un lot de soumissions ({question_id, answer_ids} par question répondue).
+    Retourne une matrice booléenne (soumissions x questions) des questions justes.
+    """
+    n_submissions, n_questions = len(submissions), len(answer_key.questions)
+    selected = np.zeros((n_submissions, len(answer_key.key)), dtype=bool)
+    answered = np.zeros((n_submissions, n_questions), dtype=bool)
+
+    for row, answers in enumerate(submissions):
+        for answer_submit in answers:
+            question_index = answer_key.question_index.get(answer_submit["question_id"])
+            if question_index is None:
+                continue
+            answered[row, question_index] = True
+            question_id = answer_submit["question_id"]
+            for answer_id in answer_submit["answer_ids"]:
+                if answer_id in answer_key.answer_orders[question_id]:
+                    selected[row, answer_key.column_of[answer_id]] = True
+                else:
+                    selected[row, answer_key.sentinel_of[question_index]] = True
+
+    if n_questions == 0:
+        return answered
+    mismatch = selected != answer_key.key
+    wrong = np.logical_or.reduceat(mismatch, answer_key.starts, axis=1)
+    return answered & ~wrong
+
+def grade_and_store_batch(db: Session, quiz: Quiz, submissions: List[dict]) -> dict:
+    """
+    Corrige et enregistre un lot de soumissions ({user_id, answers, completed_at}).
+    Les tentatives et réponses sont insérées en masse ; retourne les résultats par
+    élève et les statistiques du lot.
+    """
+    answer_key = load_answer_key(db, quiz)
+    answers_per_submission = [
+        [{"question_id": answer.question_id, "answer_ids": answer.answer_ids} for answer in submission["answers"]]
+        for submission in submissions
+    ]
+    correct = grade_matrix(answer_key, answers_per_submission)
+
+    total_questions = len(answer_key.questions)
+    correct_counts = correct.sum(axis=1)
+    scores = correct_counts * 100.0 / total_questions if total_questions else np.zeros(len(submissions))
+    passed = scores >= PASS_THRESHOLD
+
+    now = datetime.utcnow()
+    attempt_rows, answer_rows, results = [], [], []
+    stats = AnswerStatsCollector()
+    for row, submission in enumerate(submissions):
+        attempt_id = new_id()
+        graded, details = [], []
+        for answer_submit in answers_per_submission[row]:
+            question_index = answer_key.question_index.get(answer_submit["question_id"])
+            if question_index is None:
+                continue
+            question = answer_key.questions[question_index]
+            is_correct = bool(correct[row, question_index])
+            graded.append({
+                "question_id": question["id"],
+                "answer_ids": answer_submit["answer_ids"],
+                "is_correct": is_correct,
+                "answer_orders": answer_key.answer_orders[question["id"]]
+            })
+            details.append({
+                "question_id": question["id"],
+                "question_text": question["question_text"],
+                "user_answers": answer_submit["answer_ids"],
+                "correct_answers": answer_key.correct_ids[question["id"]],
+                "is_correct": is_correct
+            })
+
+        result = {
+            "score": float(scores[row]),
+            "passed": bool(passed[row]),
+            "correct_answers": int(correct_counts[row]),
+            "total_questions": total_questions,
+            "details": details
+        }
+        selections, rows = encode_answers(attempt_id, graded)
+        stats.add(answer_key.question_index, graded)
+        attempt_rows.append({
+            "id": attempt_id,
+            "user_id": submission["user_id"],
+            "quiz_id": quiz.id,
+            "quiz_version_id": answer_key.version_id,
+            "score": result["score"],
+            "passed": result["passed"],
+            "completed_at": submission.get("completed_at") or now,
+            "selections": selections,
+            "result": result
+        })
+        answer_rows.extend(rows)
+        results.append({
+            "user_id": submission["user_id"],
+            "attempt_id": attempt_id,
+            "score": result["score"],
+            "passed": result["passed"],
+            "correct_answers": result["correct_answers"],
+            "total_questions": total_questions
+        })
+
+    if attempt_rows:
+        db.execute(insert(UserQuizAttempt), attempt_rows)
+    answer_rows = live_answer_rows(db, answer_rows)
+    if answer_rows:
+        db.execute(insert(UserAnswer), answer_rows)
+    stats.flush(db)
+    new_categories = update_progress_bulk(db, quiz, {
+        submission["user_id"] for submission, has_passed in zip(submissions, passed) if has_passed
+    })
+
+    # Synthèse du tableau de bord des élèves corrigés
+    deltas = {}
+    for attempt in attempt_rows:
+        delta = deltas.setdefault(attempt["user_id"], StatsDelta())
+        delta.started += 1
+        delta.completed.append(recent_entry(
+            attempt["id"], quiz.title, attempt["score"], attempt["passed"], attempt["completed_at"]
+        ))
+    for user_id in new_categories:
+        deltas[user_id].categories_mastered += 1
+    apply_deltas(db, deltas)
+
+    # Événements publiés aux systèmes en aval, validés avec les tentatives
+    emit_many(db, ATTEMPT_COMPLETED, [
+        {
+            "aggregate_id": attempt["user_id"],
+            "payload": {
+                "attempt_id": attempt["id"],
+                "user_id": attempt["user_id"],
+                "quiz_id": attempt["quiz_id"],
+                "quiz_version_id": attempt["quiz_version_id"],
+                "quiz_title": quiz.title,
+                "score": attempt["score"],
+                "passed": attempt["passed"],
+                "correct_answers": attempt["result"]["correct_answers"],
+                "total_questions": total_questions,
+                "completed_at": attempt["completed_at"]
+            }
+        }
+        for attempt in attempt_rows
+    ])
+    db.commit()
+
+    return {"results": results, "summary": summarize(answer_key, scores, passed, correct)}
+
+def update_progress_bulk(db: Session, quiz: Quiz, user_ids: set) -> set:
+    """
+    Met à jour le progrès des élèves ayant réussi le quiz, en une lecture et un insert groupé.
+    Retourne les élèves qui maîtrisent une nouvelle catégorie.
+    """
+    if not user_ids:
+        return set()
+    existing = {
+        progress.user_id: progress
+        for progress in db.query(UserProgress).filter(
+            UserProgress.category_id == quiz.category_id,
+            UserProgress.user_id.in_(list(user_ids))
+        )
+    }
+    quiz_level_order = LEVEL_ORDER.get(quiz.level, 0)
+    new_rows, events = [], []
+    for user_id in user_ids:
+        progress = existing.get(user_id)
+        if progress is None:
+            new_rows.append({
+                "id": new_id(),
+                "user_id": user_id,
+                "category_id": quiz.category_id,
+                "current_level": quiz.level
+            })
+            events.append({"aggregate_id": user_id, "payload": progress_event(user_id, quiz, True)})
+        elif quiz_level_order > LEVEL_ORDER.get(progress.current_level, 0):
+            progress.current_level = quiz.level
+            progress.updated_at = datetime.utcnow()
+            events.append({"aggregate_id": user_id, "payload": progress_event(user_id, quiz, False)})
+    if new_rows:
+        db.execute(insert(UserProgress), new_rows)
+    emit_many(db, PROGRESS_UPDATED, events)
+    return {row["user_id"] for row in new_rows}
+
+def summarize(answer_key: AnswerKey, scores: np.ndarray, passed: np.ndarray, correct: np.ndarray) -> dict:
+    """Statistiques globales d'un lot corrigé"""
+    if len(scores) == 0:
+        return {"count": 0}
+    return {
+        "count": int(len(scores)),
+        "average_score": round(float(scores.mean()), 2),
+        "median_score": round(float(np.median(scores)), 2),
+        "std_score": round(float(scores.std()), 2),
+        "min_score": round(float(scores.min()), 2),
+        "max_score": round(float(scores.max()), 2),
+        "pass_rate": round(float(passed.mean()) * 100, 2),
+        "question_success_rates": [
+            {"question_id": question["id"], "success_rate": round(float(rate) * 100, 2)}
+            for question, rate in zip(answer_key.questions, correct.mean(axis=0))
+        ]
+    }
@@ -0,0 +1,180 @@
+"""
+Bus d'invalidation des caches entre processus et serveurs, sans broker externe.
+
+Les routes qui modifient le contenu (catégories, quiz, questions et leurs réponses)
+publient un événement typé avec `notify_change` avant de valider la transaction :
+- sous PostgreSQL, l'événement part avec `pg_notify` dans la transaction, donc n'est
+  délivré qu'au commit (et jamais en cas de rollback) ;
+- dans tous les cas, les événements d'une transaction validée sont aussi distribués
+  immédiatement dans le processus d'origine, ce qui garantit la lecture de ses
+  propres écritures.
+
+Chaque worker PostgreSQL fait tourner un thread d'écoute (`LISTEN`) qui distribue les
+événements des autres processus aux abonnés (`subscribe`), chargés d'évincer leurs
+entrées de cache. Après une reconnexion, des notifications ont pu être perdues :
+un événement "resync" est distribué pour tout invalider.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from dataclasses import dataclass, asdict
+from typing import Callable, Iterable, List, Optional
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "quiz_cache_invalidation"
+
+ENTITIES = ("category", "quiz", "question")
+ACTIONS = ("created", "updated", "deleted")
+
+# Identifiant du processus (calculé à l'appel : les workers gunicorn sont forkés après l'import)
+_INSTANCE = uuid.uuid4().hex[:8]
+
+def origin() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{_INSTANCE}"
+
+@dataclass
+class InvalidationEvent:
+    entity: str  # "category", "quiz", "question" ou "resync"
+    entity_id: Optional[str]
+    action: str
+    quiz_id: Optional[str] = None  # quiz concerné par une modification de question
+    origin: Optional[str] = None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, payload: str) -> "InvalidationEvent":
+        return cls(**json.loads(payload))
+
+Handler = Callable[[List[InvalidationEvent]], None]
+
+_subscribers: List[tuple] = []
+
+def subscribe(entities: Iterable[str], handler: Handler):
+    """
+    Abonne `handler` aux événements des entités données. Le handler reçoit les événements
+    par lot et doit être thread-safe (il peut être appelé depuis le thread d'écoute).
+    Il reçoit aussi les événements "resync", après lesquels tout doit être invalidé.
+    """
+    _subscribers.append((set(entities), handler))
+
+def dispatch(events: List[InvalidationEvent]):
+    """Distribue un lot d'événements aux abonnés concernés ; une erreur d'abonné est journalisée"""
+    for entities, handler in _subscribers:
+        matching = [item for item in events if item.entity == "resync" or item.entity in entities]
+        if not matching:
+            continue
+        try:
+            handler(matching)
+        except Exception:
+            logger.exception("Échec d'un abonné au bus d'invalidation")
+
+def notify_change(db: Session, entity: str, entity_id: str, action: str, quiz_id: Optional[str] = None):
+    """Publie un événement d'invalidation dans la transaction courante de `db`"""
+    if entity not in ENTITIES or action not in ACTIONS:
+        raise ValueError(f"Événement d'invalidation inconnu : {entity}/{action}")
+    item = InvalidationEvent(entity=entity, entity_id=entity_id, action=action, quiz_id=quiz_id, origin=origin())
+    # Ouvre la transaction si besoin : un rollback survenant avant toute écriture doit
+    # aussi écarter l'événement
+    db.connection()
+    db.info.setdefault("pending_invalidations", []).append(item)
+    if db.bind.dialect.name == "postgresql":
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": item.to_json()})
+
+@event.listens_for(SessionLocal, "after_commit")
+def _dispatch_committed(session: Session):
+    events = session.info.pop("pending_invalidations", None)
+    if events:
+        dispatch(events)
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_rolled_back(session: Session, previous_transaction):
+    # L'annulation d'un savepoint laisse la transaction englobante valide
+    if not previous_transaction.nested:
+        session.info.pop("pending_invalidations", None)
+
+class InvalidationListener(threading.Thread):
+    """Thread d'écoute du canal PostgreSQL, un par worker"""
+
+    # Délai de regroupement des notifications d'une même transaction
+    BATCH_WINDOW = 0.05
+
+    def __init__(self, database_url: str):
+        super().__init__(name="invalidation-listener", daemon=True)
+        url = make_url(database_url).set(drivername="postgresql")
+        self.dsn = url.render_as_string(hide_password=False)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        import psycopg
+
+        connected_once = False
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            try:
+                with psycopg.connect(self.dsn, autocommit=True) as connection:
+                    connection.execute(f"LISTEN {CHANNEL}")
+                    if connected_once:
+                        # Des notifications ont pu être perdues pendant la déconnexion
+                        dispatch([InvalidationEvent(entity="resync", entity_id=None, action="updated")])
+                    connected_once = True
+                    backoff = 1.0
+                    self._listen(connection)
+            except Exception:
+                logger.exception("Connexion d'écoute des invalidations perdue, reconnexion dans %.0f s", backoff)
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    def _listen(self, connection):
+        own_origin = origin()
+        while not self._stop_event.is_set():
+            batch = []
+            for notification in connection.notifies(timeout=1.0, stop_after=1):
+                batch.append(notification)
+            if not batch:
+                continue
+            # Regrouper les notifications arrivées avec la première
+            batch.extend(connection.notifies(timeout=self.BATCH_WINDOW))
+            events = []
+            for notification in batch:
+                try:
+                    item = InvalidationEvent.from_json(notification.payload)
+                except (ValueError, TypeError):
+                    logger.warning("Notification d'invalidation illisible : %r", notification.payload)
+                    continue
+                # Les événements du processus courant ont déjà été distribués au commit
+                if item.origin != own_origin:
+                    events.append(item)
+            if events:
+                dispatch(events)
+
+_listener: Optional[InvalidationListener] = None
+
+def start_listener():
+    """Démarre le thread d'écoute du worker (PostgreSQL uniquement)"""
+    global _listener
+    if not settings.invalidation_listener_enabled or _listener is not None:
+        return
+    if make_url(settings.database_url).get_backend_name() != "postgresql":
+        return
+    _listener = InvalidationListener(settings.database_url)
+    _listener.start()
+
+def stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
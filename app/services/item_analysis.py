@@ -0,0 +1,233 @@
+"""
+Analyse d'items : statistiques par question et par réponse.
+
+Les compteurs (affichages, réponses justes, choix de chaque réponse) sont incrémentés
+à chaque soumission. Le job nocturne calcule ensuite, par quiz :
+- la difficulté p = réponses justes / affichages ;
+- la discrimination D = p(groupe fort) - p(groupe faible), les groupes étant les 27 %
+  de tentatives aux meilleurs et aux moins bons scores parmi celles qui ont servi la
+  question (un quiz échantillonné ne sert qu'une partie de sa banque).
+
+Lancement du job : `python -m app.services.item_analysis`.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from sqlalchemy.orm import Session
+from app.db.upsert import increment_counters
+from app.models import Quiz, Question, Answer, UserQuizAttempt, UserAnswer, QuestionStats, AnswerStats
+
+# Part des tentatives dans chacun des groupes fort et faible (convention de Kelley)
+GROUP_FRACTION = 0.27
+
+# Nombre maximal de tentatives récentes prises en compte par quiz
+MAX_ATTEMPTS = 5000
+
+# Seuils de signalement
+TOO_EASY = 0.9
+TOO_HARD = 0.2
+LOW_DISCRIMINATION = 0.1
+
+class AnswerStatsCollector:
+    """Accumule les compteurs d'une ou plusieurs soumissions puis les écrit en deux upserts"""
+
+    def __init__(self):
+        self.shown = Counter()
+        self.correct = Counter()
+        self.picked = Counter()
+        self.answer_question: Dict[str, str] = {}
+
+    def add(self, shown_question_ids: Iterable[str], graded: List[dict]):
+        """`graded` suit le format de app.services.answer_storage.encode_answers"""
+        for question_id in shown_question_ids:
+            self.shown[question_id] += 1
+        for item in graded:
+            if item["is_correct"]:
+                self.correct[item["question_id"]] += 1
+            for answer_id in set(item["answer_ids"]):
+                if answer_id in item["answer_orders"]:
+                    self.picked[answer_id] += 1
+                    self.answer_question[answer_id] = item["question_id"]
+
+    def flush(self, db: Session):
+        # Une version figée peut référencer des questions ou réponses supprimées depuis
+        live_questions = {
+            row[0] for row in db.query(Question.id).filter(Question.id.in_(list(self.shown)))
+        } if self.shown else set()
+        live_answers = {
+            row[0] for row in db.query(Answer.id).filter(Answer.id.in_(list(self.picked)))
+        } if self.picked else set()
+        increment_counters(db, QuestionStats, [
+            {"question_id": question_id, "times_shown": count, "times_correct": self.correct[question_id]}
+            for question_id, count in self.shown.items() if question_id in live_questions
+        ], index_elements=["question_id"], counters=["times_shown", "times_correct"])
+        increment_counters(db, AnswerStats, [
+            {"answer_id": answer_id, "question_id": self.answer_question[answer_id], "times_picked": count}
+            for answer_id, count in self.picked.items() if answer_id in live_answers
+        ], index_elements=["answer_id"], counters=["times_picked"])
+
+def record_submission(db: Session, shown_question_ids: Iterable[str], graded: List[dict]):
+    """Incrémente les compteurs pour une soumission (dans la transaction de l'appelant)"""
+    collector = AnswerStatsCollector()
+    collector.add(shown_question_ids, graded)
+    collector.flush(db)
+
+def correctness_matrix(db: Session, quiz_id: str, question_ids: List[str]) -> tuple:
+    """
+    Charge les tentatives terminées récentes du quiz et retourne (scores, matrice
+    booléenne tentatives x questions des réponses justes, matrice des questions servies).
+    Une tentative sans tirage (question_ids nul) a reçu toutes les questions du quiz.
+    """
+    attempts = db.query(
+        UserQuizAttempt.id, UserQuizAttempt.score, UserQuizAttempt.selections, UserQuizAttempt.question_ids
+    ).filter(
+        UserQuizAttempt.quiz_id == quiz_id,
+        UserQuizAttempt.completed_at != None
+    ).order_by(UserQuizAttempt.completed_at.desc()).limit(MAX_ATTEMPTS).all()
+
+    column = {question_id: index for index, question_id in enumerate(question_ids)}
+    correct = np.zeros((len(attempts), len(question_ids)), dtype=bool)
+    served = np.ones((len(attempts), len(question_ids)), dtype=bool)
+    row_of_rows_attempt = {}
+    for row, attempt in enumerate(attempts):
+        if attempt.question_ids is not None:
+            served[row] = False
+            for question_id in attempt.question_ids:
+                if question_id in column:
+                    served[row, column[question_id]] = True
+        if attempt.selections is None:
+            row_of_rows_attempt[attempt.id] = row
+            continue
+        for question_id, (_, is_correct) in attempt.selections.items():
+            if question_id in column:
+                correct[row, column[question_id]] = bool(is_correct)
+
+    # Tentatives stockées au format lignes
+    if row_of_rows_attempt:
+        for attempt_id, question_id in db.query(UserAnswer.attempt_id, UserAnswer.question_id).filter(
+            UserAnswer.attempt_id.in_(list(row_of_rows_attempt)),
+            UserAnswer.is_correct == True
+        ).distinct():
+            if question_id in column:
+                correct[row_of_rows_attempt[attempt_id], column[question_id]] = True
+
+    scores = np.array([attempt.score or 0 for attempt in attempts], dtype=float)
+    return scores, correct, served
+
+def discrimination_indices(scores: np.ndarray, correct: np.ndarray, served: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Indice de discrimination par question, calculé sur les seules tentatives qui l'ont
+    servie (NaN si elles sont trop peu nombreuses)
+    """
+    if served is None:
+        served = np.ones(correct.shape, dtype=bool)
+    ranking = np.argsort(scores, kind="stable")
+    indices = np.full(correct.shape[1], np.nan)
+    for index in range(correct.shape[1]):
+        rows = ranking[served[ranking, index]]
+        group_size = int(len(rows) * GROUP_FRACTION)
+        if group_size == 0:
+            continue
+        indices[index] = correct[rows[-group_size:], index].mean() - correct[rows[:group_size], index].mean()
+    return indices
+
+def compute_quiz_analysis(db: Session, quiz_id: str) -> int:
+    """Recalcule difficulté et discrimination des questions d'un quiz ; retourne le nombre de questions"""
+    question_ids = [row[0] for row in db.query(Question.id).filter(Question.quiz_id == quiz_id)]
+    if not question_ids:
+        return 0
+
+    scores, correct, served = correctness_matrix(db, quiz_id, question_ids)
+    discrimination = discrimination_indices(scores, correct, served)
+    stats = {
+        row.question_id: row
+        for row in db.query(QuestionStats).filter(QuestionStats.question_id.in_(question_ids))
+    }
+
+    now = datetime.utcnow()
+    for index, question_id in enumerate(question_ids):
+        row = stats.get(question_id)
+        if row is None:
+            continue
+        # times_shown ne compte que les tentatives qui ont servi la question
+        row.difficulty = row.times_correct / row.times_shown if row.times_shown else None
+        row.discrimination = None if np.isnan(discrimination[index]) else round(float(discrimination[index]), 4)
+        row.computed_at = now
+    db.commit()
+    return len(question_ids)
+
+def compute_all(db: Session) -> int:
+    """Job nocturne : recalcule l'analyse de tous les quiz"""
+    total = 0
+    for (quiz_id,) in db.query(Quiz.id).all():
+        total += compute_quiz_analysis(db, quiz_id)
+    return total
+
+def quiz_item_analysis(db: Session, quiz_id: str) -> List[dict]:
+    """Lit l'analyse précalculée d'un quiz (trois requêtes, sans parcourir les réponses utilisateur)"""
+    rows = db.query(Question, QuestionStats).outerjoin(
+        QuestionStats, QuestionStats.question_id == Question.id
+    ).filter(Question.quiz_id == quiz_id).order_by(Question.order).all()
+
+    question_ids = [question.id for question, _ in rows]
+    answers_by_question: Dict[str, list] = {}
+    for answer in db.query(Answer).filter(Answer.question_id.in_(question_ids)).order_by(Answer.order):
+        answers_by_question.setdefault(answer.question_id, []).append(answer)
+    picks = {
+        answer_id: times_picked
+        for answer_id, times_picked in db.query(AnswerStats.answer_id, AnswerStats.times_picked).filter(
+            AnswerStats.question_id.in_(question_ids)
+        )
+    }
+
+    result = []
+    for question, stats in rows:
+        times_shown = stats.times_shown if stats else 0
+        answers = [
+            {
+                "id": answer.id,
+                "answer_text": answer.answer_text,
+                "is_correct": answer.is_correct,
+                "times_picked": picks.get(answer.id, 0),
+                "pick_rate": round(picks.get(answer.id, 0) / times_shown, 4) if times_shown else None
+            }
+            for answer in answers_by_question.get(question.id, [])
+        ]
+        difficulty = stats.difficulty if stats else None
+        discrimination = stats.discrimination if stats else None
+
+        flags = []
+        if difficulty is not None and difficulty >= TOO_EASY:
+            flags.append("too_easy")
+        if difficulty is not None and difficulty <= TOO_HARD:
+            flags.append("too_hard")
+        if discrimination is not None and discrimination < LOW_DISCRIMINATION:
+            flags.append("low_discrimination")
+        best_correct = max((a["times_picked"] for a in answers if a["is_correct"]), default=0)
+        if any(not a["is_correct"] and a["times_picked"] > best_correct for a in answers):
+            flags.append("misleading_distractor")
+
+        result.append({
+            "question_id": question.id,
+            "question_text": question.question_text,
+            "order": question.order,
+            "times_shown": times_shown,
+            "times_correct": stats.times_correct if stats else 0,
+            "difficulty": difficulty,
+            "discrimination": discrimination,
+            "computed_at": stats.computed_at if stats else None,
+            "flags": flags,
+            "answers": answers
+        })
+    return result
+
+if __name__ == "__main__":
+    from app.db.session import SessionLocal
+
+    session = SessionLocal()
+    try:
+        count = compute_all(session)
+        print(f"Analyse d'items recalculée pour {count} questions")
+    finally:
+        session.close()
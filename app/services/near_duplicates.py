@@ -0,0 +1,209 @@
+"""
+Détection des questions quasi identiques (MinHash + LSH).
+
+Chaque énoncé est normalisé (minuscules, accents et ponctuation retirés) puis découpé
+en 5-grammes de caractères. Sa signature MinHash (`NUM_PERM` minima de fonctions de
+hachage universelles) estime la similarité de Jaccard entre deux énoncés : c'est la
+proportion de positions égales entre leurs signatures.
+
+Pour éviter la comparaison avec toute la banque, la signature est découpée en `BANDS`
+bandes de `ROWS` valeurs ; chaque bande donne un seau (`question_lsh_buckets`, indexé).
+Deux questions ne sont comparées que si elles partagent au moins un seau, ce qui arrive
+presque toujours au-delà d'une similarité de (1/BANDS)^(1/ROWS) ≈ 0,71 et rarement
+en dessous. Les candidats sont ensuite vérifiés sur leur signature complète.
+
+Signatures et seaux sont mis à jour dans la transaction qui crée ou modifie une question
+(`index_question`). Remplissage initial : `python -m app.services.near_duplicates reindex`.
+"""
+import hashlib
+import re
+import sys
+import unicodedata
+import zlib
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.upsert import dialect_insert
+from app.models import Question, QuestionLshBucket, QuestionSignature
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+# Graine fixe : les signatures stockées doivent rester comparables entre processus et versions
+_generator = np.random.RandomState(20240601)
+_PERM_A = _generator.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _generator.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+def normalize(text: Optional[str]) -> str:
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(re.findall(r"[^\W_]+", stripped.lower()))
+
+def shingles(text: Optional[str]) -> np.ndarray:
+    """Hachages 32 bits des 5-grammes de caractères de l'énoncé normalisé"""
+    value = normalize(text)
+    if not value:
+        return np.empty(0, dtype=np.uint64)
+    grams = {value[i:i + SHINGLE_SIZE] for i in range(max(1, len(value) - SHINGLE_SIZE + 1))}
+    return np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64, count=len(grams))
+
+def signature(text: Optional[str]) -> Optional[np.ndarray]:
+    """Signature MinHash de l'énoncé, ou None s'il est vide"""
+    hashed = shingles(text)
+    if not hashed.size:
+        return None
+    # (a·x + b) mod p pour chaque permutation ; le débordement 64 bits est sans effet sur la qualité
+    with np.errstate(over="ignore"):
+        values = (np.outer(hashed, _PERM_A) + _PERM_B) % _MERSENNE_PRIME
+    return (values.min(axis=0) & _MAX_HASH).astype(np.uint32)
+
+def buckets(sig: np.ndarray) -> List[int]:
+    """Seau de chaque bande (entier 64 bits signé, pour une colonne BIGINT)"""
+    result = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(
+            bytes([band]) + sig[band * ROWS:(band + 1) * ROWS].astype("<u4").tobytes(), digest_size=8
+        ).digest()
+        result.append(int.from_bytes(digest, "little", signed=True))
+    return result
+
+def similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Similarité de Jaccard estimée entre deux signatures"""
+    return float(np.count_nonzero(first == second)) / NUM_PERM
+
+def _decode(value: bytes) -> np.ndarray:
+    return np.frombuffer(value, dtype="<u4")
+
+def index_question(db: Session, question_id: str, question_text: str):
+    """Met à jour la signature et les seaux d'une question, dans la transaction courante"""
+    db.flush()
+    db.query(QuestionLshBucket).filter(QuestionLshBucket.question_id == question_id).delete(synchronize_session=False)
+    sig = signature(question_text)
+    if sig is None:
+        db.query(QuestionSignature).filter(QuestionSignature.question_id == question_id).delete(synchronize_session=False)
+        return
+    encoded = sig.astype("<u4").tobytes()
+    statement = dialect_insert(db, QuestionSignature).values(question_id=question_id, signature=encoded)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["question_id"], set_={"signature": encoded, "updated_at": func.now()}
+    ))
+    db.execute(insert(QuestionLshBucket), [
+        {"bucket": bucket, "question_id": question_id} for bucket in set(buckets(sig))
+    ])
+
+def find_similar(db: Session, sig: np.ndarray, threshold: Optional[float] = None,
+                 exclude_id: Optional[str] = None, limit: int = 20) -> List[dict]:
+    """Questions de la banque dont la similarité estimée atteint `threshold`, les plus proches d'abord"""
+    threshold = settings.duplicate_similarity_threshold if threshold is None else threshold
+    candidates = select(QuestionLshBucket.question_id).where(QuestionLshBucket.bucket.in_(buckets(sig)))
+    rows = db.query(
+        QuestionSignature.question_id, QuestionSignature.signature, Question.question_text, Question.quiz_id
+    ).join(Question, Question.id == QuestionSignature.question_id).filter(
+        QuestionSignature.question_id.in_(candidates)
+    ).all()
+
+    matches = []
+    for row in rows:
+        if exclude_id is not None and str(row.question_id) == str(exclude_id):
+            continue
+        score = similarity(sig, _decode(row.signature))
+        if score >= threshold:
+            matches.append({
+                "question_id": str(row.question_id),
+                "quiz_id": str(row.quiz_id) if row.quiz_id else None,
+                "question_text": row.question_text,
+                "similarity": round(score, 3)
+            })
+    matches.sort(key=lambda match: match["similarity"], reverse=True)
+    return matches[:limit]
+
+def similar_to_question(db: Session, question: Question, threshold: Optional[float] = None) -> List[dict]:
+    sig = signature(question.question_text)
+    if sig is None:
+        return []
+    return find_similar(db, sig, threshold, exclude_id=question.id)
+
+def dedupe_report(db: Session, texts: List[str], threshold: Optional[float] = None) -> dict:
+    """
+    Rapport de doublons d'un lot à importer : pour chaque énoncé, les questions proches
+    déjà en base et les autres énoncés proches du même lot.
+    """
+    threshold = settings.duplicate_similarity_threshold if threshold is None else threshold
+    signatures = [signature(text) for text in texts]
+
+    # Index LSH du lot, en mémoire
+    batch_buckets: Dict[int, List[int]] = {}
+    for index, sig in enumerate(signatures):
+        if sig is not None:
+            for bucket in buckets(sig):
+                batch_buckets.setdefault(bucket, []).append(index)
+
+    items = []
+    for index, (text, sig) in enumerate(zip(texts, signatures)):
+        if sig is None:
+            items.append({"index": index, "question_text": text, "existing": [], "batch_duplicates": []})
+            continue
+        neighbours = {other for bucket in buckets(sig) for other in batch_buckets[bucket] if other != index}
+        batch_duplicates = sorted(
+            other for other in neighbours if similarity(sig, signatures[other]) >= threshold
+        )
+        items.append({
+            "index": index,
+            "question_text": text,
+            "existing": find_similar(db, sig, threshold),
+            "batch_duplicates": batch_duplicates
+        })
+
+    return {
+        "items": items,
+        "summary": {
+            "total": len(items),
+            "with_existing_duplicates": sum(1 for item in items if item["existing"]),
+            "with_batch_duplicates": sum(1 for item in items if item["batch_duplicates"]),
+            "threshold": threshold
+        }
+    }
+
+def reindex_all(db: Session, chunk_size: int = 1000) -> int:
+    """Recalcule signatures et seaux de toute la banque de questions"""
+    db.query(QuestionLshBucket).delete(synchronize_session=False)
+    db.query(QuestionSignature).delete(synchronize_session=False)
+    count = 0
+    signature_rows, bucket_rows = [], []
+    for question_id, question_text in db.query(Question.id, Question.question_text).all():
+        sig = signature(question_text)
+        if sig is None:
+            continue
+        signature_rows.append({"question_id": question_id, "signature": sig.astype("<u4").tobytes()})
+        bucket_rows.extend({"bucket": bucket, "question_id": question_id} for bucket in set(buckets(sig)))
+        count += 1
+        if len(signature_rows) >= chunk_size:
+            db.execute(insert(QuestionSignature), signature_rows)
+            db.execute(insert(QuestionLshBucket), bucket_rows)
+            signature_rows, bucket_rows = [], []
+    if signature_rows:
+        db.execute(insert(QuestionSignature), signature_rows)
+        db.execute(insert(QuestionLshBucket), bucket_rows)
+    db.commit()
+    return count
+
+if __name__ == "__main__":
+    from app.db.session import SessionLocal
+
+    if len(sys.argv) < 2 or sys.argv[1] != "reindex":
+        print("Usage: python -m app.services.near_duplicates reindex")
+        sys.exit(1)
+
+    session = SessionLocal()
+    try:
+        count = reindex_all(session)
+        print(f"Signatures calculées pour {count} questions")
+    finally:
+        session.close()
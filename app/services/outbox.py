@@ -0,0 +1,328 @@
+"""
+Outbox des événements métier : résultats de quiz, inscriptions, progression.
+
+Les événements sont écrits dans `outbox_events` par la transaction qui les produit
+(`emit`) : ils existent si et seulement si le changement est validé. Un relais les
+livre ensuite par lots, dans l'ordre de leur id, à chaque consommateur configuré dans
+`outbox_consumers` ({nom: destination}) :
+- `file:/chemin/events.jsonl` : une ligne JSON par événement, ajoutée au fichier ;
+- `http://...` ou `https://...` : POST JSON `{"events": [...]}` (webhook) ;
+- `queue:nom` : file en mémoire du processus (développement, tests).
+
+Les événements sont livrés dans l'ordre (transaction, id). Sous PostgreSQL, chaque
+événement porte l'identifiant de la transaction qui l'a écrit (`txid_current()`), et le
+relais ne lit que les transactions antérieures au xmin de son instantané, donc toutes
+terminées : un événement d'id plus petit validé plus tard appartient forcément à une
+transaction encore en cours et ne peut pas être dépassé. Sous SQLite, les écritures
+sont sérialisées et l'id suffit.
+
+Chaque consommateur a un curseur (`outbox_cursors`) : la position (transaction, id) du
+dernier événement livré. Le curseur n'avance qu'après une livraison réussie, et dans la
+même transaction que sa lecture verrouillée : la livraison est « au moins une fois », les
+consommateurs dédoublonnent sur l'id de l'événement. Sous PostgreSQL, le verrou SKIP
+LOCKED du curseur garantit qu'un seul worker relaie un consommateur à la fois.
+
+Les événements livrés à tous les consommateurs sont supprimés après
+`outbox_retention_days` jours (`purge`) ; sans consommateur configuré, ils ne servent
+qu'au flux `GET /admin/events` et sont supprimés après le même délai. Le thread de
+relais de chaque worker purge à chaque passage, qu'il y ait des consommateurs ou non.
+Si le relais est désactivé (`outbox_relay_enabled=false`), la purge doit être planifiée
+(cron), faute de quoi la table croît sans limite.
+
+Passages ponctuels (cron) : `python -m app.services.outbox relay` et
+`python -m app.services.outbox purge`.
+"""
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import urllib.request
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, insert, tuple_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.db.upsert import dialect_insert
+from app.models import OutboxCursor, OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+ATTEMPT_COMPLETED = "attempt.completed"
+USER_REGISTERED = "user.registered"
+PROGRESS_UPDATED = "progress.updated"
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def _jsonable(payload: dict) -> dict:
+    return json.loads(json.dumps(payload, default=_json_default))
+
+def _transaction_id(db: Session):
+    """Transaction qui écrit l'événement (PostgreSQL) ; 0 sous SQLite, où les écritures sont sérialisées"""
+    if db.bind.dialect.name == "postgresql":
+        return func.txid_current()
+    return 0
+
+def emit(db: Session, event_type: str, aggregate_id: Optional[str], payload: dict):
+    """Ajoute un événement à la transaction courante"""
+    db.add(OutboxEvent(
+        event_type=event_type, aggregate_id=aggregate_id, payload=_jsonable(payload),
+        transaction_id=_transaction_id(db)
+    ))
+
+def emit_many(db: Session, event_type: str, events: List[dict]):
+    """Ajoute des événements en un INSERT groupé ; chaque élément porte `aggregate_id` et `payload`"""
+    if events:
+        db.execute(insert(OutboxEvent).values(transaction_id=_transaction_id(db)), [
+            {"event_type": event_type, "aggregate_id": event["aggregate_id"], "payload": _jsonable(event["payload"])}
+            for event in events
+        ])
+
+def progress_event(user_id: str, quiz, new_category: bool) -> dict:
+    """Contenu d'un événement de progression : niveau atteint dans la catégorie du quiz"""
+    return {
+        "user_id": user_id,
+        "category_id": quiz.category_id,
+        "level": quiz.level,
+        "quiz_id": quiz.id,
+        "new_category": new_category
+    }
+
+def serialize(event: OutboxEvent) -> dict:
+    return {
+        "id": event.id,
+        "type": event.event_type,
+        "aggregate_id": event.aggregate_id,
+        "payload": event.payload,
+        "created_at": _json_default(event.created_at) if event.created_at else None
+    }
+
+def position(event: OutboxEvent) -> Tuple[int, int]:
+    return event.transaction_id, event.id
+
+def _after(query, after: Tuple[int, int]):
+    return query.filter(tuple_(OutboxEvent.transaction_id, OutboxEvent.id) > tuple_(*after))
+
+def _visible(db: Session, query):
+    """Sous PostgreSQL, seulement les événements des transactions terminées (voir plus haut)"""
+    if db.bind.dialect.name == "postgresql":
+        query = query.filter(OutboxEvent.transaction_id < func.txid_snapshot_xmin(func.txid_current_snapshot()))
+    return query
+
+def read_events(db: Session, after: Tuple[int, int], limit: int) -> List[OutboxEvent]:
+    """Événements postérieurs à la position `after` (transaction, id), dans l'ordre de livraison"""
+    return _visible(db, _after(db.query(OutboxEvent), after)).order_by(
+        OutboxEvent.transaction_id, OutboxEvent.id
+    ).limit(limit).all()
+
+class Sink:
+    """Destination d'un consommateur ; `deliver` lève une exception si le lot n'est pas livré"""
+
+    def deliver(self, events: List[dict]):
+        raise NotImplementedError
+
+class FileSink(Sink):
+    def __init__(self, path: str):
+        self.path = path
+
+    def deliver(self, events: List[dict]):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a") as handle:
+            for event in events:
+                handle.write(json.dumps(event) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+
+class WebhookSink(Sink):
+    def __init__(self, url: str):
+        self.url = url
+
+    def deliver(self, events: List[dict]):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({"events": events}).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        # Les réponses 4xx/5xx lèvent HTTPError : le lot sera relivré
+        with urllib.request.urlopen(request, timeout=settings.outbox_webhook_timeout) as response:
+            response.read()
+
+_queues: Dict[str, queue.Queue] = {}
+_queues_lock = threading.Lock()
+
+def get_queue(name: str) -> queue.Queue:
+    """File en mémoire d'un consommateur `queue:nom`"""
+    with _queues_lock:
+        return _queues.setdefault(name, queue.Queue())
+
+class QueueSink(Sink):
+    def __init__(self, name: str):
+        self.queue = get_queue(name)
+
+    def deliver(self, events: List[dict]):
+        for event in events:
+            self.queue.put(event)
+
+def make_sink(destination: str) -> Sink:
+    if destination.startswith(("http://", "https://")):
+        return WebhookSink(destination)
+    if destination.startswith("file:"):
+        path = destination[len("file:"):]
+        return FileSink(path[2:] if path.startswith("//") else path)
+    if destination.startswith("queue:"):
+        return QueueSink(destination[len("queue:"):])
+    raise ValueError(f"Destination d'outbox inconnue : {destination}")
+
+def relay(db: Session, consumer: str, sink: Sink, batch_size: Optional[int] = None,
+          max_batches: Optional[int] = None) -> int:
+    """
+    Livre les événements en attente d'un consommateur, un lot par transaction, au plus
+    `max_batches` lots. Retourne le nombre d'événements livrés ; l'échec d'une livraison
+    est enregistré sur le curseur puis relevé.
+    """
+    batch_size = batch_size or settings.outbox_batch_size
+    max_batches = max_batches or sys.maxsize
+    db.execute(dialect_insert(db, OutboxCursor).values(
+        consumer=consumer, transaction_id=0, position=0, delivered_count=0
+    ).on_conflict_do_nothing(index_elements=["consumer"]))
+    db.commit()
+    total = 0
+    for _ in range(max_batches):
+        query = db.query(OutboxCursor).filter(OutboxCursor.consumer == consumer)
+        if db.bind.dialect.name == "postgresql":
+            query = query.with_for_update(skip_locked=True)
+        cursor = query.first()
+        if cursor is None:
+            # Un autre worker relaie déjà ce consommateur
+            db.rollback()
+            break
+        events = read_events(db, (cursor.transaction_id, cursor.position), batch_size)
+        if not events:
+            db.commit()
+            break
+        try:
+            sink.deliver([serialize(event) for event in events])
+        except Exception as error:
+            db.rollback()
+            db.query(OutboxCursor).filter(OutboxCursor.consumer == consumer).update(
+                {"last_error": f"{type(error).__name__}: {error}"[:1000], "updated_at": func.now()},
+                synchronize_session=False
+            )
+            db.commit()
+            raise
+        cursor.transaction_id, cursor.position = position(events[-1])
+        cursor.delivered_count += len(events)
+        cursor.last_error = None
+        db.commit()
+        total += len(events)
+        if len(events) < batch_size:
+            break
+    return total
+
+def relay_all(db: Session, max_batches: Optional[int] = None) -> Dict[str, int]:
+    """Un passage de relais pour chaque consommateur configuré ; un échec n'arrête pas les autres"""
+    delivered = {}
+    for consumer, destination in settings.outbox_consumers.items():
+        try:
+            delivered[consumer] = relay(db, consumer, make_sink(destination), max_batches=max_batches)
+        except Exception:
+            db.rollback()
+            logger.exception("Échec de la livraison des événements au consommateur %s", consumer)
+    return delivered
+
+def purge(db: Session, now: Optional[datetime] = None) -> int:
+    """Supprime les événements plus anciens que `outbox_retention_days` et livrés à tous les consommateurs"""
+    query = db.query(OutboxEvent).filter(
+        OutboxEvent.created_at < (now or datetime.utcnow()) - timedelta(days=settings.outbox_retention_days)
+    )
+    consumers = list(settings.outbox_consumers)
+    if consumers:
+        positions = {
+            cursor.consumer: (cursor.transaction_id, cursor.position)
+            for cursor in db.query(OutboxCursor).filter(OutboxCursor.consumer.in_(consumers))
+        }
+        slowest = min(positions.get(consumer, (0, 0)) for consumer in consumers)
+        query = query.filter(tuple_(OutboxEvent.transaction_id, OutboxEvent.id) <= tuple_(*slowest))
+    count = query.delete(synchronize_session=False)
+    db.commit()
+    return count
+
+def consumer_status(db: Session) -> List[dict]:
+    """Position, retard (événements restant à livrer) et dernière erreur de chaque consommateur"""
+    cursors = {cursor.consumer: cursor for cursor in db.query(OutboxCursor)}
+    result = []
+    for consumer in sorted(set(cursors) | set(settings.outbox_consumers)):
+        cursor = cursors.get(consumer)
+        after = (cursor.transaction_id, cursor.position) if cursor else (0, 0)
+        result.append({
+            "consumer": consumer,
+            "destination": settings.outbox_consumers.get(consumer),
+            "position": after[1],
+            "lag": _after(db.query(func.count(OutboxEvent.id)), after).scalar(),
+            "delivered_count": cursor.delivered_count if cursor else 0,
+            "last_error": cursor.last_error if cursor else None,
+            "updated_at": cursor.updated_at if cursor else None
+        })
+    return result
+
+class OutboxRelay(threading.Thread):
+    """Thread de livraison périodique des événements et de purge de l'outbox, un par worker"""
+
+    def __init__(self, interval: float):
+        super().__init__(name="outbox-relay", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            db = SessionLocal()
+            try:
+                relay_all(db, max_batches=settings.outbox_max_batches)
+                purge(db)
+            except Exception:
+                db.rollback()
+                logger.exception("Échec du passage du relais d'outbox")
+            finally:
+                db.close()
+
+_relay: Optional[OutboxRelay] = None
+
+def start_relay():
+    global _relay
+    # Démarré même sans consommateur : la purge de l'outbox en dépend
+    if not settings.outbox_relay_enabled or _relay is not None:
+        return
+    _relay = OutboxRelay(settings.outbox_relay_interval)
+    _relay.start()
+
+def stop_relay():
+    global _relay
+    if _relay is not None:
+        _relay.stop()
+        _relay = None
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("relay", "purge"):
+        print("Usage: python -m app.services.outbox relay|purge")
+        sys.exit(1)
+
+    session = SessionLocal()
+    try:
+        if sys.argv[1] == "relay":
+            for name, count in relay_all(session).items():
+                print(f"{name} : {count} événements livrés")
+        else:
+            print(f"{purge(session)} événements supprimés")
+    finally:
+        session.close()
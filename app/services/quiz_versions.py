@@ -0,0 +1,215 @@
+"""
+Versions immuables des quiz publiés.
+
+Publier un quiz fige un instantané (quiz, questions, réponses et corrigé) dans
+`quiz_versions`. Les tentatives référencent la version servie : démarrage, correction
+et relecture lisent l'instantané, jamais le contenu courant, que les administrateurs
+peuvent continuer à modifier jusqu'à la publication suivante.
+
+Un instantané ne change jamais : il est mis en cache sans expiration, et les réponses
+HTTP qui le servent peuvent être mises en cache indéfiniment (ETag = id de version).
+Le contenu courant des quiz sans version est mis en cache jusqu'à l'événement
+d'invalidation suivant. Dans les deux cas, les chargements concurrents d'un même
+contenu sont regroupés en une seule lecture (app/services/singleflight.py).
+
+Création des versions des quiz déjà publiés : `python -m app.services.quiz_versions publish-all`.
+"""
+import sys
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+from app.models import Quiz, QuizStatus, QuizVersion, Question, UserQuizAttempt
+from app.services.cache import TTLCache
+from app.services.catalog_store import catalog
+from app.services.invalidation import notify_change, subscribe
+from app.services.sampling import draw
+from app.services.singleflight import single_flight
+
+# Contenu des versions, indexé par ("version", id) (immuable, donc jamais invalidé)
+version_contents = TTLCache(maxsize=512, ttl=None)
+# Questions courantes des quiz sans version, indexées par ("live", quiz_id)
+live_contents = TTLCache(maxsize=256, ttl=300)
+content_flight = single_flight("quiz_content")
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+def _enum_value(value):
+    return value.value if hasattr(value, "value") else value
+
+def serialize_question(question: Question) -> dict:
+    """Question et réponses au format des instantanés (réponses chargées, triées par ordre)"""
+    return {
+        "id": question.id,
+        "quiz_id": question.quiz_id,
+        "question_text": question.question_text,
+        "order": question.order,
+        "stratum": question.stratum,
+        "created_at": _iso(question.created_at),
+        "answers": [
+            {
+                "id": answer.id,
+                "question_id": answer.question_id,
+                "answer_text": answer.answer_text,
+                "is_correct": bool(answer.is_correct),
+                "order": answer.order,
+                "created_at": _iso(answer.created_at)
+            }
+            for answer in question.answers
+        ]
+    }
+
+def build_content(db: Session, quiz: Quiz) -> dict:
+    """Construit l'instantané du contenu courant d'un quiz"""
+    questions = db.query(Question).filter(Question.quiz_id == quiz.id).options(
+        selectinload(Question.answers)
+    ).order_by(Question.order).all()
+    serialized = [serialize_question(question) for question in questions]
+    return {
+        "quiz": {
+            "id": quiz.id,
+            "category_id": quiz.category_id,
+            "title": quiz.title,
+            "level": _enum_value(quiz.level),
+            "status": QuizStatus.published.value,
+            "sample_size": quiz.sample_size,
+            "stratified": bool(quiz.stratified),
+            "created_at": _iso(quiz.created_at),
+            "updated_at": _iso(quiz.updated_at)
+        },
+        "questions": serialized,
+        "answer_key": {
+            question["id"]: [answer["id"] for answer in question["answers"] if answer["is_correct"]]
+            for question in serialized
+        }
+    }
+
+def _same_content(left: dict, right: dict) -> bool:
+    """Compare deux instantanés en ignorant les horodatages du quiz"""
+    volatile = ("created_at", "updated_at")
+    return (
+        left["questions"] == right["questions"]
+        and {k: v for k, v in left["quiz"].items() if k not in volatile}
+        == {k: v for k, v in right["quiz"].items() if k not in volatile}
+    )
+
+def publish(db: Session, quiz: Quiz) -> QuizVersion:
+    """
+    Publie le quiz : fige son contenu courant dans une nouvelle version, sauf s'il est
+    identique à la version courante. Ne valide pas la transaction.
+    """
+    content = build_content(db, quiz)
+    if quiz.current_version_id:
+        current = db.query(QuizVersion).filter(QuizVersion.id == quiz.current_version_id).first()
+        if current and _same_content(current.content, content):
+            quiz.status = QuizStatus.published
+            return current
+
+    last_version = db.query(func.max(QuizVersion.version)).filter(QuizVersion.quiz_id == quiz.id).scalar() or 0
+    version = QuizVersion(quiz_id=quiz.id, version=last_version + 1, content=content)
+    db.add(version)
+    db.flush()
+    quiz.current_version_id = version.id
+    quiz.status = QuizStatus.published
+    return version
+
+def get_version_content(db: Session, version_id: str) -> Optional[dict]:
+    """
+    Contenu d'une version : catalogue partagé pour les versions courantes, sinon lu une
+    seule fois par processus
+    """
+    content = catalog.get(f"version:{version_id}")
+    if content is not None:
+        return content
+    return content_flight.get_or_load(
+        version_contents, ("version", version_id),
+        lambda: db.query(QuizVersion.content).filter(QuizVersion.id == version_id).scalar()
+    )
+
+def live_questions(db: Session, quiz_id: str) -> List[dict]:
+    """Questions courantes d'un quiz au format des instantanés (en cache jusqu'à invalidation)"""
+    return content_flight.get_or_load(
+        live_contents, ("live", quiz_id),
+        lambda: [
+            serialize_question(question)
+            for question in db.query(Question).filter(Question.quiz_id == quiz_id).options(
+                selectinload(Question.answers)
+            ).order_by(Question.order)
+        ]
+    )
+
+def _on_content_change(events):
+    """Abonné du bus d'invalidation : évince le contenu courant des quiz modifiés"""
+    for item in events:
+        if item.entity == "resync":
+            live_contents.clear()
+            return
+        quiz_id = item.entity_id if item.entity == "quiz" else item.quiz_id
+        live_contents.pop(("live", quiz_id))
+
+subscribe(("quiz", "question"), _on_content_change)
+
+def sample_version_question_ids(content: dict, seed: int) -> Optional[List[str]]:
+    """Tirage des questions d'une banque de questions parmi celles de la version"""
+    quiz = content["quiz"]
+    rows = [(question["id"], question["stratum"]) for question in content["questions"]]
+    return draw(rows, quiz["sample_size"], quiz["stratified"], seed)
+
+def attempt_content(db: Session, attempt: UserQuizAttempt) -> Tuple[Optional[dict], List[dict]]:
+    """
+    Retourne (quiz de la version ou None, questions servies) pour une tentative, au format
+    des instantanés. Les tentatives sans version lisent le contenu courant.
+    """
+    if attempt.quiz_version_id:
+        content = get_version_content(db, attempt.quiz_version_id)
+        questions = content["questions"]
+        if attempt.question_ids is not None:
+            selected = set(attempt.question_ids)
+            questions = [question for question in questions if question["id"] in selected]
+        return content["quiz"], questions
+
+    questions = live_questions(db, attempt.quiz_id)
+    if attempt.question_ids is not None:
+        selected = set(attempt.question_ids)
+        questions = [question for question in questions if question["id"] in selected]
+    return None, questions
+
+def public_content(content: dict) -> dict:
+    """Instantané sans le corrigé, pour les utilisateurs non administrateurs"""
+    return {
+        "quiz": content["quiz"],
+        "questions": [
+            dict(question, answers=[
+                {key: value for key, value in answer.items() if key != "is_correct"}
+                for answer in question["answers"]
+            ])
+            for question in content["questions"]
+        ]
+    }
+
+def publish_all(db: Session) -> int:
+    """Crée une version pour chaque quiz publié qui n'en a pas encore"""
+    quizzes = db.query(Quiz).filter(
+        Quiz.status == QuizStatus.published,
+        Quiz.current_version_id == None
+    ).all()
+    for quiz in quizzes:
+        publish(db, quiz)
+        notify_change(db, "quiz", quiz.id, "updated")
+    db.commit()
+    return len(quizzes)
+
+if __name__ == "__main__":
+    from app.db.session import SessionLocal
+
+    if len(sys.argv) < 2 or sys.argv[1] != "publish-all":
+        print("Usage: python -m app.services.quiz_versions publish-all")
+        sys.exit(1)
+
+    session = SessionLocal()
+    try:
+        count = publish_all(session)
+        print(f"{count} quiz publiés en version figée")
+    finally:
+        session.close()
@@ -0,0 +1,65 @@
+"""
+Tirage aléatoire des questions d'une banque de questions.
+
+Un quiz dont `sample_size` est renseigné sert `sample_size` questions tirées au hasard
+à chaque tentative, éventuellement stratifiées par `Question.stratum` (répartition
+proportionnelle à la taille de chaque strate). Le tirage ne lit que les colonnes
+indexées (id, strate) ; seules les questions retenues sont chargées ensuite.
+La graine et les questions tirées sont enregistrées sur la tentative, ce qui rend
+correction et relecture reproductibles.
+"""
+import random
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.models import Quiz, Question
+
+def new_seed() -> int:
+    return random.SystemRandom().getrandbits(63)
+
+def allocate(strata_sizes: Dict[Optional[str], int], sample_size: int) -> Dict[Optional[str], int]:
+    """Répartit `sample_size` entre les strates, proportionnellement (méthode du plus fort reste)"""
+    total = sum(strata_sizes.values())
+    quotas = {name: sample_size * size / total for name, size in strata_sizes.items()}
+    allocation = {name: int(quota) for name, quota in quotas.items()}
+    remaining = sample_size - sum(allocation.values())
+    # Trier par reste décroissant puis par nom pour un résultat déterministe
+    by_remainder = sorted(quotas, key=lambda name: (-(quotas[name] - allocation[name]), str(name)))
+    for name in by_remainder[:remaining]:
+        allocation[name] += 1
+    return allocation
+
+def draw(rows: List[Tuple[str, Optional[str]]], sample_size: Optional[int], stratified: bool, seed: int) -> Optional[List[str]]:
+    """
+    Tire `sample_size` questions parmi `rows` ((id, strate) dans l'ordre du quiz).
+    Retourne None si toutes les questions doivent être servies.
+    """
+    if not sample_size or len(rows) <= sample_size:
+        return None
+
+    rng = random.Random(seed)
+    if stratified:
+        strata: Dict[Optional[str], List[int]] = {}
+        for position, (_, stratum) in enumerate(rows):
+            strata.setdefault(stratum, []).append(position)
+        allocation = allocate({name: len(positions) for name, positions in strata.items()}, sample_size)
+        picked = []
+        for name in sorted(strata, key=str):
+            picked.extend(rng.sample(strata[name], allocation[name]))
+    else:
+        picked = rng.sample(range(len(rows)), sample_size)
+
+    # Conserver l'ordre des questions dans le quiz
+    return [rows[position][0] for position in sorted(picked)]
+
+def sample_question_ids(db: Session, quiz: Quiz, seed: int) -> Optional[List[str]]:
+    """
+    Tire les questions d'une tentative parmi les questions courantes du quiz.
+    Retourne None si le quiz n'est pas une banque de questions.
+    """
+    if not quiz.sample_size:
+        return None
+
+    rows = db.query(Question.id, Question.stratum).filter(
+        Question.quiz_id == quiz.id
+    ).order_by(Question.order).all()
+    return draw([tuple(row) for row in rows], quiz.sample_size, quiz.stratified, seed)
@@ -0,0 +1,366 @@
+"""
+Recherche plein texte dans les catégories, quiz, questions et réponses.
+
+Deux moteurs, choisis selon la base :
+- PostgreSQL : colonnes `search_vector` (tsvector générées, configuration 'simple') et
+  index GIN, voir la migration 009 ; classement par `ts_rank` ;
+- autres bases (SQLite en développement) : index inversé en mémoire, construit à la
+  première recherche et tenu à jour par le bus d'invalidation ; classement tf-idf.
+
+Les deux moteurs appliquent la même sémantique : tous les termes doivent apparaître
+(ET), le dernier terme est un préfixe (recherche au fil de la frappe), et le texte des
+réponses compte pour moitié dans le score de leur question.
+
+Visibilité : les utilisateurs ne voient que les catégories actives et les quiz publiés ;
+les questions (et leurs réponses) ne sont cherchées que pour les administrateurs.
+"""
+import bisect
+import math
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.models import Answer, Category, Question, Quiz
+from app.services.invalidation import subscribe
+
+TYPES = ("category", "quiz", "question")
+
+# Poids des champs (équivalents des poids A/B/C de PostgreSQL)
+TITLE_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+ANSWER_WEIGHT = 0.5
+
+# Lettres et chiffres ; le souligné sépare les mots comme dans l'analyseur PostgreSQL
+_TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+
+def tokenize(value: Optional[str]) -> List[str]:
+    return [token.lower() for token in _TOKEN.findall(value or "")]
+
+@dataclass
+class SearchQuery:
+    terms: List[str]
+    types: Tuple[str, ...]
+    is_admin: bool
+    quiz_id: Optional[str] = None
+    category_id: Optional[str] = None
+    page: int = 1
+    page_size: int = 20
+
+    @property
+    def offset(self) -> int:
+        return (self.page - 1) * self.page_size
+
+    def allowed_types(self) -> Tuple[str, ...]:
+        types = self.types if self.is_admin else tuple(kind for kind in self.types if kind != "question")
+        if self.quiz_id:
+            # Seules les questions appartiennent à un quiz
+            types = tuple(kind for kind in types if kind == "question")
+        return types
+
+def _hit(kind: str, entity_id, title: str, quiz_id, category_id, rank: float) -> dict:
+    return {
+        "type": kind,
+        "id": str(entity_id),
+        "title": title,
+        "quiz_id": str(quiz_id) if quiz_id else None,
+        "category_id": str(category_id) if category_id else None,
+        "rank": round(float(rank), 6)
+    }
+
+# --- PostgreSQL -------------------------------------------------------------------
+
+def _tsquery(terms: List[str]) -> str:
+    """Requête tsquery : termes en ET, le dernier en préfixe (les jetons sont alphanumériques)"""
+    return " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+
+def _postgres_search(db: Session, query: SearchQuery) -> Tuple[List[dict], int]:
+    types = query.allowed_types()
+    parts = []
+    if "category" in types:
+        parts.append("""
+            SELECT 'category' AS type, c.id, c.name AS title, NULL::uuid AS quiz_id, c.id AS category_id,
+                   ts_rank(c.search_vector, q.query) AS rank
+            FROM categories c, q
+            WHERE c.search_vector @@ q.query
+              AND (:is_admin OR c.is_active)
+              AND (CAST(:category_id AS uuid) IS NULL OR c.id = CAST(:category_id AS uuid))""")
+    if "quiz" in types:
+        parts.append("""
+            SELECT 'quiz', z.id, z.title, z.id, z.category_id, ts_rank(z.search_vector, q.query)
+            FROM quizzes z, q
+            WHERE z.search_vector @@ q.query
+              AND (:is_admin OR z.status = 'published')
+              AND (CAST(:category_id AS uuid) IS NULL OR z.category_id = CAST(:category_id AS uuid))""")
+    if "question" in types:
+        # Union des correspondances sur l'énoncé et sur les réponses : chaque branche utilise son index GIN
+        parts.append("""
+            SELECT 'question', qu.id, qu.question_text, qu.quiz_id, z.category_id, m.rank
+            FROM (
+                SELECT id, sum(rank) AS rank FROM (
+                    SELECT qu.id, ts_rank(qu.search_vector, q.query) AS rank
+                    FROM questions qu, q WHERE qu.search_vector @@ q.query
+                    UNION ALL
+                    SELECT a.question_id, :answer_weight * ts_rank(a.search_vector, q.query)
+                    FROM answers a, q WHERE a.search_vector @@ q.query
+                ) matches GROUP BY id
+            ) m
+            JOIN questions qu ON qu.id = m.id
+            LEFT JOIN quizzes z ON z.id = qu.quiz_id
+            WHERE (CAST(:quiz_id AS uuid) IS NULL OR qu.quiz_id = CAST(:quiz_id AS uuid))
+              AND (CAST(:category_id AS uuid) IS NULL OR z.category_id = CAST(:category_id AS uuid))""")
+    if not parts:
+        return [], 0
+
+    statement = text(
+        "WITH q AS (SELECT to_tsquery('simple', :tsquery) AS query), hits AS ("
+        + " UNION ALL ".join(parts)
+        + ") SELECT *, count(*) OVER () AS total FROM hits ORDER BY rank DESC, id LIMIT :limit OFFSET :offset"
+    )
+    rows = db.execute(statement, {
+        "tsquery": _tsquery(query.terms),
+        "is_admin": query.is_admin,
+        "quiz_id": query.quiz_id,
+        "category_id": query.category_id,
+        "answer_weight": ANSWER_WEIGHT,
+        "limit": query.page_size,
+        "offset": query.offset
+    }).all()
+    total = rows[0].total if rows else 0
+    return [_hit(row.type, row.id, row.title, row.quiz_id, row.category_id, row.rank) for row in rows], total
+
+# --- Index inversé en mémoire ------------------------------------------------------
+
+class InvertedIndex:
+    """Index inversé pondéré : terme -> {document: poids}, vocabulaire trié pour les préfixes"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[tuple, float]] = {}
+        self.vocabulary: List[str] = []
+        self.documents: Dict[tuple, dict] = {}
+        self._terms: Dict[tuple, Set[str]] = {}
+        self._unsorted = False
+
+    def add(self, key: tuple, fields: Iterable[Tuple[Optional[str], float]], meta: dict):
+        self.remove(key)
+        weights: Dict[str, float] = {}
+        for value, weight in fields:
+            for token in tokenize(value):
+                weights[token] = weights.get(token, 0.0) + weight
+        for term, weight in weights.items():
+            if term not in self.postings:
+                self.postings[term] = {}
+                self.vocabulary.append(term)
+                self._unsorted = True
+            self.postings[term][key] = weight
+        self._terms[key] = set(weights)
+        self.documents[key] = meta
+
+    def remove(self, key: tuple):
+        for term in self._terms.pop(key, ()):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(key, None)
+        self.documents.pop(key, None)
+
+    def _expand(self, prefix: str) -> List[str]:
+        """Termes du vocabulaire commençant par `prefix` (vocabulaire trié à la demande)"""
+        if self._unsorted:
+            self.vocabulary.sort()
+            self._unsorted = False
+        terms = []
+        position = bisect.bisect_left(self.vocabulary, prefix)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(prefix):
+            terms.append(self.vocabulary[position])
+            position += 1
+        return terms
+
+    def _idf(self, term: str) -> float:
+        return math.log(1 + (len(self.documents) or 1) / len(self.postings[term]))
+
+    def _term_scores(self, terms: List[str]) -> Dict[tuple, float]:
+        """Score tf-idf de chaque document pour un terme (ou ses expansions de préfixe)"""
+        scores: Dict[tuple, float] = {}
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(term)
+            for key, weight in postings.items():
+                scores[key] = max(scores.get(key, 0.0), math.log1p(weight) * idf)
+        return scores
+
+    def search(self, terms: List[str]) -> Dict[tuple, float]:
+        """Documents contenant tous les termes (le dernier en préfixe), avec leur score"""
+        prefix = terms[-1]
+        if len(terms) == 1:
+            return self._term_scores(self._expand(prefix))
+
+        per_term = sorted((self._term_scores([term]) for term in terms[:-1]), key=len)
+        result = per_term[0]
+        for scores in per_term[1:]:
+            result = {key: score + scores[key] for key, score in result.items() if key in scores}
+            if not result:
+                return {}
+
+        # Préfixe vérifié sur les seuls candidats : un préfixe court peut couvrir une grande
+        # partie du vocabulaire, les candidats sont bornés par le terme exact le plus rare
+        matched = {}
+        for key, score in result.items():
+            best = 0.0
+            for term in self._terms[key]:
+                if term.startswith(prefix):
+                    best = max(best, math.log1p(self.postings[term][key]) * self._idf(term))
+            if best:
+                matched[key] = score + best
+        return matched
+
+class MemorySearchIndex:
+    """Index inversé du processus, rafraîchi à la demande d'après les événements d'invalidation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index: Optional[InvertedIndex] = None
+        self._dirty: Dict[str, Set[str]] = {kind: set() for kind in TYPES}
+        self._deleted_quizzes: Set[str] = set()
+
+    def invalidate(self, events):
+        with self._lock:
+            for item in events:
+                if item.entity == "resync":
+                    self._index = None
+                    continue
+                if item.entity == "quiz" and item.action == "deleted":
+                    self._deleted_quizzes.add(item.entity_id)
+                self._dirty[item.entity].add(item.entity_id)
+
+    def _build(self, db: Session) -> InvertedIndex:
+        index = InvertedIndex()
+        for category in db.query(Category).all():
+            self._add_category(index, category)
+        for quiz in db.query(Quiz).all():
+            self._add_quiz(index, quiz)
+        answers: Dict[str, List[str]] = {}
+        for question_id, answer_text in db.query(Answer.question_id, Answer.answer_text):
+            answers.setdefault(str(question_id), []).append(answer_text)
+        for question in db.query(Question).all():
+            self._add_question(index, question, answers.get(str(question.id), []))
+        return index
+
+    @staticmethod
+    def _add_category(index: InvertedIndex, category: Category):
+        index.add(
+            ("category", str(category.id)),
+            [(category.name, TITLE_WEIGHT), (category.description, DESCRIPTION_WEIGHT)],
+            {"title": category.name, "quiz_id": None, "category_id": str(category.id),
+             "public": bool(category.is_active)}
+        )
+
+    @staticmethod
+    def _add_quiz(index: InvertedIndex, quiz: Quiz):
+        index.add(
+            ("quiz", str(quiz.id)),
+            [(quiz.title, TITLE_WEIGHT)],
+            {"title": quiz.title, "quiz_id": str(quiz.id),
+             "category_id": str(quiz.category_id) if quiz.category_id else None,
+             "public": quiz.status == "published"}
+        )
+
+    @staticmethod
+    def _add_question(index: InvertedIndex, question: Question, answers: List[str]):
+        fields = [(question.question_text, TITLE_WEIGHT)] + [(answer, ANSWER_WEIGHT) for answer in answers]
+        index.add(
+            ("question", str(question.id)),
+            fields,
+            {"title": question.question_text, "quiz_id": str(question.quiz_id) if question.quiz_id else None,
+             "category_id": None, "public": False}
+        )
+
+    def _refresh(self, db: Session, index: InvertedIndex):
+        """Réindexe les entités modifiées depuis la dernière recherche (verrou tenu)"""
+        dirty = {kind: ids for kind, ids in self._dirty.items() if ids}
+        if not dirty and not self._deleted_quizzes:
+            return
+        self._dirty = {kind: set() for kind in TYPES}
+
+        # Les questions d'un quiz supprimé disparaissent avec lui (suppression en cascade)
+        if self._deleted_quizzes:
+            for key, meta in list(index.documents.items()):
+                if key[0] == "question" and meta["quiz_id"] in self._deleted_quizzes:
+                    index.remove(key)
+            self._deleted_quizzes = set()
+
+        loaders = {
+            "category": lambda ids: {str(row.id): row for row in db.query(Category).filter(Category.id.in_(ids))},
+            "quiz": lambda ids: {str(row.id): row for row in db.query(Quiz).filter(Quiz.id.in_(ids))},
+            "question": lambda ids: {str(row.id): row for row in db.query(Question).filter(Question.id.in_(ids))},
+        }
+        for kind, ids in dirty.items():
+            found = loaders[kind](list(ids))
+            answers: Dict[str, List[str]] = {}
+            if kind == "question" and found:
+                for question_id, answer_text in db.query(Answer.question_id, Answer.answer_text).filter(
+                    Answer.question_id.in_(list(found))
+                ):
+                    answers.setdefault(str(question_id), []).append(answer_text)
+            for entity_id in ids:
+                entity = found.get(entity_id)
+                if entity is None:
+                    index.remove((kind, entity_id))
+                elif kind == "category":
+                    self._add_category(index, entity)
+                elif kind == "quiz":
+                    self._add_quiz(index, entity)
+                else:
+                    self._add_question(index, entity, answers.get(entity_id, []))
+
+    def search(self, db: Session, query: SearchQuery) -> Tuple[List[dict], int]:
+        with self._lock:
+            if self._index is None:
+                self._index = self._build(db)
+                self._dirty = {kind: set() for kind in TYPES}
+                self._deleted_quizzes = set()
+            else:
+                self._refresh(db, self._index)
+            index = self._index
+
+            types = query.allowed_types()
+            ranked = []
+            for key, score in index.search(query.terms).items():
+                kind = key[0]
+                if kind not in types:
+                    continue
+                meta = index.documents[key]
+                if not query.is_admin and not meta["public"]:
+                    continue
+                category_id = meta["category_id"]
+                if kind == "question":
+                    if query.quiz_id and meta["quiz_id"] != query.quiz_id:
+                        continue
+                    quiz_meta = index.documents.get(("quiz", meta["quiz_id"]))
+                    category_id = quiz_meta["category_id"] if quiz_meta else None
+                if query.category_id and category_id != query.category_id:
+                    continue
+                ranked.append((score, key, meta, category_id))
+
+        ranked.sort(key=lambda item: (-item[0], item[1][1]))
+        page = ranked[query.offset:query.offset + query.page_size]
+        hits = [_hit(key[0], key[1], meta["title"], meta["quiz_id"], category_id, score)
+                for score, key, meta, category_id in page]
+        return hits, len(ranked)
+
+memory_index = MemorySearchIndex()
+
+subscribe(TYPES, memory_index.invalidate)
+
+def backend(db: Session) -> str:
+    return "postgresql" if db.bind.dialect.name == "postgresql" else "memory"
+
+def search(db: Session, query: SearchQuery) -> Tuple[List[dict], int]:
+    """Résultats classés de la page demandée et nombre total de résultats"""
+    if not query.terms:
+        return [], 0
+    if backend(db) == "postgresql":
+        return _postgres_search(db, query)
+    return memory_index.search(db, query)
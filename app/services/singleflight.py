@@ -0,0 +1,142 @@
+"""
+Regroupement des chargements concurrents d'une même clé (single-flight).
+
+Quand une entrée de cache manque, toutes les requêtes qui la demandent en même temps
+attendent le calcul lancé par la première au lieu de relancer chacune les mêmes
+requêtes SQL. Utilisable depuis les routes synchrones (`do`, exécutées dans le pool
+de threads) et asynchrones (`do_async`).
+
+Compteurs par groupe :
+- hits : entrée trouvée en cache (`get_or_load`) ;
+- misses : chargement effectivement exécuté ;
+- coalesced : appel qui a attendu le chargement d'un autre.
+"""
+import asyncio
+import inspect
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Union
+from app.services.cache import TTLCache
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Groupe de chargements regroupés par clé, avec ses compteurs"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[tuple, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Exécute `fn` une seule fois pour tous les appels concurrents de `key`"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Union[Any, Awaitable[Any]]]) -> Any:
+        """
+        Variante asynchrone : `fn` peut être une coroutine ou une fonction synchrone
+        (exécutée alors dans le pool de threads). Les appels sont regroupés par boucle.
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        future = self._async_calls.get(flight_key)
+        if future is not None:
+            self._count("coalesced")
+            return await asyncio.shield(future)
+
+        future = loop.create_future()
+        self._async_calls[flight_key] = future
+        self._count("misses")
+        try:
+            if inspect.iscoroutinefunction(fn):
+                result = await fn()
+            else:
+                result = await loop.run_in_executor(None, fn)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as error:
+            future.set_exception(error)
+            future.exception()  # évite l'avertissement si personne n'attendait
+            raise
+        finally:
+            del self._async_calls[flight_key]
+
+    def get_or_load(self, cache: TTLCache, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Lit `key` dans `cache`, sinon le charge une seule fois et le met en cache"""
+        value = cache.get(key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        def load():
+            # Un chargement concurrent a pu se terminer entre la lecture du cache et l'appel
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+            loaded = loader()
+            if loaded is not None:
+                cache.set(key, loaded)
+            return loaded
+
+        return self.do(key, load)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls) + len(self._async_calls)
+            }
+
+_groups: Dict[str, SingleFlight] = {}
+
+def single_flight(name: str) -> SingleFlight:
+    """Retourne le groupe `name`, créé au premier appel"""
+    if name not in _groups:
+        _groups[name] = SingleFlight(name)
+    return _groups[name]
+
+def all_stats() -> List[dict]:
+    return [group.stats() for group in _groups.values()]
@@ -0,0 +1,176 @@
+"""
+Synthèse par utilisateur pour le tableau de bord (`user_stats`).
+
+Une ligne par utilisateur : nombre de tentatives, somme des scores, réussites,
+catégories maîtrisées et les dernières tentatives terminées. Elle est mise à jour dans
+la transaction qui démarre ou termine une tentative (démarrage, soumission, correction
+par lot) ; `GET /users/me/stats` n'est plus qu'une lecture par clé primaire.
+
+Reconstruction complète depuis les tentatives : `python -m app.services.user_stats rebuild`.
+"""
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import func, insert, select, text, union_all
+from sqlalchemy.orm import Session
+from app.db.upsert import dialect_insert
+from app.models import ArchivedAttempt, Quiz, UserProgress, UserQuizAttempt, UserStats
+
+# Taille de l'anneau des tentatives récentes
+RECENT_SIZE = 5
+
+@dataclass
+class StatsDelta:
+    """Changements à appliquer à la synthèse d'un utilisateur"""
+    started: int = 0
+    completed: List[dict] = field(default_factory=list)  # voir recent_entry
+    categories_mastered: int = 0
+
+def _completed_at(value) -> Optional[str]:
+    """Horodatage ISO en UTC naïf, comparable comme chaîne"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+def recent_entry(attempt_id: str, quiz_title: Optional[str], score: float, passed: bool, completed_at) -> dict:
+    return {
+        "id": attempt_id,
+        "quiz_title": quiz_title or "Unknown Quiz",
+        "score": score,
+        "passed": passed,
+        "completed_at": _completed_at(completed_at)
+    }
+
+def merge_recent(current: List[dict], entries: List[dict]) -> List[dict]:
+    """Insère des tentatives terminées dans l'anneau, le plus récent d'abord"""
+    merged = sorted(current + entries, key=lambda entry: entry["completed_at"] or "", reverse=True)
+    return merged[:RECENT_SIZE]
+
+def apply_deltas(db: Session, deltas: Dict[str, StatsDelta]):
+    """
+    Applique les changements dans la transaction courante : crée les lignes manquantes en
+    un INSERT ... ON CONFLICT DO NOTHING puis verrouille et met à jour les lignes en une lecture.
+    """
+    if not deltas:
+        return
+    db.execute(dialect_insert(db, UserStats).values([
+        {"user_id": user_id, "recent_attempts": []} for user_id in deltas
+    ]).on_conflict_do_nothing(index_elements=["user_id"]))
+
+    rows = db.query(UserStats).filter(
+        UserStats.user_id.in_(list(deltas))
+    ).order_by(UserStats.user_id).with_for_update().all()
+    for row in rows:
+        delta = deltas[row.user_id]
+        row.attempt_count += delta.started
+        row.completed_count += len(delta.completed)
+        row.score_sum += sum(entry["score"] or 0 for entry in delta.completed)
+        row.passed_count += sum(1 for entry in delta.completed if entry["passed"])
+        row.categories_mastered += delta.categories_mastered
+        if delta.completed:
+            row.recent_attempts = merge_recent(list(row.recent_attempts or []), delta.completed)
+        row.updated_at = datetime.utcnow()
+
+def record_started(db: Session, user_id: str):
+    apply_deltas(db, {user_id: StatsDelta(started=1)})
+
+def record_completed(db: Session, user_id: str, entry: dict, new_category: bool):
+    apply_deltas(db, {user_id: StatsDelta(completed=[entry], categories_mastered=int(new_category))})
+
+def dashboard(db: Session, user_id: str) -> dict:
+    """Statistiques du tableau de bord, lues sur la ligne de synthèse"""
+    row = db.get(UserStats, user_id)
+    if row is None:
+        return {"total_attempts": 0, "average_score": 0.0, "categories_mastered": 0, "recent_attempts": []}
+    average = row.score_sum / row.completed_count if row.completed_count else 0
+    return {
+        "total_attempts": row.attempt_count,
+        "average_score": round(average, 2) if average else 0.0,
+        "categories_mastered": row.categories_mastered,
+        "recent_attempts": row.recent_attempts or []
+    }
+
+def rebuild(db: Session) -> int:
+    """Recalcule toutes les lignes de synthèse depuis les tentatives (archivées comprises) et la progression"""
+    # Sans verrou, un delta validé entre la lecture des tentatives et le remplacement des
+    # lignes serait perdu. EXCLUSIVE laisse passer les lectures du tableau de bord mais fait
+    # attendre apply_deltas : les tentatives validées avant le verrou sont relues ici, les
+    # suivantes appliquent leur delta sur les lignes reconstruites.
+    if db.bind.dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE user_stats IN EXCLUSIVE MODE"))
+    # Tentatives des tables chaudes et de l'archive, avec le titre du quiz
+    attempts = union_all(
+        select(
+            UserQuizAttempt.user_id, UserQuizAttempt.id, UserQuizAttempt.score, UserQuizAttempt.passed,
+            UserQuizAttempt.completed_at, Quiz.title
+        ).outerjoin(Quiz, Quiz.id == UserQuizAttempt.quiz_id),
+        select(
+            ArchivedAttempt.user_id, ArchivedAttempt.id, ArchivedAttempt.score, ArchivedAttempt.passed,
+            ArchivedAttempt.completed_at, ArchivedAttempt.quiz_title
+        )
+    ).subquery()
+    totals = db.query(
+        attempts.c.user_id,
+        func.count(attempts.c.id),
+        func.count(attempts.c.score),
+        func.coalesce(func.sum(attempts.c.score), 0),
+        func.count(attempts.c.id).filter(attempts.c.passed == True)
+    ).group_by(attempts.c.user_id).all()
+    mastered = dict(
+        db.query(UserProgress.user_id, func.count(UserProgress.id)).group_by(UserProgress.user_id).all()
+    )
+
+    # Dernières tentatives terminées de chaque utilisateur (fonction de fenêtre)
+    position = func.row_number().over(
+        partition_by=attempts.c.user_id,
+        order_by=attempts.c.completed_at.desc()
+    ).label("position")
+    ranked = db.query(attempts, position).filter(attempts.c.completed_at != None).subquery()
+    recent: Dict[str, List[dict]] = {}
+    for row in db.query(ranked).filter(
+        ranked.c.position <= RECENT_SIZE
+    ).order_by(ranked.c.user_id, ranked.c.position):
+        recent.setdefault(row.user_id, []).append(
+            recent_entry(row.id, row.title, row.score, row.passed, row.completed_at)
+        )
+
+    rows = []
+    for user_id, attempt_count, completed_count, score_sum, passed_count in totals:
+        rows.append({
+            "user_id": user_id,
+            "attempt_count": attempt_count,
+            "completed_count": completed_count,
+            "score_sum": float(score_sum),
+            "passed_count": passed_count,
+            "categories_mastered": mastered.get(user_id, 0),
+            "recent_attempts": recent.get(user_id, [])
+        })
+    # Utilisateurs avec une progression mais sans tentative (données importées)
+    with_attempts = {row["user_id"] for row in rows}
+    for user_id, count in mastered.items():
+        if user_id not in with_attempts:
+            rows.append({"user_id": user_id, "attempt_count": 0, "completed_count": 0, "score_sum": 0.0,
+                         "passed_count": 0, "categories_mastered": count, "recent_attempts": []})
+
+    db.query(UserStats).delete(synchronize_session=False)
+    if rows:
+        db.execute(insert(UserStats), rows)
+    db.commit()
+    return len(rows)
+
+if __name__ == "__main__":
+    from app.db.session import SessionLocal
+
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage: python -m app.services.user_stats rebuild")
+        sys.exit(1)
+
+    session = SessionLocal()
+    try:
+        count = rebuild(session)
+        print(f"Synthèse reconstruite pour {count} utilisateurs")
+    finally:
+        session.close()
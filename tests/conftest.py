@@ -0,0 +1,104 @@
+"""
+Fixtures communes : base SQLite jetable recréée pour chaque test, client HTTP et
+comptes administrateur / utilisateur.
+
+Les variables d'environnement sont fixées avant l'import de l'application, qui lit la
+configuration à l'import. Les tâches de fond (balayeur, relais, écoute des
+invalidations) ne démarrent pas : le client n'exécute pas les événements de démarrage.
+"""
+import os
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="quiz-api-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_workdir}/test.db"
+os.environ["CATALOG_STORE_PATH"] = f"{_workdir}/catalog.bin"
+os.environ["ANALYTICS_SNAPSHOT_DIR"] = f"{_workdir}/analytics"
+os.environ["SLOW_QUERY_LOG_ENABLED"] = "false"
+os.environ["PROFILING_ENABLED"] = "false"
+
+import pytest
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.db.ids import new_id
+from app.db.session import Base, SessionLocal, engine
+from app.main import app
+from app.models import User, UserRole
+from app.services.auth import get_password_hash
+from app.services.catalog_store import category_listing
+from app.services.invalidation import InvalidationEvent
+from app.services.quiz_versions import live_contents
+from app.services.search import memory_index
+
+@pytest.fixture(autouse=True)
+def database():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    if os.path.exists(settings.catalog_store_path):
+        os.remove(settings.catalog_store_path)
+    category_listing.clear()
+    live_contents.clear()
+    memory_index.invalidate([InvalidationEvent(entity="resync", entity_id=None, action="updated")])
+    yield
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+def login(client: TestClient, email: str, password: str = "pw") -> dict:
+    response = client.post("/auth/login", json={"email": email, "password": password})
+    assert response.status_code == 200, response.text
+    client.cookies.clear()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+def admin(client, db):
+    db.add(User(id=new_id(), name="Admin", email="admin@example.com", password=get_password_hash("pw"),
+                role=UserRole.admin))
+    db.commit()
+    return login(client, "admin@example.com")
+
+@pytest.fixture
+def user(client):
+    response = client.post("/auth/register", json={"name": "User", "email": "user@example.com", "password": "pw"})
+    assert response.status_code == 200, response.text
+    return login(client, "user@example.com")
+
+@pytest.fixture
+def make_quiz(client, admin):
+    """Crée un quiz publié de `questions` questions à trois réponses (la première est la bonne)"""
+    def make(title: str = "Quiz", questions: int = 3, level: str = "debutant", category_id: str = None) -> dict:
+        if category_id is None:
+            category_id = client.post("/categories/", json={"name": f"Category {title}"}, headers=admin).json()["id"]
+        quiz = client.post("/quizzes/", json={"title": title, "level": level, "category_id": category_id},
+                           headers=admin).json()
+        quiz["questions"] = []
+        for index in range(questions):
+            response = client.post(f"/quizzes/{quiz['id']}/questions", json={
+                "question_text": f"{title} question {index}",
+                "order": index,
+                "answers": [
+                    {"answer_text": f"answer {order}", "is_correct": order == 0, "order": order}
+                    for order in range(3)
+                ]
+            }, headers=admin)
+            assert response.status_code == 200, response.text
+            quiz["questions"].append(response.json())
+        response = client.post(f"/quizzes/{quiz['id']}/publish", headers=admin)
+        assert response.status_code == 200, response.text
+        return quiz
+    return make
+
+def correct_answers(questions: list) -> list:
+    """Soumission où chaque question reçoit sa bonne réponse (ordre 0)"""
+    return [
+        {"question_id": question["id"], "answer_ids": [a["id"] for a in question["answers"] if a["order"] == 0]}
+        for question in questions
+    ]
@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+from app.core import admission
+from app.core.admission import AdmissionController, AdmissionRejected, classify_request
+
+LIMITS = {"auth": 1, "attempts": 1, "catalog": 1, "admin": 1}
+
+def test_classify_request():
+    assert classify_request("POST", "/attempts/submit/x") == "attempts"
+    assert classify_request("GET", "/attempts/x") == "catalog"
+    assert classify_request("POST", "/auth/login") == "auth"
+    assert classify_request("GET", "/admin/stats") == "admin"
+    assert classify_request("GET", "/docs") is None
+
+def test_waiters_are_served_by_priority():
+    async def scenario():
+        controller = AdmissionController(1, {name: 1 for name in LIMITS}, queue_size=5, queue_timeout=1)
+        await controller.acquire("catalog")
+        order = []
+        async def wait(route_class):
+            await controller.acquire(route_class)
+            order.append(route_class)
+            controller.release(route_class)
+        tasks = [asyncio.ensure_future(wait(name)) for name in ("admin", "catalog", "attempts")]
+        await asyncio.sleep(0)
+        controller.release("catalog")
+        await asyncio.gather(*tasks)
+        return order, controller.active_total
+    assert asyncio.run(scenario()) == (["attempts", "catalog", "admin"], 0)
+
+def test_full_queue_and_timeout():
+    async def scenario():
+        controller = AdmissionController(1, LIMITS, queue_size=1, queue_timeout=0.01)
+        await controller.acquire("catalog")
+        waiter = asyncio.ensure_future(controller.acquire("catalog"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as full:
+            await controller.acquire("catalog")
+        with pytest.raises(AdmissionRejected) as timeout:
+            await waiter
+        return full.value.status_code, timeout.value.status_code, controller.queued["catalog"]
+    assert asyncio.run(scenario()) == (429, 503, 0)
+
+def test_slot_granted_at_timeout_is_released(monkeypatch):
+    async def scenario():
+        controller = AdmissionController(1, LIMITS, queue_size=5, queue_timeout=1)
+        await controller.acquire("catalog")
+        async def granted_then_timed_out(future, timeout):
+            # La place est accordée, puis l'attente expire quand même
+            controller.release("catalog")
+            raise asyncio.TimeoutError
+        monkeypatch.setattr(admission.asyncio, "wait_for", granted_then_timed_out)
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire("catalog")
+        return controller.active_total, controller.queued["catalog"]
+    assert asyncio.run(scenario()) == (0, 0)
@@ -0,0 +1,57 @@
+from app.services.answer_snapshot import Snapshot, build_snapshot, current_snapshot, distractors, summary, trends
+from tests.conftest import correct_answers
+
+def pick(question: dict, order: int) -> dict:
+    return {"question_id": question["id"], "answer_ids": [a["id"] for a in question["answers"] if a["order"] == order]}
+
+def submit(client, headers, quiz, answers) -> dict:
+    started = client.post(f"/attempts/start/{quiz['id']}", headers=headers).json()
+    response = client.post(f"/attempts/submit/{started['attempt_id']}", json={"answers": answers(started)},
+                           headers=headers)
+    assert response.status_code == 200, response.text
+    return started
+
+def test_snapshot_columns_and_reports(client, admin, user, make_quiz, db, tmp_path):
+    quiz = make_quiz(questions=2)
+    submit(client, user, quiz, lambda started: correct_answers(started["questions"]))
+    submit(client, admin, quiz, lambda started: [pick(question, 2) for question in started["questions"]])
+
+    manifest = build_snapshot(db, str(tmp_path))
+    assert manifest["rows"] == 4
+    snapshot = current_snapshot(str(tmp_path))
+    assert summary(snapshot)["correct_answer_rate"] == 0.5
+    assert summary(snapshot)["attempts"] == 2
+
+    question = quiz["questions"][0]
+    report = distractors(snapshot, question["id"])
+    assert (report["respondents"], report["failed"]) == (2, 1)
+    by_order = {a["id"]: a["order"] for a in question["answers"]}
+    rates = {by_order[answer["answer_id"]]: answer["pick_rate_among_failed"] for answer in report["answers"]}
+    assert rates == {0: 0.0, 2: 1.0}
+    assert [period["answered"] for period in trends(snapshot, quiz["id"])] == [4]
+
+    # Un nouvel instantané remplace le courant, l'ancien reste lisible
+    build_snapshot(db, str(tmp_path))
+    assert current_snapshot(str(tmp_path)).name != snapshot.name
+    assert Snapshot(str(tmp_path / snapshot.name), snapshot.name).rows == 4
+
+def test_snapshot_decodes_with_the_served_version(client, admin, user, make_quiz, db, tmp_path):
+    quiz = make_quiz(questions=1)
+    started = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+    question = started["questions"][0]
+    chosen = next(a["id"] for a in question["answers"] if a["order"] == 1)
+
+    # Les ordres des réponses changent après le démarrage, puis le quiz est republié
+    answers = [dict(answer_text=a["answer_text"], is_correct=a["is_correct"], order=(a["order"] + 1) % 3, id=a["id"])
+               for a in question["answers"]]
+    response = client.put(f"/questions/{question['id']}", json={
+        "question_text": question["question_text"], "order": question["order"], "answers": answers
+    }, headers=admin)
+    assert response.status_code == 200, response.text
+    client.post(f"/quizzes/{quiz['id']}/publish", headers=admin)
+
+    client.post(f"/attempts/submit/{started['attempt_id']}",
+                json={"answers": [{"question_id": question["id"], "answer_ids": [chosen]}]}, headers=user)
+    build_snapshot(db, str(tmp_path))
+    snapshot = current_snapshot(str(tmp_path))
+    assert [answer["answer_id"] for answer in distractors(snapshot, question["id"])["answers"]] == [chosen]
@@ -0,0 +1,68 @@
+from sqlalchemy import exists
+from sqlalchemy.dialects import postgresql
+from app.core.config import settings
+from app.models import UserQuizAttempt
+from app.services.answer_storage import (
+    MAX_ORDINAL, can_pack, encode_answers, pack_selection, question_has_answers, selections_reference,
+    unpack_selection
+)
+
+ORDERS = {"a": 0, "b": 1, "c": 5}
+
+def test_pack_unpack_round_trip():
+    mask = pack_selection(["c", "a"], ORDERS)
+    assert mask == 0b100001
+    assert unpack_selection(mask, ORDERS) == ["a", "c"]
+
+def test_pack_ignores_unknown_ids():
+    assert pack_selection(["a", "other"], ORDERS) == 1
+
+def test_unpack_follows_given_orders():
+    # Le même masque décode vers d'autres réponses si les ordres changent
+    assert unpack_selection(0b10, {"a": 1, "b": 0}) == ["a"]
+
+def test_can_pack_limits():
+    assert can_pack({"a": 0, "b": MAX_ORDINAL})
+    assert not can_pack({"a": MAX_ORDINAL + 1})
+    assert not can_pack({"a": -1})
+
+def test_can_pack_requires_distinct_orders():
+    assert not can_pack({"a": 0, "b": 0})
+
+def _graded(answer_orders, answer_ids=("b",)):
+    return [{"question_id": "q", "answer_ids": list(answer_ids), "is_correct": True, "answer_orders": answer_orders}]
+
+def test_encode_compact(monkeypatch):
+    monkeypatch.setattr(settings, "answer_storage", "compact")
+    selections, rows = encode_answers("attempt", _graded(ORDERS))
+    assert selections == {"q": [2, 1]}
+    assert rows == []
+
+def test_encode_falls_back_to_rows_on_duplicate_orders(monkeypatch):
+    monkeypatch.setattr(settings, "answer_storage", "compact")
+    selections, rows = encode_answers("attempt", _graded({"a": 0, "b": 0}))
+    assert selections is None
+    assert [(row["question_id"], row["answer_id"], row["is_correct"]) for row in rows] == [("q", "b", True)]
+
+def test_encode_rows_skips_foreign_answers(monkeypatch):
+    monkeypatch.setattr(settings, "answer_storage", "rows")
+    selections, rows = encode_answers("attempt", _graded(ORDERS, ("b", "other")))
+    assert selections is None
+    assert [row["answer_id"] for row in rows] == ["b"]
+
+def test_selections_reference_compiles_for_postgresql():
+    statement = exists().where(UserQuizAttempt.quiz_id == "quiz", selections_reference("question"))
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert "user_quiz_attempts.selections ?" in sql
+
+def test_question_has_answers_reads_compact_selections(client, user, make_quiz, db, monkeypatch):
+    monkeypatch.setattr(settings, "answer_storage", "compact")
+    quiz = make_quiz(questions=2)
+    started = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+    answered = started["questions"][0]
+    client.post(f"/attempts/submit/{started['attempt_id']}", json={"answers": [
+        {"question_id": answered["id"], "answer_ids": [answered["answers"][0]["id"]]}
+    ]}, headers=user)
+    unanswered = next(question for question in quiz["questions"] if question["id"] != answered["id"])
+    assert question_has_answers(db, answered["id"], quiz["id"])
+    assert not question_has_answers(db, unanswered["id"], quiz["id"])
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app.api import attempts as attempts_api
+from app.db.ids import new_id
+from app.models import ArchivedAttempt, UserQuizAttempt
+from app.services.attempt_archive import archive_attempts, archived_passed_quiz_ids, decode_payload
+from app.services.attempt_expiry import sweep
+from tests.conftest import correct_answers
+
+def test_start_resumes_open_attempt(client, user, make_quiz):
+    quiz = make_quiz()
+    first = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+    again = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+    assert again["attempt_id"] == first["attempt_id"]
+
+    response = client.post(f"/attempts/submit/{first['attempt_id']}",
+                           json={"answers": correct_answers(first["questions"])}, headers=user)
+    assert response.status_code == 200, response.text
+    assert response.json()["score"] == 100
+    assert client.post(f"/attempts/start/{quiz['id']}", headers=user).json()["attempt_id"] != first["attempt_id"]
+
+def test_concurrent_start_returns_existing_attempt(client, user, make_quiz, db, monkeypatch):
+    quiz = make_quiz()
+    existing = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()["attempt_id"]
+
+    # Démarrage concurrent : la tentative n'était pas encore visible à la première lecture,
+    # l'insertion bute sur l'index unique des tentatives ouvertes
+    lookups = []
+    find_open_attempt = attempts_api.find_open_attempt
+    def racing(*args):
+        lookups.append(args)
+        return None if len(lookups) == 1 else find_open_attempt(*args)
+    monkeypatch.setattr(attempts_api, "find_open_attempt", racing)
+
+    response = client.post(f"/attempts/start/{quiz['id']}", headers=user)
+    assert response.status_code == 200, response.text
+    assert response.json()["attempt_id"] == existing
+    assert len(lookups) == 2
+    assert db.query(UserQuizAttempt).filter(UserQuizAttempt.quiz_id == quiz["id"]).count() == 1
+
+def test_expired_attempt(client, user, make_quiz, db):
+    quiz = make_quiz()
+    started = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+    db.execute(update(UserQuizAttempt).where(UserQuizAttempt.id == started["attempt_id"]).values(
+        expires_at=datetime.utcnow() - timedelta(minutes=1)
+    ))
+    db.commit()
+
+    response = client.post(f"/attempts/submit/{started['attempt_id']}",
+                           json={"answers": correct_answers(started["questions"])}, headers=user)
+    assert response.status_code == 410
+    assert db.get(UserQuizAttempt, started["attempt_id"]).expired_at is not None
+    assert client.post(f"/attempts/start/{quiz['id']}", headers=user).json()["attempt_id"] != started["attempt_id"]
+
+def test_sweep_expires_overdue_attempts_in_batches(make_quiz, db):
+    quiz = make_quiz()
+    now = datetime.utcnow()
+    overdue = [UserQuizAttempt(id=new_id(), quiz_id=quiz["id"], expires_at=now - timedelta(minutes=minutes))
+               for minutes in (1, 2, 3)]
+    pending = UserQuizAttempt(id=new_id(), quiz_id=quiz["id"], expires_at=now + timedelta(minutes=5))
+    submitted = UserQuizAttempt(id=new_id(), quiz_id=quiz["id"], expires_at=now - timedelta(minutes=5),
+                                completed_at=now - timedelta(minutes=10), score=100)
+    db.add_all(overdue + [pending, submitted])
+    db.commit()
+
+    assert sweep(db, batch_size=2, max_batches=1, now=now) == 2
+    assert sweep(db, batch_size=2, now=now) == 1
+    assert sweep(db, batch_size=2, now=now) == 0
+    expired = {row.id for row in db.query(UserQuizAttempt.id).filter(UserQuizAttempt.expired_at != None)}
+    assert expired == {attempt.id for attempt in overdue}
+
+
+def test_archive_keeps_history_and_guards(client, admin, user, make_quiz, db):
+    quiz = make_quiz()
+    started = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+    client.post(f"/attempts/submit/{started['attempt_id']}",
+                json={"answers": correct_answers(started["questions"])}, headers=user)
+    db.execute(update(UserQuizAttempt).where(UserQuizAttempt.id == started["attempt_id"]).values(
+        completed_at=datetime.utcnow() - timedelta(days=800)
+    ))
+    db.commit()
+
+    # Une tentative récente et une tentative en cours restent dans les tables chaudes
+    other = make_quiz("Other")
+    recent = client.post(f"/attempts/start/{other['id']}", headers=user).json()
+    client.post(f"/attempts/submit/{recent['attempt_id']}", json={"answers": []}, headers=user)
+    client.post(f"/attempts/start/{other['id']}", headers=user)
+
+    assert archive_attempts(db, older_than_days=365) == 1
+    assert db.query(UserQuizAttempt).count() == 2
+    archived = db.query(ArchivedAttempt).filter(ArchivedAttempt.id == started["attempt_id"]).one()
+    assert archived.quiz_id == quiz["id"] and archived.passed
+    assert decode_payload(archived.payload)["result"]["score"] == 100
+
+    assert started["attempt_id"] not in [entry["id"] for entry in client.get("/attempts/attempts", headers=user).json()]
+    history = client.get("/attempts/attempts?include_archived=true", headers=user).json()
+    assert [entry["id"] for entry in history][-1] == started["attempt_id"]
+
+    detail = client.get(f"/attempts/{started['attempt_id']}", headers=user)
+    assert detail.status_code == 200, detail.text
+    selected = [
+        [answer["user_selected"] for answer in question["answers"]]
+        for question in detail.json()["data"]["questions_with_answers"]
+    ]
+    assert all(row[0] and not any(row[1:]) for row in selected)
+
+    user_id = client.get("/auth/me", headers=user).json()["id"]
+    assert archived_passed_quiz_ids(db, user_id, [quiz["id"]], 80) == {quiz["id"]}
+    assert client.delete(f"/questions/{quiz['questions'][0]['id']}", headers=admin).status_code == 400
+    assert client.delete(f"/quizzes/{quiz['id']}", headers=admin).status_code == 400
@@ -0,0 +1,41 @@
+import os
+import time
+from app.core.config import settings
+from app.services.catalog_store import CatalogStore, catalog, ensure_catalog, file_generation, write_catalog
+
+def test_store_reads_records_and_follows_replacements(tmp_path):
+    path = str(tmp_path / "catalog.bin")
+    store = CatalogStore(path)
+    assert store.get("categories", []) == []
+
+    write_catalog(path, {"categories": [{"id": "c1"}], "category:c1": {"id": "c1", "name": "Café"}}, generation=1)
+    assert store.get("category:c1") == {"id": "c1", "name": "Café"}
+    assert store.stats()["keys"] == 2
+
+    write_catalog(path, {"categories": []}, generation=2)
+    assert store.get("category:c1") is None
+    assert store.generation == 2
+
+def test_catalog_follows_published_content(client, make_quiz):
+    quiz = make_quiz("Catalogued")
+    record = catalog.get(f"quiz:{quiz['id']}")
+    assert record["title"] == "Catalogued"
+    content = catalog.get(f"version:{record['current_version_id']}")
+    assert [question["id"] for question in content["questions"]] == [q["id"] for q in quiz["questions"]]
+    assert any(category["id"] == quiz["category_id"] for category in catalog.get("categories"))
+
+def test_ensure_catalog_rebuilds_a_stale_file(db):
+    write_catalog(settings.catalog_store_path, {"categories": []}, generation=1)
+    ensure_catalog(db)
+    rebuilt = file_generation(settings.catalog_store_path)
+    assert rebuilt > 1
+
+    # Un catalogue construit depuis le lancement est conservé
+    ensure_catalog(db)
+    assert file_generation(settings.catalog_store_path) == rebuilt
+
+def test_missing_catalog_is_built_at_startup(db):
+    assert not os.path.exists(settings.catalog_store_path)
+    before = time.time_ns()
+    ensure_catalog(db)
+    assert file_generation(settings.catalog_store_path) >= before
@@ -0,0 +1,55 @@
+from app.models import Answer, Question, QuizVersion, User, UserProgress, UserQuizAttempt, UserStats
+from tests.conftest import correct_answers
+
+def complete_attempt(client, headers, quiz) -> dict:
+    started = client.post(f"/attempts/start/{quiz['id']}", headers=headers).json()
+    response = client.post(f"/attempts/submit/{started['attempt_id']}",
+                           json={"answers": correct_answers(started["questions"])}, headers=headers)
+    assert response.status_code == 200, response.text
+    return started
+
+def test_delete_user_removes_dependent_rows(client, admin, user, make_quiz, db):
+    complete_attempt(client, user, make_quiz())
+    user_id = db.query(User.id).filter(User.email == "user@example.com").scalar()
+    assert db.query(UserQuizAttempt).count() == 1 and db.query(UserStats).count() == 1
+
+    response = client.delete(f"/admin/users/{user_id}", headers=admin)
+    assert response.status_code == 200, response.text
+    assert db.query(User).filter(User.id == user_id).count() == 0
+    for model in (UserQuizAttempt, UserProgress, UserStats):
+        assert db.query(model).filter(model.user_id == user_id).count() == 0
+
+    assert client.delete(f"/admin/users/{user_id}", headers=admin).status_code == 404
+
+def test_delete_quiz_guard_and_cascade(client, admin, user, make_quiz, db):
+    answered, unanswered = make_quiz("Answered"), make_quiz("Unanswered")
+    complete_attempt(client, user, answered)
+
+    response = client.delete(f"/quizzes/{answered['id']}", headers=admin)
+    assert response.status_code == 400
+
+    response = client.delete(f"/quizzes/{unanswered['id']}", headers=admin)
+    assert response.status_code == 200, response.text
+    question_ids = [question["id"] for question in unanswered["questions"]]
+    assert db.query(Question).filter(Question.quiz_id == unanswered["id"]).count() == 0
+    assert db.query(Answer).filter(Answer.question_id.in_(question_ids)).count() == 0
+    assert db.query(QuizVersion).filter(QuizVersion.quiz_id == unanswered["id"]).count() == 0
+    assert db.query(Question).filter(Question.quiz_id == answered["id"]).count() == 3
+
+def test_delete_question_guard(client, admin, user, make_quiz, db):
+    quiz = make_quiz(questions=2)
+    first, second = quiz["questions"]
+    started = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+    client.post(f"/attempts/submit/{started['attempt_id']}",
+                json={"answers": correct_answers([q for q in started["questions"] if q["id"] == first["id"]])},
+                headers=user)
+
+    assert client.delete(f"/questions/{first['id']}", headers=admin).status_code == 400
+    assert client.delete(f"/questions/{second['id']}", headers=admin).status_code == 200
+    assert db.query(Answer).filter(Answer.question_id == second["id"]).count() == 0
+
+def test_delete_category_with_quizzes_is_rejected(client, admin, make_quiz):
+    quiz = make_quiz()
+    assert client.delete(f"/categories/{quiz['category_id']}", headers=admin).status_code == 400
+    empty = client.post("/categories/", json={"name": "Empty"}, headers=admin).json()
+    assert client.delete(f"/categories/{empty['id']}", headers=admin).status_code == 200
@@ -0,0 +1,69 @@
+from app.models import UserQuizAttempt
+from app.services.grading import build_answer_key, grade_matrix
+
+def _question(question_id, correct, count=3):
+    return {
+        "id": question_id,
+        "answers": [
+            {"id": f"{question_id}{index}", "order": index, "is_correct": index in correct}
+            for index in range(count)
+        ]
+    }
+
+QUESTIONS = [_question("a", {0}), _question("b", {0, 2}), _question("c", {1}, count=2)]
+
+def test_sentinel_columns():
+    key = build_answer_key(QUESTIONS)
+    assert list(key.starts) == [0, 4, 8]
+    assert key.sentinel_of == [3, 7, 10]
+    assert not key.key[key.sentinel_of].any()
+
+def test_grade_matrix():
+    key = build_answer_key(QUESTIONS)
+    submissions = [
+        # tout juste
+        [{"question_id": "a", "answer_ids": ["a0"]}, {"question_id": "b", "answer_ids": ["b2", "b0"]},
+         {"question_id": "c", "answer_ids": ["c1"]}],
+        # b incomplète, c non répondue
+        [{"question_id": "a", "answer_ids": ["a0"]}, {"question_id": "b", "answer_ids": ["b0"]}],
+        # réponse d'une autre question : la sentinelle rend la question fausse
+        [{"question_id": "a", "answer_ids": ["a0", "b0"]}, {"question_id": "c", "answer_ids": ["c1"]}],
+        # question inconnue ignorée, réponse en trop
+        [{"question_id": "zzz", "answer_ids": ["a0"]}, {"question_id": "c", "answer_ids": ["c0", "c1"]}],
+    ]
+    assert grade_matrix(key, submissions).tolist() == [
+        [True, True, True],
+        [True, False, False],
+        [False, False, True],
+        [False, False, False],
+    ]
+
+def test_last_question_sentinel_is_its_own():
+    # La sentinelle de la dernière question est la dernière colonne : reduceat ne doit pas la perdre
+    key = build_answer_key(QUESTIONS)
+    result = grade_matrix(key, [[{"question_id": "c", "answer_ids": ["c1", "a0"]}]])
+    assert result.tolist() == [[False, False, False]]
+
+def test_empty_answer_key():
+    key = build_answer_key([])
+    assert grade_matrix(key, [[], []]).shape == (2, 0)
+
+def test_grade_batch_endpoint(client, admin, user, make_quiz, db):
+    quiz = make_quiz(questions=2)
+    user_id = client.get("/auth/me", headers=user).json()["id"]
+    first, second = quiz["questions"]
+    response = client.post(f"/admin/quizzes/{quiz['id']}/grade-batch", json={"submissions": [
+        {"user_id": user_id, "answers": [
+            {"question_id": first["id"], "answer_ids": [first["answers"][0]["id"]]},
+            {"question_id": second["id"], "answer_ids": [second["answers"][1]["id"]]},
+        ]},
+        {"user_id": "00000000-0000-0000-0000-000000000000", "answers": []},
+        {"user_id": "not-a-uuid", "answers": []},
+    ]}, headers=admin)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [(result["user_id"], result["score"], result["passed"]) for result in body["results"]] == [
+        (user_id, 50.0, False)
+    ]
+    assert [error["index"] for error in body["errors"]] == [1, 2]
+    assert db.query(UserQuizAttempt).filter(UserQuizAttempt.user_id == user_id).count() == 1
@@ -0,0 +1,32 @@
+import uuid
+import pytest
+from sqlalchemy.exc import StatementError
+from app.db.ids import InvalidIdentifier, new_id, uuid7
+from app.models import Category
+
+def test_uuid7_is_time_ordered():
+    values = [uuid7() for _ in range(2000)]
+    assert values == sorted(values)
+    assert all(value.version == 7 for value in values)
+    assert len(set(values)) == len(values)
+
+def test_invalid_identifier_is_not_written_as_null(db):
+    db.add(Category(id="not-a-uuid", name="Broken"))
+    with pytest.raises(StatementError) as error:
+        db.commit()
+    assert isinstance(error.value.orig, InvalidIdentifier)
+
+def test_valid_identifier_round_trip(db):
+    category_id = new_id()
+    db.add(Category(id=category_id, name="Python"))
+    db.commit()
+    assert str(uuid.UUID(db.query(Category.id).scalar())) == category_id
+
+def test_invalid_path_id_is_not_found(client, admin):
+    assert client.get("/questions/not-a-uuid", headers=admin).status_code == 404
+    assert client.delete("/quizzes/not-a-uuid", headers=admin).status_code == 404
+
+def test_invalid_body_id_is_rejected(client, admin):
+    response = client.post("/quizzes/", json={"title": "Q", "level": "debutant", "category_id": "not-a-uuid"},
+                           headers=admin)
+    assert response.status_code == 422
@@ -0,0 +1,52 @@
+import pytest
+from app.services import invalidation
+from app.services.invalidation import InvalidationEvent, dispatch, notify_change, subscribe
+from app.services.quiz_versions import live_contents, live_questions
+
+@pytest.fixture
+def received():
+    events = []
+    subscribe(("quiz",), events.extend)
+    yield events
+    invalidation._subscribers.pop()
+
+def test_events_are_dispatched_on_commit_only(db, received):
+    notify_change(db, "quiz", "q1", "updated")
+    notify_change(db, "category", "c1", "updated")
+    db.commit()
+    assert [(item.entity, item.entity_id) for item in received] == [("quiz", "q1")]
+
+    notify_change(db, "quiz", "q2", "deleted")
+    db.rollback()
+    db.commit()
+    assert len(received) == 1
+
+def test_resync_reaches_every_subscriber(received):
+    dispatch([InvalidationEvent(entity="resync", entity_id=None, action="updated")])
+    assert [item.entity for item in received] == ["resync"]
+
+def test_event_round_trip_and_validation(db):
+    item = InvalidationEvent(entity="question", entity_id="x", action="created", quiz_id="q", origin="host:1:ab")
+    assert InvalidationEvent.from_json(item.to_json()) == item
+    with pytest.raises(ValueError):
+        notify_change(db, "answer", "x", "updated")
+
+def test_question_edit_evicts_live_content(client, admin, make_quiz, db):
+    quiz = make_quiz(questions=1)
+    live_questions(db, quiz["id"])
+    assert live_contents.get(("live", quiz["id"])) is not None
+
+    question = quiz["questions"][0]
+    answers = [dict(answer_text=a["answer_text"], is_correct=a["is_correct"], order=a["order"], id=a["id"])
+               for a in question["answers"]]
+    client.put(f"/questions/{question['id']}", json={"question_text": "Edited", "order": 0, "answers": answers},
+               headers=admin)
+    assert live_contents.get(("live", quiz["id"])) is None
+    assert live_questions(db, quiz["id"])[0]["question_text"] == "Edited"
+
+def test_savepoint_rollback_keeps_pending_events(db, received):
+    notify_change(db, "quiz", "q1", "updated")
+    savepoint = db.begin_nested()
+    savepoint.rollback()
+    db.commit()
+    assert [item.entity_id for item in received] == ["q1"]
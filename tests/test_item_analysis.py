@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+import numpy as np
+from app.db.ids import new_id
+from app.models import QuestionStats, UserQuizAttempt
+from app.services.item_analysis import compute_quiz_analysis, correctness_matrix, discrimination_indices
+
+def test_discrimination_ignores_attempts_that_did_not_serve_the_question():
+    scores = np.array([10, 20, 30, 40, 50, 60, 70, 80, 90, 100], dtype=float)
+    # Question 0 servie partout, réussie par la moitié haute ; question 1 servie à la
+    # seule moitié haute, toujours réussie
+    correct = np.zeros((10, 2), dtype=bool)
+    correct[5:, :] = True
+    served = np.ones((10, 2), dtype=bool)
+    served[:5, 1] = False
+
+    assert discrimination_indices(scores, correct, served).tolist() == [1.0, 0.0]
+    # Sans masque, les tentatives qui n'ont pas vu la question la « ratent »
+    assert discrimination_indices(scores, correct).tolist() == [1.0, 1.0]
+    assert np.isnan(discrimination_indices(scores[:3], correct[:3])).all()
+
+def test_correctness_matrix_builds_served_mask(db, make_quiz):
+    quiz = make_quiz(questions=3)
+    question_ids = [question["id"] for question in quiz["questions"]]
+    now = datetime.utcnow()
+    db.add_all([
+        UserQuizAttempt(id=new_id(), quiz_id=quiz["id"], score=100, completed_at=now,
+                        selections={question_ids[0]: [1, True], question_ids[2]: [1, True]},
+                        question_ids=[question_ids[0], question_ids[2]]),
+        UserQuizAttempt(id=new_id(), quiz_id=quiz["id"], score=0, completed_at=now - timedelta(minutes=1),
+                        selections={question_id: [2, False] for question_id in question_ids}),
+    ])
+    db.commit()
+
+    scores, correct, served = correctness_matrix(db, quiz["id"], question_ids)
+    assert scores.tolist() == [100, 0]
+    assert correct.tolist() == [[True, False, True], [False, False, False]]
+    assert served.tolist() == [[True, False, True], [True, True, True]]
+
+def test_item_analysis_from_submissions(client, admin, user, make_quiz, db):
+    quiz = make_quiz(questions=2)
+    started = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+    first, second = started["questions"]
+    answers = [
+        {"question_id": first["id"], "answer_ids": [a["id"] for a in first["answers"] if a["order"] == 0]},
+        {"question_id": second["id"], "answer_ids": [a["id"] for a in second["answers"] if a["order"] == 1]},
+    ]
+    response = client.post(f"/attempts/submit/{started['attempt_id']}", json={"answers": answers}, headers=user)
+    assert response.status_code == 200, response.text
+
+    stats = {row.question_id: row for row in db.query(QuestionStats)}
+    assert (stats[first["id"]].times_shown, stats[first["id"]].times_correct) == (1, 1)
+    assert (stats[second["id"]].times_shown, stats[second["id"]].times_correct) == (1, 0)
+
+    assert compute_quiz_analysis(db, quiz["id"]) == 2
+    data = client.get(f"/admin/quizzes/{quiz['id']}/item-analysis", headers=admin).json()["data"]
+    by_id = {item["question_id"]: item for item in data}
+    assert by_id[first["id"]]["difficulty"] == 1.0 and by_id[first["id"]]["flags"] == ["too_easy"]
+    assert by_id[second["id"]]["difficulty"] == 0.0
+    assert by_id[second["id"]]["flags"] == ["too_hard", "misleading_distractor"]
+    picked = {answer["times_picked"] for answer in by_id[second["id"]]["answers"] if answer["is_correct"]}
+    assert picked == {0}
@@ -0,0 +1,63 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from app.db.ids import new_id
+from app.db.loader import loader
+from app.db.session import engine
+from app.models import Category, Quiz
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+def test_queued_keys_are_loaded_in_one_query(db):
+    ids = [new_id() for _ in range(3)]
+    db.add_all([Category(id=category_id, name=f"Category {index}") for index, category_id in enumerate(ids)])
+    db.commit()
+    missing = new_id()
+
+    categories = loader(db, Category).queue(ids + [missing, ids[0], None])
+    with count_statements() as statements:
+        names = [category.name for category in categories.load_many(ids)]
+        assert categories.load(missing) is None
+        assert loader(db, Category) is categories
+    assert names == ["Category 0", "Category 1", "Category 2"]
+    assert len(statements) == 1
+
+    # Oubliés au commit
+    db.commit()
+    assert loader(db, Category) is not categories
+
+def test_many_loader_groups_rows_by_key(db, make_quiz):
+    first, second = make_quiz("First"), make_quiz("Second")
+    by_category = loader(db, Quiz, Quiz.category_id, many=True)
+    by_category.queue([first["category_id"], second["category_id"]])
+    assert [quiz.title for quiz in by_category.load(first["category_id"])] == ["First"]
+    assert [quiz.title for quiz in by_category.load(second["category_id"])] == ["Second"]
+    assert by_category.load(new_id()) == []
+
+def test_attempt_history_query_count_is_constant(client, user, make_quiz):
+    def history_statements():
+        with count_statements() as statements:
+            response = client.get("/attempts/attempts", headers=user)
+        assert response.status_code == 200
+        return len(statements), len(response.json())
+
+    quiz = make_quiz("One")
+    client.post(f"/attempts/start/{quiz['id']}", headers=user)
+    one = history_statements()
+    for title in ("Two", "Three", "Four"):
+        quiz = make_quiz(title)
+        client.post(f"/attempts/start/{quiz['id']}", headers=user)
+    four = history_statements()
+    assert (one[1], four[1]) == (1, 4)
+    assert one[0] == four[0]
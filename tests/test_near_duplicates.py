@@ -0,0 +1,47 @@
+from app.models import QuestionLshBucket, QuestionSignature
+from app.services.near_duplicates import normalize, reindex_all, signature, similarity
+
+def question_payload(text: str, order: int) -> dict:
+    return {"question_text": text, "order": order,
+            "answers": [{"answer_text": "yes", "is_correct": True, "order": 0}]}
+
+def test_signatures_estimate_similarity():
+    assert normalize("Quelle est la capitale de l'Égypte ?") == "quelle est la capitale de l egypte"
+    first = signature("What is the capital city of France?")
+    assert similarity(first, signature("what is the capital city of France")) == 1.0
+    assert similarity(first, signature("What is the capital city of Spain?")) > 0.5
+    assert similarity(first, signature("How many legs does a spider have?")) < 0.2
+    assert signature(" ?! ") is None
+
+def test_similar_questions_are_found_through_the_buckets(client, admin, make_quiz, db):
+    quiz = make_quiz(questions=0)
+    created = [
+        client.post(f"/quizzes/{quiz['id']}/questions", json=question_payload(text, order), headers=admin).json()
+        for order, text in enumerate([
+            "Which planet is known as the red planet?",
+            "Which planet is known as the Red Planet ?",
+            "Who painted the Mona Lisa?",
+        ])
+    ]
+    response = client.get(f"/admin/questions/{created[0]['id']}/similar", headers=admin).json()
+    assert [match["question_id"] for match in response["data"]] == [created[1]["id"]]
+    assert response["data"][0]["similarity"] == 1.0
+
+    # Le remplissage initial reconstruit les mêmes seaux
+    buckets = db.query(QuestionLshBucket).count()
+    assert reindex_all(db) == 3
+    assert db.query(QuestionSignature).count() == 3 and db.query(QuestionLshBucket).count() == buckets
+
+def test_dedupe_report_checks_the_bank_and_the_batch(client, admin, make_quiz):
+    quiz = make_quiz(questions=0)
+    client.post(f"/quizzes/{quiz['id']}/questions",
+                json=question_payload("What is the boiling point of water at sea level?", 0), headers=admin)
+    response = client.post("/admin/questions/dedupe-report", json={"questions": [
+        {"question_text": "What is the boiling point of water at sea level"},
+        {"question_text": "Name the largest ocean on Earth."},
+        {"question_text": "Name the largest ocean on Earth"},
+    ]}, headers=admin).json()
+    items = response["data"]
+    assert len(items[0]["existing"]) == 1 and items[0]["batch_duplicates"] == []
+    assert items[1]["existing"] == [] and items[1]["batch_duplicates"] == [2]
+    assert response["meta"]["with_existing_duplicates"] == 1 and response["meta"]["with_batch_duplicates"] == 2
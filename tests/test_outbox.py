@@ -0,0 +1,105 @@
+import time
+import pytest
+from app.core.config import settings
+from app.models import OutboxCursor, OutboxEvent
+from app.services import outbox
+from app.services.outbox import (
+    ATTEMPT_COMPLETED, USER_REGISTERED, Sink, consumer_status, emit, get_queue, make_sink, purge, relay,
+    start_relay, stop_relay
+)
+
+class FailingSink(Sink):
+    def deliver(self, events):
+        raise ConnectionError("unreachable")
+
+def _drain(name):
+    events, queue = [], get_queue(name)
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+def _add(db, event_id, transaction_id):
+    db.add(OutboxEvent(id=event_id, event_type="test", aggregate_id=None, payload={"n": event_id},
+                       transaction_id=transaction_id))
+
+def test_relay_follows_commit_order(db):
+    # L'événement 1 appartient à une transaction validée après celle des événements 2 et 3
+    _add(db, 1, 20)
+    _add(db, 2, 10)
+    _add(db, 3, 10)
+    db.commit()
+
+    assert relay(db, "ordering", make_sink("queue:ordering"), batch_size=2) == 3
+    assert [event["id"] for event in _drain("ordering")] == [2, 3, 1]
+    cursor = db.get(OutboxCursor, "ordering")
+    assert (cursor.transaction_id, cursor.position, cursor.delivered_count) == (20, 1, 3)
+
+    # Un événement d'id plus petit mais de transaction plus récente est encore livré
+    _add(db, 0, 30)
+    db.commit()
+    assert relay(db, "ordering", make_sink("queue:ordering")) == 1
+    assert [event["id"] for event in _drain("ordering")] == [0]
+
+def test_failed_delivery_keeps_cursor(db):
+    emit(db, ATTEMPT_COMPLETED, None, {"score": 100})
+    db.commit()
+    with pytest.raises(ConnectionError):
+        relay(db, "broken", FailingSink())
+    cursor = db.get(OutboxCursor, "broken")
+    assert cursor.position == 0 and "unreachable" in cursor.last_error
+
+    assert relay(db, "broken", make_sink("queue:broken")) == 1
+    db.refresh(cursor)
+    assert cursor.last_error is None and cursor.delivered_count == 1
+    _drain("broken")
+
+def test_purge_keeps_undelivered_events(db, monkeypatch):
+    for index in range(3):
+        emit(db, USER_REGISTERED, None, {"n": index})
+    db.commit()
+    monkeypatch.setattr(settings, "outbox_consumers", {"slow": "queue:slow"})
+    monkeypatch.setattr(settings, "outbox_retention_days", -1)
+
+    relay(db, "slow", make_sink("queue:slow"), batch_size=2, max_batches=1)
+    assert [entry["lag"] for entry in consumer_status(db)] == [1]
+    assert purge(db) == 2
+    assert [event.payload["n"] for event in db.query(OutboxEvent)] == [2]
+    _drain("slow")
+
+def test_relay_purges_without_consumers(db, monkeypatch):
+    emit(db, USER_REGISTERED, None, {"n": 0})
+    db.commit()
+    monkeypatch.setattr(settings, "outbox_consumers", {})
+    assert purge(db) == 0
+
+    monkeypatch.setattr(settings, "outbox_retention_days", -1)
+    monkeypatch.setattr(settings, "outbox_relay_enabled", True)
+    monkeypatch.setattr(settings, "outbox_relay_interval", 0.01)
+    start_relay()
+    thread = outbox._relay
+    try:
+        deadline = time.monotonic() + 5
+        while db.query(OutboxEvent).count() and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        stop_relay()
+        thread.join()
+    assert db.query(OutboxEvent).count() == 0
+
+def test_registration_and_submit_emit_events(client, user, make_quiz, admin, db):
+    quiz = make_quiz(questions=1)
+    started = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+    client.post(f"/attempts/submit/{started['attempt_id']}", json={"answers": []}, headers=user)
+    types = [event.event_type for event in db.query(OutboxEvent).order_by(OutboxEvent.id)]
+    assert USER_REGISTERED in types and ATTEMPT_COMPLETED in types
+
+    feed, cursor = [], None
+    while True:
+        response = client.get("/admin/events?limit=1" + (f"&cursor={cursor}" if cursor else ""), headers=admin)
+        assert response.status_code == 200, response.text
+        if not response.json()["data"]:
+            break
+        feed += [event["type"] for event in response.json()["data"]]
+        cursor = response.json()["meta"]["next_cursor"]
+    assert feed == types
+    assert client.get("/admin/events?cursor=WyJhIiwxXQ", headers=admin).status_code == 400
@@ -0,0 +1,67 @@
+import pytest
+from fastapi import HTTPException
+from app.api.pagination import ListParams, decode_cursor, encode_cursor, paginate_records
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor([3, "abc"]), (int, str)) == (3, "abc")
+
+@pytest.mark.parametrize("cursor", [
+    encode_cursor([1, 2]),  # types inattendus
+    encode_cursor([1]),  # taille
+    "e30",  # {}
+    "!!",  # base64 invalide
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, (int, str))
+    assert error.value.status_code == 400
+
+def test_bool_is_not_an_int():
+    with pytest.raises(HTTPException):
+        decode_cursor(encode_cursor([True]), (int,))
+
+def test_paginate_records_keyset():
+    records = [{"name": name, "id": str(index)} for index, name in enumerate("dbca")]
+    key = lambda record: (record["name"], record["id"])
+    seen, cursor = [], None
+    while True:
+        page, cursor = paginate_records(records, key, ListParams(limit=3, cursor=cursor, fields=None))
+        seen += [record["name"] for record in page]
+        if cursor is None:
+            break
+    assert seen == ["a", "b", "c", "d"]
+
+def test_paginate_records_rejects_mistyped_cursor():
+    records = [{"name": "a", "id": "1"}]
+    with pytest.raises(HTTPException):
+        paginate_records(records, lambda record: (record["name"], record["id"]),
+                         ListParams(limit=1, cursor=encode_cursor([1, 2]), fields=None))
+
+def test_question_pages_by_cursor(client, admin, make_quiz):
+    quiz = make_quiz(questions=5)
+    seen, cursor = [], None
+    while True:
+        url = f"/questions/?quiz_id={quiz['id']}&limit=2" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url, headers=admin)
+        assert response.status_code == 200, response.text
+        seen += [question["id"] for question in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == [question["id"] for question in quiz["questions"]]
+
+def test_question_list_errors(client, admin, make_quiz):
+    make_quiz(questions=1)
+    assert client.get(f"/questions/?limit=2&cursor={encode_cursor([1, 2])}", headers=admin).status_code == 400
+    assert client.get(f"/questions/?limit=2&cursor={encode_cursor([0, 'not-a-uuid'])}",
+                      headers=admin).status_code == 400
+    assert client.get("/questions/?fields=id,unknown", headers=admin).status_code == 400
+    assert client.get("/questions/?q=question&limit=2", headers=admin).status_code == 400
+    assert client.get("/questions/?page=2", headers=admin).status_code == 400
+    assert client.get("/questions/?q=question&page=1&per_page=5", headers=admin).status_code == 200
+
+def test_sparse_fieldsets(client, admin, make_quiz):
+    quiz = make_quiz(questions=2)
+    response = client.get(f"/questions/?quiz_id={quiz['id']}&limit=5&fields=id,question_text", headers=admin)
+    assert response.status_code == 200, response.text
+    assert [sorted(question) for question in response.json()] == [["id", "question_text"]] * 2
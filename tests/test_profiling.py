@@ -0,0 +1,36 @@
+import json
+import pytest
+from app.core.config import settings
+from app.core.profiling import SqlTimings
+
+@pytest.fixture
+def profiling(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "profiling_enabled", True)
+    monkeypatch.setattr(settings, "profiling_sample_rate", 0.0)
+    monkeypatch.setattr(settings, "profiling_output_dir", str(tmp_path))
+    return tmp_path
+
+def test_admin_request_is_profiled(client, admin, profiling):
+    response = client.get("/categories/", headers={**admin, "X-Profile": "1"})
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-Id"]
+
+    metadata = json.loads((profiling / f"{profile_id}.json").read_text())
+    assert (metadata["method"], metadata["path"], metadata["status"]) == ("GET", "/categories/", 200)
+    assert metadata["sql"]["count"] >= 1
+    assert (profiling / f"{profile_id}.collapsed").exists()
+
+def test_profile_header_requires_an_admin(client, user, profiling):
+    for headers in ({**user, "X-Profile": "1"}, {"X-Profile": "1"}):
+        response = client.get("/categories/", headers=headers)
+        assert "X-Profile-Id" not in response.headers
+    assert list(profiling.iterdir()) == []
+
+def test_sql_timings_group_statements():
+    timings = SqlTimings()
+    timings.add("SELECT 1", 0.002)
+    timings.add("SELECT  1", 0.001)
+    timings.add("SELECT 2", 0.010)
+    summary = timings.summary(limit=1)
+    assert (summary["count"], summary["total_ms"]) == (3, 13.0)
+    assert summary["statements"] == [{"statement": "SELECT 2", "count": 1, "total_ms": 10.0}]
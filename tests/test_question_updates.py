@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+from app.api.questions import diff_answers
+from app.schemas import AnswerUpdate
+from tests.conftest import correct_answers
+
+def stored(id: str, order: int, text: str = "answer", is_correct: bool = False):
+    return SimpleNamespace(id=id, order=order, answer_text=text, is_correct=is_correct)
+
+def test_diff_answers_matches_by_id_then_order():
+    existing = [stored("a", 0, is_correct=True), stored("b", 1), stored("c", 2)]
+    incoming = [
+        AnswerUpdate(id="a", answer_text="answer", is_correct=True, order=0),  # inchangée
+        AnswerUpdate(answer_text="renamed", is_correct=False, order=1),  # associée à b par l'ordre
+        AnswerUpdate(answer_text="new", is_correct=False, order=3),
+    ]
+    updates, inserts, deleted_ids = diff_answers(existing, incoming)
+    assert updates == [{"answer_text": "renamed", "is_correct": False, "order": 1, "id": "b"}]
+    assert [row["answer_text"] for row in inserts] == ["new"] and inserts[0]["id"]
+    assert deleted_ids == ["c"]
+
+def question_body(question: dict, answers: list) -> dict:
+    return {"question_text": question["question_text"], "order": question["order"], "answers": answers}
+
+def test_update_keeps_answer_ids(client, admin, make_quiz):
+    question = make_quiz(questions=1)["questions"][0]
+    answers = [dict(answer_text=a["answer_text"], is_correct=a["is_correct"], order=a["order"], id=a["id"])
+               for a in question["answers"]]
+    answers[1]["answer_text"] = "edited"
+
+    response = client.put(f"/questions/{question['id']}", json=question_body(question, answers), headers=admin)
+    assert response.status_code == 200, response.text
+    updated = {answer["id"]: answer["answer_text"] for answer in response.json()["answers"]}
+    assert set(updated) == {answer["id"] for answer in question["answers"]}
+    assert updated[answers[1]["id"]] == "edited"
+
+def test_answered_question_cannot_lose_or_reorder_answers(client, admin, user, make_quiz):
+    quiz = make_quiz(questions=1)
+    question = quiz["questions"][0]
+    started = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+    client.post(f"/attempts/submit/{started['attempt_id']}",
+                json={"answers": correct_answers(started["questions"])}, headers=user)
+
+    answers = [dict(answer_text=a["answer_text"], is_correct=a["is_correct"], order=a["order"], id=a["id"])
+               for a in question["answers"]]
+    reordered = [dict(answers[0], order=1), dict(answers[1], order=0), answers[2]]
+    for body in (answers[:2], reordered):
+        response = client.put(f"/questions/{question['id']}", json=question_body(question, body), headers=admin)
+        assert response.status_code == 400
+
+    # Le texte reste modifiable
+    answers[2]["answer_text"] = "clarified"
+    response = client.put(f"/questions/{question['id']}", json=question_body(question, answers), headers=admin)
+    assert response.status_code == 200, response.text
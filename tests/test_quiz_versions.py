@@ -0,0 +1,46 @@
+from app.models import QuizVersion
+from tests.conftest import correct_answers
+
+def test_attempt_is_graded_on_the_version_it_was_served(client, admin, user, make_quiz, db):
+    quiz = make_quiz(questions=2)
+    assert db.query(QuizVersion).count() == 1
+    # Republier sans modification ne crée pas de version
+    client.post(f"/quizzes/{quiz['id']}/publish", headers=admin)
+    assert db.query(QuizVersion).count() == 1
+
+    started = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+
+    # Le corrigé change après le démarrage : la tentative reste corrigée sur sa version
+    question = quiz["questions"][0]
+    answers = [dict(answer_text=a["answer_text"], is_correct=a["order"] == 1, order=a["order"], id=a["id"])
+               for a in question["answers"]]
+    response = client.put(f"/questions/{question['id']}", json={
+        "question_text": "Edited", "order": question["order"], "answers": answers
+    }, headers=admin)
+    assert response.status_code == 200, response.text
+
+    result = client.post(f"/attempts/submit/{started['attempt_id']}",
+                         json={"answers": correct_answers(started["questions"])}, headers=user).json()
+    assert result["score"] == 100
+
+    client.post(f"/quizzes/{quiz['id']}/publish", headers=admin)
+    versions = client.get(f"/quizzes/{quiz['id']}/versions", headers=admin).json()
+    assert [version["version"] for version in versions] == [2, 1]
+    started = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+    assert started["questions"][0]["question_text"] == "Edited"
+
+def test_version_content_is_cached_by_etag(client, admin, user, make_quiz):
+    quiz = make_quiz()
+    version_id = client.get(f"/quizzes/{quiz['id']}/versions", headers=admin).json()[0]["id"]
+
+    response = client.get(f"/quizzes/{quiz['id']}/versions/{version_id}", headers=user)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert "immutable" in response.headers["Cache-Control"]
+    # Contenu public : sans le corrigé
+    content = response.json()
+    assert "answer_key" not in content
+    assert all("is_correct" not in answer for question in content["questions"] for answer in question["answers"])
+
+    cached = client.get(f"/quizzes/{quiz['id']}/versions/{version_id}", headers={**user, "If-None-Match": etag})
+    assert cached.status_code == 304
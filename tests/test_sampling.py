@@ -0,0 +1,40 @@
+from app.models import UserQuizAttempt
+from app.services.sampling import allocate, draw
+from tests.conftest import correct_answers
+
+ROWS = [(f"q{index}", "easy" if index < 6 else "hard") for index in range(9)]
+
+def test_allocate_uses_largest_remainder():
+    assert allocate({"a": 5, "b": 3, "c": 2}, 4) == {"a": 2, "b": 1, "c": 1}
+    assert sum(allocate({"a": 1, "b": 1, "c": 1}, 2).values()) == 2
+
+def test_draw_is_reproducible_and_keeps_quiz_order():
+    first = draw(ROWS, 4, False, seed=42)
+    assert first == draw(ROWS, 4, False, seed=42)
+    assert len(first) == 4 and first == sorted(first, key=lambda question_id: int(question_id[1:]))
+    assert draw(ROWS, None, False, seed=42) is None
+    assert draw(ROWS, 9, False, seed=42) is None
+
+def test_stratified_draw_is_proportional():
+    for seed in range(20):
+        picked = draw(ROWS, 3, True, seed)
+        assert sum(question_id in {"q6", "q7", "q8"} for question_id in picked) == 1
+
+def test_attempt_serves_and_grades_the_sample(client, admin, user, make_quiz, db):
+    quiz = make_quiz(questions=5)
+    response = client.put(f"/quizzes/{quiz['id']}", json={
+        "title": quiz["title"], "level": quiz["level"], "status": "published", "sample_size": 2
+    }, headers=admin)
+    assert response.status_code == 200, response.text
+
+    started = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+    assert len(started["questions"]) == 2
+    attempt = db.query(UserQuizAttempt).one()
+    assert attempt.question_ids == [question["id"] for question in started["questions"]]
+    assert attempt.question_ids == draw(
+        [(question["id"], None) for question in quiz["questions"]], 2, False, attempt.seed
+    )
+
+    result = client.post(f"/attempts/submit/{started['attempt_id']}",
+                         json={"answers": correct_answers(started["questions"])}, headers=user).json()
+    assert result["score"] == 100
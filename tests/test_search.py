@@ -0,0 +1,51 @@
+from app.services.search import InvertedIndex, tokenize
+
+def test_tokenize_splits_on_underscores_and_lowercases():
+    assert tokenize("Quel_est le Résultat ? 42") == ["quel", "est", "le", "résultat", "42"]
+
+def test_index_requires_every_term_and_expands_the_last_one():
+    index = InvertedIndex()
+    index.add(("quiz", "1"), [("Python basics", 1.0)], {})
+    index.add(("quiz", "2"), [("Python advanced patterns", 1.0)], {})
+    index.add(("quiz", "3"), [("Java patterns", 1.0)], {})
+    assert set(index.search(["python"])) == {("quiz", "1"), ("quiz", "2")}
+    assert set(index.search(["python", "pat"])) == {("quiz", "2")}
+    assert set(index.search(["pat"])) == {("quiz", "2"), ("quiz", "3")}
+
+    index.remove(("quiz", "2"))
+    assert set(index.search(["python", "pat"])) == set()
+
+def test_title_matches_rank_above_answer_matches(client, admin, make_quiz):
+    quiz = make_quiz("Geography")
+    client.post(f"/quizzes/{quiz['id']}/questions", json={
+        "question_text": "Which river crosses Paris?", "order": 10,
+        "answers": [{"answer_text": "Seine", "is_correct": True, "order": 0}]
+    }, headers=admin)
+    client.post(f"/quizzes/{quiz['id']}/questions", json={
+        "question_text": "Which city lies on the Seine?", "order": 11,
+        "answers": [{"answer_text": "Paris", "is_correct": True, "order": 0}]
+    }, headers=admin)
+
+    response = client.get("/search/", params={"q": "seine", "types": "question"}, headers=admin).json()
+    assert [hit["title"] for hit in response["data"]] == ["Which city lies on the Seine?", "Which river crosses Paris?"]
+    assert response["data"][0]["category_id"] == quiz["category_id"]
+    assert response["meta"]["total"] == 2 and response["meta"]["backend"] == "memory"
+
+def test_search_visibility_and_updates(client, admin, user, make_quiz):
+    quiz = make_quiz("Astronomy")
+    draft = client.post("/quizzes/", json={"title": "Astronomy draft", "level": "debutant",
+                                           "category_id": quiz["category_id"]}, headers=admin).json()
+
+    def titles(headers):
+        return {hit["title"] for hit in client.get("/search/", params={"q": "astro"}, headers=headers).json()["data"]}
+
+    # Brouillons et questions réservés aux administrateurs
+    assert titles(user) == {"Category Astronomy", "Astronomy"}
+    assert titles(admin) == {"Category Astronomy", "Astronomy", "Astronomy draft"} | {
+        question["question_text"] for question in quiz["questions"]
+    }
+
+    # Le renommage est pris en compte à la recherche suivante
+    client.put(f"/quizzes/{draft['id']}", json={"title": "Cosmology draft", "level": "debutant"}, headers=admin)
+    assert "Astronomy draft" not in titles(admin)
+    assert client.get("/search/", params={"q": "x", "types": "answer"}, headers=admin).status_code == 400
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.services.cache import TTLCache
+from app.services.singleflight import SingleFlight
+
+def test_concurrent_loads_are_coalesced():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(flight.do, "key", load) for _ in range(8)]
+        # Tous les appels attendent le premier chargement avant qu'il ne se termine
+        while flight.coalesced < 7:
+            time.sleep(0.001)
+        release.set()
+        assert [future.result() for future in futures] == ["value"] * 8
+
+    assert len(calls) == 1
+    assert flight.stats() == {"name": "test", "hits": 0, "misses": 1, "coalesced": 7, "in_flight": 0}
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    flight = SingleFlight("test")
+    cache = TTLCache(ttl=None)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        flight.get_or_load(cache, "key", fail)
+    assert flight.get_or_load(cache, "key", lambda: 42) == 42
+    assert flight.get_or_load(cache, "key", fail) == 42
+    assert (flight.hits, flight.misses) == (1, 2)
+
+def test_async_calls_share_one_load():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("key", load) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["value"] * 5
+    assert len(calls) == 1 and flight.coalesced == 4
@@ -0,0 +1,47 @@
+from unittest import mock
+from app.core import slow_queries as module
+from app.core.slow_queries import SlowQueryLog, _explain, normalize_sql, redact_parameters, slow_queries
+from app.db.session import engine
+
+def test_normalize_sql_folds_whitespace_and_in_lists():
+    assert normalize_sql("SELECT *\n  FROM quizzes WHERE id IN (?, ?, ?)") == "SELECT * FROM quizzes WHERE id IN (...)"
+    assert normalize_sql("WHERE id IN (%(id_1_1)s, %(id_1_2)s)") == "WHERE id IN (...)"
+    assert normalize_sql("WHERE id = %(id_1)s") == "WHERE id = %(id_n)s"
+
+def test_redact_parameters_keeps_only_types():
+    assert redact_parameters({"email": "a@b.c", "limit": 10}) == {"email": "str", "limit": "int"}
+    assert redact_parameters(("secret", 1.5)) == ["str", "float"]
+    assert redact_parameters([{"id": "x"}, {"id": "y"}]) == {"rows": 2, "first": {"id": "str"}}
+
+def test_log_aggregates_and_evicts_the_cheapest():
+    log = SlowQueryLog()
+    log.record("SELECT 1", [], 0.3, "GET /a")
+    log.record("SELECT 1", [], 0.1, "GET /b", plan=["SCAN quizzes"])
+    log.record("SELECT 2", [], 0.2, None)
+    top = log.top(limit=5)
+    assert [entry["statement"] for entry in top] == ["SELECT 1", "SELECT 2"]
+    assert top[0]["count"] == 2 and top[0]["avg_ms"] == 200.0 and top[0]["max_ms"] == 300.0
+    assert top[0]["routes"] == {"GET /a": 1, "GET /b": 1} and top[0]["plan"] == ["SCAN quizzes"]
+    assert log.slow_count == 3
+
+    with mock.patch.object(module, "MAX_TRACKED", 2):
+        log.record("SELECT 3", [], 0.25, None)
+    assert [entry["statement"] for entry in log.top(limit=5)] == ["SELECT 1", "SELECT 3"]
+
+def test_explain_captures_the_sqlite_plan():
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        plan = _explain(engine, cursor, "SELECT * FROM quizzes WHERE id = ?", ("x",))
+        assert plan and any("quizzes" in line for line in plan)
+        assert _explain(engine, cursor, "DELETE FROM quizzes", ()) is None
+    finally:
+        connection.close()
+
+def test_admin_endpoint_lists_and_resets(client, admin):
+    slow_queries.reset()
+    slow_queries.record("SELECT 1", [], 0.5, "GET /x")
+    data = client.get("/admin/slow-queries", headers=admin).json()
+    assert [entry["statement"] for entry in data["data"]] == ["SELECT 1"]
+    client.delete("/admin/slow-queries", headers=admin)
+    assert client.get("/admin/slow-queries", headers=admin).json()["data"] == []
@@ -0,0 +1,29 @@
+from app.api.attempts import submission_results
+from app.models import UserQuizAttempt, UserStats
+from tests.conftest import correct_answers
+
+def test_submit_is_idempotent(client, user, make_quiz, db):
+    quiz = make_quiz()
+    started = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+    body = {"answers": correct_answers(started["questions"])}
+
+    first = client.post(f"/attempts/submit/{started['attempt_id']}", json=body, headers=user)
+    assert first.status_code == 200 and "Idempotent-Replayed" not in first.headers
+
+    # Rejouée depuis le cache du processus, puis depuis la tentative enregistrée
+    replay = client.post(f"/attempts/submit/{started['attempt_id']}", json={"answers": []}, headers=user)
+    submission_results.clear()
+    stored = client.post(f"/attempts/submit/{started['attempt_id']}", json={"answers": []}, headers=user)
+    for response in (replay, stored):
+        assert response.status_code == 200
+        assert response.headers["Idempotent-Replayed"] == "true"
+        assert response.json() == first.json()
+
+    assert db.query(UserQuizAttempt).count() == 1
+    assert db.query(UserStats.completed_count).scalar() == 1
+
+def test_other_users_attempt_is_not_found(client, user, admin, make_quiz):
+    quiz = make_quiz()
+    started = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+    response = client.post(f"/attempts/submit/{started['attempt_id']}", json={"answers": []}, headers=admin)
+    assert response.status_code == 404
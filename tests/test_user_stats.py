@@ -0,0 +1,33 @@
+from app.models import User, UserStats
+from app.services.user_stats import RECENT_SIZE, dashboard, merge_recent, rebuild
+from tests.conftest import correct_answers
+
+def test_merge_recent_keeps_latest_entries():
+    entries = [{"id": str(index), "completed_at": f"2026-01-0{index}T00:00:00"} for index in range(1, 8)]
+    merged = merge_recent(entries[:3], entries[3:])
+    assert len(merged) == RECENT_SIZE
+    assert [entry["id"] for entry in merged] == ["7", "6", "5", "4", "3"]
+
+def test_dashboard_deltas_match_a_rebuild(client, user, make_quiz, db):
+    passed, failed, open_quiz = make_quiz("Passed"), make_quiz("Failed"), make_quiz("Open")
+    for quiz, answers in ((passed, correct_answers), (failed, lambda questions: [])):
+        started = client.post(f"/attempts/start/{quiz['id']}", headers=user).json()
+        response = client.post(f"/attempts/submit/{started['attempt_id']}",
+                               json={"answers": answers(started["questions"])}, headers=user)
+        assert response.status_code == 200, response.text
+    client.post(f"/attempts/start/{open_quiz['id']}", headers=user)
+
+    stats = client.get("/users/me/stats", headers=user).json()
+    assert stats["total_attempts"] == 3
+    assert stats["average_score"] == 50.0
+    assert [entry["quiz_title"] for entry in stats["recent_attempts"]] == ["Failed", "Passed"]
+
+    user_id = db.query(User.id).filter(User.email == "user@example.com").scalar()
+    row = db.get(UserStats, user_id)
+    assert (row.completed_count, row.passed_count) == (2, 1)
+
+    incremental = dashboard(db, user_id)
+    db.query(UserStats).delete()
+    db.commit()
+    assert rebuild(db) == 1
+    assert dashboard(db, user_id) == incremental